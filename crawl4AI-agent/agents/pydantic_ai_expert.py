@@ -2,6 +2,7 @@ from __future__ import annotations as _annotations
 
 import asyncio
 import os
+import sys
 from dataclasses import dataclass
 from typing import List
 
@@ -13,6 +14,14 @@ from pydantic_ai import Agent, ModelRetry, RunContext
 from pydantic_ai.models.openai import OpenAIModel
 from supabase import Client
 
+# Add the project root directory to Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from constants import EMBEDDING_DIMENSIONS, EMBEDDING_MODEL, SEARCH_MODE, VECTOR_SEARCH_PRECISION
+from utils import embedding_model_key, get_local_vector_index, get_query_embedding_cache, pack_context
+from utils.context_packer import DEFAULT_CANDIDATES
+from utils.vector_index import LOCAL_VECTOR_INDEX
+
 load_dotenv()
 
 llm = os.getenv("LLM_MODEL", "gpt-4o-mini")
@@ -47,15 +56,21 @@ pydantic_ai_expert = Agent(
 
 
 async def get_embedding(text: str, openai_client: AsyncOpenAI) -> List[float]:
-    """Get embedding vector from OpenAI."""
-    try:
-        response = await openai_client.embeddings.create(
-            model="text-embedding-3-small", input=text
-        )
+    """Get the query embedding from the query cache or OpenAI."""
+
+    async def embed(query: str) -> List[float]:
+        params = {"model": EMBEDDING_MODEL, "input": query}
+        if EMBEDDING_DIMENSIONS:
+            params["dimensions"] = EMBEDDING_DIMENSIONS
+        response = await openai_client.embeddings.create(**params)
         return response.data[0].embedding
+
+    cache_model = embedding_model_key(EMBEDDING_MODEL, EMBEDDING_DIMENSIONS)
+    try:
+        return await get_query_embedding_cache().get_or_embed(text, cache_model, embed)
     except Exception as e:
         print(f"Error getting embedding: {e}")
-        return [0] * 1536  # Return zero vector on error
+        return [0] * (EMBEDDING_DIMENSIONS or 1536)  # Return zero vector on error
 
 
 @pydantic_ai_expert.tool
@@ -70,37 +85,50 @@ async def retrieve_relevant_documentation(
         user_query: The user's question or query
 
     Returns:
-        A formatted string containing the top 5 most relevant documentation chunks
+        The most relevant, non-redundant chunks that fit the context budget
     """
     try:
         # Get the embedding for the query
         query_embedding = await get_embedding(user_query, ctx.deps.openai_client)
 
-        # Query Supabase for relevant documents
-        result = ctx.deps.supabase.rpc(
-            "match_site_pages",
-            {
-                "query_embedding": query_embedding,
-                "match_count": 5,
-                "filter": {"source": "pydantic_ai_docs"},
-            },
-        ).execute()
-
-        if not result.data:
+        # None until the snapshot is mapped or built in the background
+        index = get_local_vector_index(ctx.deps.supabase) if LOCAL_VECTOR_INDEX and SEARCH_MODE == "vector" else None
+        if index is not None:
+            docs = index.search(
+                query_embedding, DEFAULT_CANDIDATES, filter={"source": "pydantic_ai_docs"}, include_embeddings=True
+            )
+        elif SEARCH_MODE == "hybrid":
+            # Full-text and vector ranks fused, so exact API names are found too
+            result = ctx.deps.supabase.rpc(
+                "hybrid_match_site_pages",
+                {
+                    "query_text": user_query,
+                    "query_embedding": query_embedding,
+                    "match_count": DEFAULT_CANDIDATES,
+                    "filter": {"source": "pydantic_ai_docs"},
+                    "include_embeddings": True,
+                },
+            ).execute()
+            docs = result.data
+        else:
+            # Query Supabase for relevant documents
+            result = ctx.deps.supabase.rpc(
+                "match_site_pages",
+                {
+                    "query_embedding": query_embedding,
+                    "match_count": DEFAULT_CANDIDATES,
+                    "filter": {"source": "pydantic_ai_docs"},
+                    "search_precision": VECTOR_SEARCH_PRECISION,
+                    "include_embeddings": True,
+                },
+            ).execute()
+            docs = result.data
+
+        if not docs:
             return "No relevant documentation found."
 
-        # Format the results
-        formatted_chunks = []
-        for doc in result.data:
-            chunk_text = f"""
-# {doc['title']}
-
-{doc['content']}
-"""
-            formatted_chunks.append(chunk_text)
-
-        # Join all chunks with a separator
-        return "\n\n---\n\n".join(formatted_chunks)
+        # Over-fetched candidates, diversified and packed into the token budget
+        return pack_context(docs, query_embedding).text
 
     except Exception as e:
         print(f"Error retrieving documentation: {e}")
@@ -3,7 +3,7 @@ from __future__ import annotations as _annotations
 import asyncio
 import os
 from dataclasses import dataclass
-from typing import List
+from typing import Any, Dict, List, Literal
 import socket
 import logging
 from dotenv import load_dotenv
@@ -19,7 +19,17 @@ from supabase import Client, create_client
 load_dotenv(".env_agents", override=True)
 
 # from constants import LLM_MODEL, OPEN_AI_API_KEY, SUPABASE_SERVICE_KEY, SUPABASE_URL
+from constants import EMBEDDING_DIMENSIONS, EMBEDDING_MODEL, SEARCH_MODE, VECTOR_SEARCH_PRECISION
 from crawl_docs import Sites
+from utils import (
+    embedding_model_key,
+    get_local_vector_index,
+    get_query_embedding_cache,
+    get_supabase_health,
+    pack_context,
+)
+from utils.context_packer import DEFAULT_CANDIDATES as RAG_CANDIDATES
+from utils.vector_index import LOCAL_VECTOR_INDEX
 
 LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
 SUPABASE_URL = os.getenv("SUPABASE_URL")
@@ -76,25 +86,56 @@ ai_expert = Agent(model, system_prompt=system_prompt, deps_type=AIDeps, retries=
 
 
 async def get_embedding(text: str, openai_client: AsyncOpenAI) -> List[float]:
-    """Get embedding vector from OpenAI."""
-    try:
-        response = await openai_client.embeddings.create(
-            model="text-embedding-3-small", input=text
-        )
+    """Get the query embedding from the query cache or OpenAI."""
+
+    async def embed(query: str) -> List[float]:
+        params = {"model": EMBEDDING_MODEL, "input": query}
+        if EMBEDDING_DIMENSIONS:
+            params["dimensions"] = EMBEDDING_DIMENSIONS
+        response = await openai_client.embeddings.create(**params)
         return response.data[0].embedding
+
+    cache_model = embedding_model_key(EMBEDDING_MODEL, EMBEDDING_DIMENSIONS)
+    try:
+        return await get_query_embedding_cache().get_or_embed(text, cache_model, embed)
     except httpx.ConnectError as e:
         logging.error(f"Connection error while getting embedding: {e}")
         raise ConnectionError(f"Unable to connect to OpenAI API: {e}")
     except Exception as e:
         logging.error(f"Error getting embedding: {e}")
-        return [0] * 1536  # Return zero vector on error
+        return [0] * (EMBEDDING_DIMENSIONS or 1536)  # Return zero vector on error
+
+
+def match_documents(
+    supabase: Client,
+    user_query: str,
+    query_embedding: List[float],
+    match_count: int = 5,
+    site: str = SITE,
+    search_mode: str = SEARCH_MODE,
+    include_embeddings: bool = False,
+) -> List[Dict[str, Any]]:
+    """Rows from match_site_pages, or from hybrid_match_site_pages in "hybrid" mode."""
+    params = {
+        "query_embedding": query_embedding,
+        "match_count": match_count,
+        "filter": {"model": f"{LLM_MODEL}"},
+        "site_filter": site,
+        "include_embeddings": include_embeddings,
+    }
+    if search_mode == "hybrid":
+        return supabase.rpc("hybrid_match_site_pages", {**params, "query_text": user_query}).execute().data
+    if search_mode != "vector":
+        raise ValueError(f"Unknown search mode {search_mode!r}, expected 'vector' or 'hybrid'")
+    return supabase.rpc("match_site_pages", {**params, "search_precision": VECTOR_SEARCH_PRECISION}).execute().data
 
 
 @ai_expert.tool
 async def retrieve_relevant_documentation(
     ctx: RunContext[AIDeps], 
     user_query: str,
-    site: str = SITE  # Add default site parameter
+    site: str = SITE,  # Add default site parameter
+    search_mode: Literal["vector", "hybrid"] = SEARCH_MODE,
 ) -> str:
     """
     Retrieve relevant documentation chunks based on the query with RAG.
@@ -103,46 +144,60 @@ async def retrieve_relevant_documentation(
         ctx: The context including the Supabase client and OpenAI client
         user_query: The user's question or query
         site: The documentation site to search (defaults to SITE constant)
+        search_mode: "hybrid" also matches exact words, best for queries naming
+            methods, classes or endpoints; "vector" matches by meaning only
 
     Returns:
-        A formatted string containing the top 5 most relevant documentation chunks
+        The most relevant, non-redundant chunks that fit the context budget: full
+        content for the top hits, title, summary and URL for the rest
     """
     try:
-        # Test connection to Supabase
-        try:
-            await ctx.deps.supabase.table("site_pages").select("count", count="exact").execute()
-        except Exception as e:
-            raise ConnectionError(f"Unable to connect to Supabase: {e}")
+        # The breaker's state is refreshed in the background, so this costs no round trip
+        health = get_supabase_health(ctx.deps.supabase)
+        if not health.allow():
+            raise ConnectionError(
+                f"Supabase is unavailable ({health.last_error}), retrying in {health.retry_in():.0f}s"
+            )
 
         # Get the embedding for the query
         query_embedding = await get_embedding(user_query, ctx.deps.openai_client)
 
-        # Query Supabase for relevant documents using the new site_filter parameter
-        result = ctx.deps.supabase.rpc(
-            "match_site_pages",
-            {
-                "query_embedding": query_embedding,
-                "match_count": 5,
-                "filter": {"model": f"{LLM_MODEL}"},
-                "site_filter": site
-            },
-        ).execute()
-
-        if not result.data:
+        docs = None
+        # The local index has no full-text side, so hybrid searches go to Supabase
+        if LOCAL_VECTOR_INDEX and search_mode == "vector":
+            try:
+                # None until the snapshot is mapped or built in the background
+                index = get_local_vector_index(ctx.deps.supabase)
+                if index is not None:
+                    docs = index.search(
+                        query_embedding, RAG_CANDIDATES, filter={"model": f"{LLM_MODEL}"},
+                        site_filter=site, include_embeddings=True,
+                    )
+            except Exception as e:
+                logging.error(f"Local vector index unavailable, using match_site_pages: {e}")
+
+        if docs is None:
+            # Query Supabase for relevant documents using the new site_filter parameter
+            try:
+                docs = match_documents(
+                    ctx.deps.supabase, user_query, query_embedding, RAG_CANDIDATES,
+                    site=site, search_mode=search_mode, include_embeddings=True,
+                )
+            except (httpx.HTTPError, OSError) as e:
+                health.record_failure(e)
+                raise ConnectionError(f"Unable to connect to Supabase: {e}")
+            health.record_success()
+
+        if not docs:
             return "No relevant documentation found."
 
-        # Format the results
-        formatted_chunks = []
-        for doc in result.data:
-            chunk_text = f"""
-# {doc['title']}
-
-{doc['content']}
-"""
-            formatted_chunks.append(chunk_text)
-
-        # Join all chunks with a separator
-        return "\n\n---\n\n".join(formatted_chunks)
+        # Over-fetched candidates, diversified and packed into the token budget
+        packed = pack_context(docs, query_embedding)
+        logfire.info(
+            "Packed {full} full and {summarized} summarized chunks ({tokens} tokens) from {candidates} candidates",
+            full=packed.full, summarized=packed.summarized, tokens=packed.tokens, candidates=packed.candidates,
+        )
+        return packed.text
 
     except ConnectionError as e:
         logging.error(f"Connection error: {e}")
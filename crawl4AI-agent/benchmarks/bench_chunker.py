@@ -0,0 +1,88 @@
+"""
+Compare the character-based chunker with the token-aware streaming chunker.
+
+Run from the crawl4AI-agent directory:
+
+    python benchmarks/bench_chunker.py
+    python benchmarks/bench_chunker.py --scale 100 --repeat 1
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from typing import Callable, Iterator
+
+# Add the project root directory to Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils.chunker import (
+    DEFAULT_CHUNK_TOKENS,
+    DEFAULT_OVERLAP_TOKENS,
+    chunk_text_by_chars,
+    iter_token_chunks,
+)
+
+DEFAULT_INPUT = os.path.join(os.path.dirname(__file__), "..", "crawlers", "text.txt")
+
+
+def stream_lines(path: str, scale: int) -> Iterator[str]:
+    """Yield the file's lines `scale` times without ever holding the whole input."""
+    for _ in range(scale):
+        with open(path, "r", encoding="utf-8") as f:
+            yield from f
+
+
+def measure(run: Callable[[], int], repeat: int):
+    """Return (chunks, seconds per run, peak traced memory in bytes)."""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        chunks = run()
+    elapsed = (time.perf_counter() - started) / repeat
+
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return chunks, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--input", default=DEFAULT_INPUT)
+    parser.add_argument("--scale", type=int, default=1, help="Repeat the input this many times")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per implementation")
+    parser.add_argument("--max-tokens", type=int, default=DEFAULT_CHUNK_TOKENS)
+    parser.add_argument("--overlap", type=int, default=DEFAULT_OVERLAP_TOKENS)
+    args = parser.parse_args()
+
+    size = os.path.getsize(args.input) * args.scale
+
+    def load() -> str:
+        return "".join(stream_lines(args.input, args.scale))
+
+    # Loading is part of the in-memory runs so peak memory is comparable with streaming
+    implementations = {
+        "chars (current, 5000 chars)": lambda: len(chunk_text_by_chars(load())),
+        f"tokens ({args.max_tokens} tokens, in memory)": lambda: sum(
+            1 for _ in iter_token_chunks(load(), args.max_tokens, args.overlap)
+        ),
+        f"tokens ({args.max_tokens} tokens, streamed)": lambda: sum(
+            1 for _ in iter_token_chunks(
+                stream_lines(args.input, args.scale), args.max_tokens, args.overlap
+            )
+        ),
+    }
+
+    print(f"Input: {args.input} x{args.scale} ({size / 1024:.0f} KB), {args.repeat} runs each\n")
+    print(f"{'implementation':<36} {'chunks':>8} {'ms/run':>10} {'chunks/s':>10} {'MB/s':>8} {'peak MB':>8}")
+    for name, run in implementations.items():
+        chunks, seconds, peak = measure(run, args.repeat)
+        print(
+            f"{name:<36} {chunks:>8} {seconds * 1000:>10.1f} {chunks / seconds:>10.0f} "
+            f"{size / seconds / 1024**2:>8.1f} {peak / 1024**2:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""
+Microbenchmarks for the text-processing hot paths, runnable offline.
+
+Each case runs against crawlers/text.txt scaled to the requested sizes and
+reports ops/sec, MB/s and the peak memory allocated by one call. Results can be
+saved as a baseline and later runs compared against it; a case that got slower
+or allocates more than the tolerance allows makes the script exit non-zero.
+Cases whose dependencies are missing (crawl4ai, lxml, or tiktoken's BPE files
+when offline without TIKTOKEN_CACHE_DIR) are reported as skipped, including
+token-based cases that would otherwise time the approximate fallback.
+
+Run from the crawl4AI-agent directory:
+
+    python benchmarks/bench_text_processing.py
+    python benchmarks/bench_text_processing.py --sizes 1KB,1MB,100MB --only chunk_text,parse
+    python benchmarks/bench_text_processing.py --save-baseline
+    python benchmarks/bench_text_processing.py --compare --tolerance 0.2
+"""
+import argparse
+import html
+import json
+import math
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+# Add the project root directory to Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+DEFAULT_INPUT = os.path.join(os.path.dirname(__file__), "..", "crawlers", "text.txt")
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "text_processing.json")
+DEFAULT_SIZES = "1KB,100KB,1MB"
+PRODUCT_NAME = "NATIONAL GEOGRAPHIC Break Open 10 Premium Geodes"
+TOKEN_MODEL = "gpt-4o-mini"
+
+_UNITS = {"KB": 1024, "MB": 1024**2}
+
+
+def parse_size(size: str) -> int:
+    size = size.strip().upper()
+    for unit, factor in _UNITS.items():
+        if size.endswith(unit):
+            return int(float(size[: -len(unit)]) * factor)
+    return int(size)
+
+
+def format_size(size: int) -> str:
+    if size >= _UNITS["MB"]:
+        return f"{size / _UNITS['MB']:g}MB"
+    return f"{size / _UNITS['KB']:g}KB"
+
+
+def scaled_markdown(text: str, size: int) -> str:
+    """Repeat the sample until it is `size` characters long, cut at a line boundary."""
+    repeated = text * (size // len(text) + 1)
+    cut = repeated.rfind("\n", 0, size)
+    return repeated[: cut + 1 if cut > 0 else size]
+
+
+def scaled_html(markdown: str) -> str:
+    """Wrap markdown lines in product-page markup, with the scripts and ads the filter strips."""
+    parts = ["<html><head><style>.x{color:red}</style></head><body>"]
+    for index, line in enumerate(markdown.splitlines()):
+        if index % 50 == 0:
+            parts.append('<div id="sponsored-ad"><p>Sponsored</p></div><script>track()</script>')
+        parts.append(f'<div class="item"><p>{html.escape(line)}</p></div>')
+    parts.append("</body></html>")
+    return "".join(parts)
+
+
+@dataclass
+class Case:
+    name: str
+    # Builds the call to time from the scaled markdown; import errors mark the case as skipped
+    setup: Callable[[str], Callable[[], object]]
+
+
+def _require_tokenizer():
+    """Skip token-based cases unless the real encoding loaded; the len // 4 fallback says nothing."""
+    from utils.tokens import get_encoding
+
+    if get_encoding() is None:
+        raise RuntimeError("tiktoken encoding unavailable, only approximate counts")
+
+
+def _chunk_text(markdown: str):
+    # The chunker itself, without crawl_docs and the crawl4ai/Playwright stack it imports
+    from utils.chunker import iter_token_chunks
+
+    _require_tokenizer()
+    return lambda: [chunk.text for chunk in iter_token_chunks(markdown)]
+
+
+def _chunk_text_by_chars(markdown: str):
+    from utils.chunker import chunk_text_by_chars
+
+    return lambda: chunk_text_by_chars(markdown)
+
+
+def _clean_markdown(markdown: str):
+    from crawlers.crawl_single_page import clean_markdown, patterns
+
+    return lambda: clean_markdown(markdown, patterns)
+
+
+def _parse(markdown: str):
+    from crawlers.crawl_single_page import parse
+
+    return lambda: parse(markdown)
+
+
+def _parse_markdown(markdown: str):
+    from crawlers.crawl_single_page import parse_markdown
+
+    return lambda: parse_markdown(markdown)
+
+
+def _extract_product_price_blocks(markdown: str):
+    from crawlers.crawl_single_page import extract_product_price_blocks
+
+    return lambda: extract_product_price_blocks(markdown, PRODUCT_NAME)
+
+
+def _filter_content(markdown: str):
+    from crawlers.crawl_single_page import PriceAndVariationsFilter
+
+    content_filter = PriceAndVariationsFilter()
+    page = scaled_html(markdown)
+    return lambda: content_filter.filter_content(page)
+
+
+def _count_tokens(markdown: str):
+    from utils.tokens import count_tokens
+
+    _require_tokenizer()
+    return lambda: count_tokens(markdown)
+
+
+def _num_tokens_from_string(markdown: str):
+    from crawlers.crawl_single_page import num_tokens_from_string
+
+    return lambda: num_tokens_from_string(markdown, "cl100k_base")
+
+
+def _num_tokens_string_from_model(markdown: str):
+    from crawlers.crawl_single_page import num_tokens_string_from_model
+
+    return lambda: num_tokens_string_from_model(markdown, TOKEN_MODEL)
+
+
+CASES = [
+    Case("chunk_text", _chunk_text),
+    Case("chunk_text_by_chars", _chunk_text_by_chars),
+    Case("clean_markdown", _clean_markdown),
+    Case("parse", _parse),
+    Case("parse_markdown", _parse_markdown),
+    Case("extract_product_price_blocks", _extract_product_price_blocks),
+    Case("PriceAndVariationsFilter.filter_content", _filter_content),
+    Case("count_tokens", _count_tokens),
+    Case("num_tokens_from_string", _num_tokens_from_string),
+    Case("num_tokens_string_from_model", _num_tokens_string_from_model),
+]
+
+
+def measure(run: Callable[[], object], min_time: float, max_runs: int) -> Dict[str, float]:
+    """Time `run` until `min_time` has passed, then trace one call's allocations."""
+    runs = 0
+    started = time.perf_counter()
+    while True:
+        run()
+        runs += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time or runs >= max_runs:
+            break
+
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    run()
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "runs": runs,
+        "seconds_per_op": elapsed / runs,
+        "ops_per_sec": runs / elapsed,
+        "peak_bytes": peak - before,
+        "retained_bytes": after - before,
+    }
+
+
+def load_baseline(path: str) -> Optional[dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_baseline(path: str, results: Dict[str, dict]):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(
+            {
+                "python": platform.python_version(),
+                "machine": platform.platform(),
+                "saved_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "results": results,
+            },
+            f,
+            indent=2,
+            sort_keys=True,
+        )
+    print(f"\nBaseline saved to {path}")
+
+
+def compare(results: Dict[str, dict], baseline: dict, tolerance: float) -> List[str]:
+    """Cases that are slower, or allocate more, than the baseline by more than `tolerance`."""
+    regressions = []
+    for key, result in results.items():
+        previous = baseline["results"].get(key)
+        if previous is None:
+            continue
+        speed = result["ops_per_sec"] / previous["ops_per_sec"]
+        if speed < 1 - tolerance:
+            regressions.append(f"{key}: {speed:.2f}x the baseline ops/sec")
+        if previous["peak_bytes"] and result["peak_bytes"] > previous["peak_bytes"] * (1 + tolerance):
+            growth = result["peak_bytes"] / previous["peak_bytes"]
+            regressions.append(f"{key}: {growth:.2f}x the baseline peak memory")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--input", default=DEFAULT_INPUT)
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Comma-separated corpus sizes, 1KB up to 100MB")
+    parser.add_argument("--only", default="", help="Comma-separated case names to run")
+    parser.add_argument("--min-time", type=float, default=0.5, help="Seconds to spend timing each case")
+    parser.add_argument("--max-runs", type=int, default=10000)
+    parser.add_argument(
+        "--max-seconds", type=float, default=30.0,
+        help="Skip larger sizes of a case once a call is projected to take longer than this",
+    )
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Write these results as the new baseline")
+    parser.add_argument("--compare", action="store_true", help="Fail if a case regressed against the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown or memory growth (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    with open(args.input, "r", encoding="utf-8") as f:
+        sample = f.read()
+    sizes = sorted(parse_size(size) for size in args.sizes.split(","))
+    only = {name.strip() for name in args.only.split(",") if name.strip()}
+    cases = [case for case in CASES if not only or case.name in only]
+    baseline = load_baseline(args.baseline)
+
+    print(f"Input: {args.input} ({len(sample) / 1024:.0f} KB) scaled to {', '.join(map(format_size, sizes))}")
+    if baseline is not None:
+        print(f"Baseline: {args.baseline} (saved {baseline['saved_at']} on {baseline['machine']})")
+    print(
+        f"\n{'case':<40} {'size':>7} {'ops/s':>10} {'ms/op':>10} {'MB/s':>8} "
+        f"{'peak MB':>8} {'kept KB':>8} {'vs base':>8}"
+    )
+
+    results: Dict[str, dict] = {}
+    for case in cases:
+        too_slow = None
+        previous_point = None
+        for index, size in enumerate(sizes):
+            label = f"{case.name:<40} {format_size(size):>7}"
+            if too_slow is not None:
+                print(f"{label}  skipped: {too_slow}")
+                continue
+            try:
+                result = measure(case.setup(scaled_markdown(sample, size)), args.min_time, args.max_runs)
+            except Exception as e:
+                # Missing optional packages or offline tokenizer downloads skip the case
+                print(f"{label}  skipped: {type(e).__name__}: {str(e).splitlines()[0][:80] if str(e) else ''}")
+                break
+            key = f"{case.name}@{format_size(size)}"
+            results[key] = result
+
+            previous = (baseline or {}).get("results", {}).get(key)
+            versus = f"{result['ops_per_sec'] / previous['ops_per_sec']:.2f}x" if previous else "-"
+            print(
+                f"{label} {result['ops_per_sec']:>10.1f} {result['seconds_per_op'] * 1000:>10.2f} "
+                f"{size / result['seconds_per_op'] / 1024**2:>8.1f} {result['peak_bytes'] / 1024**2:>8.2f} "
+                f"{result['retained_bytes'] / 1024:>8.1f} {versus:>8}"
+            )
+            # Extrapolate with the growth seen so far, so quadratic cases (e.g. backtracking
+            # regexes) are stopped before a size that would run for hours
+            seconds = result["seconds_per_op"]
+            exponent = 1.0
+            if previous_point is not None and previous_point[1] > 0 and size > previous_point[0]:
+                exponent = max(1.0, math.log(seconds / previous_point[1]) / math.log(size / previous_point[0]))
+            previous_point = (size, seconds)
+            next_size = sizes[index + 1] if index + 1 < len(sizes) else size
+            projected = seconds * (next_size / size) ** exponent
+            if projected > args.max_seconds:
+                too_slow = f"projected {projected:.0f}s per call (over --max-seconds)"
+
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+
+    if args.compare:
+        if baseline is None:
+            print(f"\nNo baseline at {args.baseline}; run with --save-baseline first")
+            sys.exit(1)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regressions beyond {args.tolerance:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,19 @@
 # constants/__init__.py
 from .api_keys import OPEN_AI_API_KEY, SUPABASE_SERVICE_KEY, SUPABASE_URL
-from .llm_model import LLM_MODEL
+from .crawl import BROWSER_ONLY_HOSTS, CRAWL_MEMORY_LIMIT_MB, STATIC_FETCH_ENABLED
+from .llm_model import (
+    EMBEDDING_DIMENSIONS,
+    EMBEDDING_MODEL,
+    LLM_MODEL,
+    SEARCH_MODE,
+    VECTOR_SEARCH_PRECISION,
+)
+from .rate_limits import (
+    OPENAI_CHAT_RPM,
+    OPENAI_CHAT_TPM,
+    OPENAI_EMBEDDING_RPM,
+    OPENAI_EMBEDDING_TPM,
+)
 from .site_map import SITEMAP
 from .sitemap_urls import SITEMAP_URLS
 
@@ -10,5 +23,16 @@ __all__ = [
     "SUPABASE_SERVICE_KEY",
     "SUPABASE_URL",
     "LLM_MODEL",
+    "EMBEDDING_MODEL",
+    "EMBEDDING_DIMENSIONS",
+    "VECTOR_SEARCH_PRECISION",
+    "SEARCH_MODE",
     "SITEMAP_URLS",
+    "OPENAI_CHAT_RPM",
+    "OPENAI_CHAT_TPM",
+    "OPENAI_EMBEDDING_RPM",
+    "OPENAI_EMBEDDING_TPM",
+    "CRAWL_MEMORY_LIMIT_MB",
+    "STATIC_FETCH_ENABLED",
+    "BROWSER_ONLY_HOSTS",
 ]  # Optional: defines what `from constants import *` exposes
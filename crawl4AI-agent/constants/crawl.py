@@ -0,0 +1,15 @@
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# RSS ceiling (browser processes included) for the memory-adaptive crawl dispatcher
+CRAWL_MEMORY_LIMIT_MB = int(os.getenv("CRAWL_MEMORY_LIMIT_MB", "2048"))
+
+# Try a plain HTTP GET + HTML-to-markdown before launching Chromium for a page
+STATIC_FETCH_ENABLED = os.getenv("STATIC_FETCH_ENABLED", "true").lower() == "true"
+# Hosts whose docs are client-rendered and always need the browser (comma separated)
+BROWSER_ONLY_HOSTS = [
+    host.strip() for host in os.getenv("BROWSER_ONLY_HOSTS", "").split(",") if host.strip()
+]
@@ -6,3 +6,11 @@ from dotenv import load_dotenv
 load_dotenv()
 
 LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+# Optional shorter text-embedding-3 vectors (e.g. 512); unset keeps the model's full size
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS")) if os.getenv("EMBEDDING_DIMENSIONS") else None
+# How match_site_pages searches: "full" (float32), "halfvec" or "binary" (both re-scored)
+VECTOR_SEARCH_PRECISION = os.getenv("VECTOR_SEARCH_PRECISION", "full")
+# How the agents retrieve: "vector" (match_site_pages) or "hybrid" (hybrid_match_site_pages,
+# full-text and vector ranks fused)
+SEARCH_MODE = os.getenv("SEARCH_MODE", "vector")
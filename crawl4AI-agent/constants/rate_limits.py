@@ -0,0 +1,12 @@
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Starting budgets for the OpenAI rate limiters; the limiters re-sync from the
+# x-ratelimit-* response headers, so these only need to be roughly right.
+OPENAI_CHAT_RPM = int(os.getenv("OPENAI_CHAT_RPM", "500"))
+OPENAI_CHAT_TPM = int(os.getenv("OPENAI_CHAT_TPM", "200000"))
+OPENAI_EMBEDDING_RPM = int(os.getenv("OPENAI_EMBEDDING_RPM", "3000"))
+OPENAI_EMBEDDING_TPM = int(os.getenv("OPENAI_EMBEDDING_TPM", "1000000"))
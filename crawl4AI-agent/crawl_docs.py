@@ -1,27 +1,85 @@
+import argparse
 import asyncio
 import json
+import logging
 import os
-import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
+from multiprocessing import get_context
 from datetime import datetime, timezone
 from enum import Enum
-from typing import Any, Dict, List
+from typing import Any, AsyncIterable, Dict, Iterable, List, Optional, Tuple, Union
 from urllib.parse import urlparse
-from xml.etree import ElementTree
 
-import requests
+import logfire
 from crawl4ai import AsyncWebCrawler, BrowserConfig, CacheMode, CrawlerRunConfig
 from openai import AsyncOpenAI
-from supabase import Client, create_client
+from supabase import create_client
 
 from constants import (
+    BROWSER_ONLY_HOSTS,
+    EMBEDDING_DIMENSIONS,
+    EMBEDDING_MODEL,
     LLM_MODEL,
     OPEN_AI_API_KEY,
+    OPENAI_CHAT_RPM,
+    OPENAI_CHAT_TPM,
+    OPENAI_EMBEDDING_RPM,
+    OPENAI_EMBEDDING_TPM,
     SITEMAP,
     SUPABASE_SERVICE_KEY,
     SUPABASE_URL,
     SITEMAP_URLS,
+    STATIC_FETCH_ENABLED,
 )
+from utils import (
+    EmbeddingBatcher,
+    Metrics,
+    OpenAIRateLimiter,
+    SitePagesWriter,
+    check_embedding_dimensions,
+    count_tokens,
+    embedding_model_key,
+    get_embedding_cache,
+)
+from utils.chunker import DEFAULT_CHUNK_TOKENS, DEFAULT_OVERLAP_TOKENS, iter_token_chunks
+from utils.tokens import get_encoding
+from utils.dedup import Canonical, NearDuplicateIndex, simhash, to_signed64
+from utils.enrichment import EnrichmentCache, heuristic_title_and_summary
+from utils.incremental import (
+    delete_chunks_from,
+    fetch_chunk,
+    fetch_site_fingerprints,
+    fetch_stored_enrichment,
+    fetch_stored_hashes,
+    hash_text,
+    page_unchanged,
+)
+from utils.ingest_journal import CHUNKED, CRAWLED, EMBEDDED, STORED, IngestJournal
+from utils.page_cache import PageCache
+from utils.pipeline import Emit, Pipeline, Stage
+from utils.session_pool import SessionPool
+from utils.sharding import ShardResult, format_shard_results, shard_for
+from utils.sitemap import STATE_DIR, LastmodState, SitemapEntry, iter_sitemap
+from utils.static_fetch import StaticFetcher
+
+logger = logging.getLogger(__name__)
+
+# Workers per ingestion stage; "crawl" is the number of concurrent browser pages
+STAGE_CONCURRENCY = {"crawl": 5, "chunk": 4, "enrich": 64, "embed": 64, "store": 4}
+
+# Bump whenever TITLE_SUMMARY_PROMPT changes so cached enrichments are not reused
+TITLE_SUMMARY_PROMPT_VERSION = 1
+TITLE_SUMMARY_PROMPT = """You are an AI that extracts titles and summaries from documentation chunks.
+    Return a JSON object with 'title' and 'summary' keys.
+    For the title: If this seems like the start of a document, extract its title. If it's a middle chunk, derive a descriptive title.
+    For the summary: Create a concise summary of the main points in this chunk.
+    Keep both title and summary concise but informative."""
+# Upper bound on completion tokens, counted against the TPM budget up front
+TITLE_SUMMARY_MAX_TOKENS = 300
+# Longest a near-duplicate waits for its canonical chunk before enriching itself
+CANONICAL_WAIT_SECONDS = 300
 
 
 class Sites(Enum):
@@ -40,224 +98,461 @@ class ProcessedChunk:
     content: str
     metadata: Dict[str, Any]
     embedding: List[float]
+    content_hash: str = ""
+    page_hash: str = ""
+    simhash: Optional[int] = None
+    token_count: Optional[int] = None  # Known from chunking, so it is never counted twice
 
 
-def chunk_text(text: str, chunk_size: int = 5000) -> List[str]:
-    """Split text into chunks, respecting code blocks and paragraphs."""
-    chunks = []
-    start = 0
-    text_length = len(text)
-
-    while start < text_length:
-        # Calculate end position
-        end = start + chunk_size
-
-        # If we're at the end of the text, just take what's left
-        if end >= text_length:
-            chunks.append(text[start:].strip())
-            break
-
-        # Try to find a code block boundary first (```)
-        chunk = text[start:end]
-        code_block = chunk.rfind("```")
-        if code_block != -1 and code_block > chunk_size * 0.3:
-            end = start + code_block
-
-        # If no code block, try to break at a paragraph
-        elif "\n\n" in chunk:
-            # Find the last paragraph break
-            last_break = chunk.rfind("\n\n")
-            if (
-                last_break > chunk_size * 0.3
-            ):  # Only break if we're past 30% of chunk_size
-                end = start + last_break
-
-        # If no paragraph break, try to break at a sentence
-        elif ". " in chunk:
-            # Find the last sentence break
-            last_period = chunk.rfind(". ")
-            if (
-                last_period > chunk_size * 0.3
-            ):  # Only break if we're past 30% of chunk_size
-                end = start + last_period + 1
-
-        # Extract chunk and clean it up
-        chunk = text[start:end].strip()
-        if chunk:
-            chunks.append(chunk)
-
-        # Move start position for next chunk
-        start = max(start + 1, end)
-
-    return chunks
-
+@dataclass
+class PageJob:
+    """A crawled page moving through the ingestion pipeline."""
+    url: str
+    site: str
+    markdown: str = ""
+    page_hash: str = ""
+    pending_chunks: int = 0
+    stale_from: Optional[int] = None  # First leftover chunk_number to delete
+    stored: bool = False
 
-async def get_title_and_summary(chunk: str, url: str) -> Dict[str, str]:
-    """Extract title and summary using GPT-4."""
-    system_prompt = """You are an AI that extracts titles and summaries from documentation chunks.
-    Return a JSON object with 'title' and 'summary' keys.
-    For the title: If this seems like the start of a document, extract its title. If it's a middle chunk, derive a descriptive title.
-    For the summary: Create a concise summary of the main points in this chunk.
-    Keep both title and summary concise but informative."""
 
-    try:
-        response = await openai_client.chat.completions.create(
-            model=LLM_MODEL,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {
-                    "role": "user",
-                    "content": f"URL: {url}\n\nContent:\n{chunk[:1000]}...",
-                },  # Send first 1000 chars for context
-            ],
-            response_format={"type": "json_object"},
-        )
-        return json.loads(response.choices[0].message.content)
-    except Exception as e:
-        print(f"Error getting title and summary: {e}")
-        return {
-            "title": "Error processing title",
-            "summary": "Error processing summary",
-        }
+@dataclass
+class ChunkJob:
+    """One chunk of a page; reused chunks already carry their stored enrichment."""
+    page: PageJob
+    chunk: ProcessedChunk
+    reused: bool = False
+    duplicate_of: Optional[Canonical] = None  # Near-duplicate whose enrichment to copy
+    canonical: Optional[Canonical] = None  # Set when later duplicates wait on this chunk
+
+
+def chunk_text(
+    text: str,
+    max_tokens: int = DEFAULT_CHUNK_TOKENS,
+    overlap_tokens: int = DEFAULT_OVERLAP_TOKENS,
+) -> List[str]:
+    """Split markdown into token-budgeted chunks, respecting code fences and headings."""
+    return [chunk.text for chunk in iter_token_chunks(text, max_tokens, overlap_tokens)]
+
+
+def is_title_and_summary(extracted: Any) -> bool:
+    """Whether an LLM or cached enrichment has the string title and summary callers read."""
+    return isinstance(extracted, dict) and all(
+        isinstance(extracted.get(key), str) for key in ("title", "summary")
+    )
 
 
-async def get_embedding(text: str) -> List[float]:
-    """Get embedding vector from OpenAI."""
-    try:
-        response = await openai_client.embeddings.create(
-            model="text-embedding-3-small", input=text
+async def get_title_and_summary(chunk: str, url: str) -> Dict[str, str]:
+    """Extract title and summary from headings, the enrichment cache, or GPT-4."""
+    # Chunks that open with a heading and a prose paragraph need no LLM call
+    extracted = heuristic_title_and_summary(chunk)
+    if extracted is not None:
+        enrichment_cache.heuristic += 1
+        metrics.inc("enrichments", source="heuristic")
+        return extracted
+
+    cached = enrichment_cache.get(chunk, LLM_MODEL, TITLE_SUMMARY_PROMPT_VERSION)
+    # Entries written before responses were checked may lack a key; ask again
+    if is_title_and_summary(cached):
+        metrics.inc("enrichments", source="cache")
+        return cached
+
+    messages = [
+        {"role": "system", "content": TITLE_SUMMARY_PROMPT},
+        {
+            "role": "user",
+            "content": f"URL: {url}\n\nContent:\n{chunk[:1000]}...",
+        },  # Send first 1000 chars for context
+    ]
+    prompt_tokens = sum(count_tokens(message["content"]) for message in messages)
+
+    # Throttling and transient errors are retried by the limiter; anything that
+    # still fails propagates so the chunk is not stored with placeholder text
+    metrics.inc("openai_tokens_sent", prompt_tokens, api="chat")
+    async with metrics.track("openai_request", api="chat"):
+        response = await chat_limiter.call(
+            lambda: openai_client.chat.completions.with_raw_response.create(
+                model=LLM_MODEL,
+                messages=messages,
+                response_format={"type": "json_object"},
+                max_tokens=TITLE_SUMMARY_MAX_TOKENS,
+            ),
+            tokens=prompt_tokens + TITLE_SUMMARY_MAX_TOKENS,
         )
-        return response.data[0].embedding
-    except Exception as e:
-        print(f"Error getting embedding: {e}")
-        return [0] * 1536  # Return zero vector on error
+    metrics.inc("enrichments", source="llm")
+    extracted = json.loads(response.choices[0].message.content)
+    if not is_title_and_summary(extracted):
+        raise ValueError(f"Enrichment for {url} has no title and summary: {extracted!r:.200}")
+    enrichment_cache.set(chunk, LLM_MODEL, TITLE_SUMMARY_PROMPT_VERSION, extracted)
+    return extracted
 
 
-async def process_chunk(chunk: str, chunk_number: int, url: str, site: str) -> ProcessedChunk:
-    """Process a single chunk of text."""
-    # Get title and summary
-    extracted = await get_title_and_summary(chunk, url)
+async def get_embedding(text: str) -> List[float]:
+    """Get embedding vector from the local cache, or from OpenAI batched with other in-flight chunks."""
+    return await embedding_cache.get_or_embed(
+        text, embedding_model_key(EMBEDDING_MODEL, EMBEDDING_DIMENSIONS), embedding_batcher.embed
+    )
 
-    # Get embedding
-    embedding = await get_embedding(chunk)
 
-    # Create metadata
-    metadata = {
+def build_metadata(chunk: str, url: str) -> Dict[str, Any]:
+    """Metadata stored alongside every chunk."""
+    return {
         "model": f"{LLM_MODEL}",
         "chunk_size": len(chunk),
         "crawled_at": datetime.now(timezone.utc).isoformat(),
         "url_path": urlparse(url).path,
     }
 
-    return ProcessedChunk(
-        site=site,
-        url=url,
-        chunk_number=chunk_number,
-        title=extracted["title"],
-        summary=extracted["summary"],
-        content=chunk,  # Store the original chunk content
-        metadata=metadata,
-        embedding=embedding,
-    )
-
 
-async def insert_chunk(chunk: ProcessedChunk):
-    """Insert a processed chunk into Supabase."""
-    try:
-        # Update metadata to include site since we don't have a dedicated column
-        metadata = chunk.metadata.copy()
-        metadata["site"] = chunk.site  # Store site in metadata instead
-        
-        data = {
-            # Remove site field since it doesn't exist in the table
-            "url": chunk.url,
-            "chunk_number": chunk.chunk_number,
-            "title": chunk.title,
-            "summary": chunk.summary,
-            "content": chunk.content,
-            "metadata": metadata,  # Updated metadata with site
-            "embedding": chunk.embedding,
-        }
-
-        result = supabase.table("site_pages").insert(data).execute()
-        print(f"Inserted chunk {chunk.chunk_number} for {chunk.url} from {chunk.site}")
-        return result
-    except Exception as e:
-        print(f"Error inserting chunk: {e}")
-        return None
+def chunk_to_row(chunk: ProcessedChunk) -> Dict[str, Any]:
+    """Convert a processed chunk into a site_pages row."""
+    # Keep site in metadata too; the agents filter on both
+    metadata = chunk.metadata.copy()
+    metadata["site"] = chunk.site
+
+    return {
+        "site": chunk.site,
+        "url": chunk.url,
+        "chunk_number": chunk.chunk_number,
+        "title": chunk.title,
+        "summary": chunk.summary,
+        "content": chunk.content,
+        "metadata": metadata,
+        "embedding": chunk.embedding,
+        "content_hash": chunk.content_hash,
+        "page_hash": chunk.page_hash,
+        "simhash": to_signed64(chunk.simhash) if chunk.simhash is not None else None,
+        # Stored so the agents can pack retrieved chunks into a token budget without tokenizing
+        "token_count": chunk.token_count if chunk.token_count is not None else count_tokens(chunk.content),
+        "summary_token_count": count_tokens(chunk.summary),
+    }
 
 
-async def process_and_store_document(url: str, markdown: str, site: str = Sites.PYDANTIC.value):
-    """Process a document and store its chunks in parallel."""
-    # Split into chunks
-    chunks = chunk_text(markdown)
+async def insert_chunk(chunk: ProcessedChunk):
+    """Queue a processed chunk for the next bulk upsert into Supabase."""
+    await site_pages_writer.add(chunk_to_row(chunk))
+
+
+async def finish_page(page: PageJob):
+    """Called once every chunk of a page has been handed to the writer."""
+    # Drop chunks left over from a longer previous version of the page
+    if page.stale_from is not None:
+        await delete_chunks_from(supabase, page.site, page.url, page.stale_from)
+    page.stored = True
+    metrics.inc("pages_done")
+    metrics.inc("pages_stored")
+
+    # The journal marks the URL stored once the writer has flushed all its chunks
+    ingest_journal.set_url_state(page.url, EMBEDDED)
+    ingest_journal.complete_url(page.url)
+
+
+async def chunk_page(page: PageJob, emit: Emit):
+    """Split a page into chunks, skipping or reusing anything already stored."""
+    token_chunks = list(iter_token_chunks(page.markdown))
+    chunks = [chunk.text for chunk in token_chunks]
+    page.page_hash = hash_text(page.markdown)
+    page.markdown = ""  # The chunks hold the content from here on
+
+    # Nothing to do if this exact page version is already stored
+    stored = await fetch_stored_hashes(supabase, page.site, page.url)
+    if page_unchanged(stored, page.page_hash, len(chunks)):
+        logger.debug(f"Unchanged: {page.url}")
+        page.stored = True
+        metrics.inc("pages_done")
+        metrics.inc("pages_unchanged")
+        ingest_journal.set_url_state(page.url, STORED)
+        return
 
-    # Process chunks in parallel
-    tasks = [process_chunk(chunk, i, url, site) for i, chunk in enumerate(chunks)]
-    processed_chunks = await asyncio.gather(*tasks)
+    # Reuse enrichment and embeddings for chunks whose content is already stored
+    chunk_hashes = [hash_text(chunk) for chunk in chunks]
+    stored_hashes = {chunk.content_hash for chunk in stored}
+    reusable = await fetch_stored_enrichment(
+        supabase, page.site, page.url, [h for h in chunk_hashes if h in stored_hashes]
+    )
+    metrics.inc("chunks", len(chunks) - len(reusable), state="changed")
+    metrics.inc("chunks", len(reusable), state="reused")
+    logger.debug(f"Chunked {page.url}: {len(chunks) - len(reusable)} changed, {len(reusable)} reused chunks")
+    ingest_journal.set_chunks(page.url, enumerate(chunk_hashes))
+    ingest_journal.set_url_state(page.url, CHUNKED)
+
+    if any(chunk.chunk_number >= len(chunks) for chunk in stored):
+        page.stale_from = len(chunks)
+    page.pending_chunks = len(chunks)
+    if not chunks:
+        await finish_page(page)
+        return
 
-    # Store chunks in parallel
-    insert_tasks = [insert_chunk(chunk) for chunk in processed_chunks]
-    await asyncio.gather(*insert_tasks)
+    for i, (chunk, content_hash) in enumerate(zip(chunks, chunk_hashes)):
+        fingerprint = simhash(chunk)
+        processed = ProcessedChunk(
+            site=page.site,
+            url=page.url,
+            chunk_number=i,
+            title="",
+            summary="",
+            content=chunk,  # Store the original chunk content
+            metadata=build_metadata(chunk, page.url),
+            embedding=[],
+            content_hash=content_hash,
+            page_hash=page.page_hash,
+            simhash=fingerprint,
+            token_count=token_chunks[i].tokens,
+        )
+        job = ChunkJob(page, processed)
+        stored_chunk = reusable.get(content_hash)
+        if stored_chunk is not None:
+            processed.title = stored_chunk.title
+            processed.summary = stored_chunk.summary
+            processed.embedding = stored_chunk.embedding
+            job.reused = True
+        else:
+            # Boilerplate and repeated samples reuse the first copy's enrichment
+            job.duplicate_of = dedup_index.find(fingerprint, page.url)
+            if job.duplicate_of is None:
+                job.canonical = dedup_index.add_pending(page.url, i, fingerprint)
+            else:
+                dedup_index.duplicates += 1
+        await emit(job)
+
+
+async def reuse_canonical(job: ChunkJob) -> bool:
+    """Copy title, summary and embedding from the chunk this one near-duplicates."""
+    canonical = job.duplicate_of
+    if canonical.future is not None:
+        try:
+            # Shielded so a timeout here leaves the future to the other duplicates
+            source = await asyncio.wait_for(asyncio.shield(canonical.future), CANONICAL_WAIT_SECONDS)
+        except asyncio.TimeoutError:
+            logger.warning(f"Timed out waiting for canonical chunk {canonical.pointer}")
+            source = None
+    else:
+        try:
+            stored = await fetch_chunk(supabase, job.page.site, canonical.url, canonical.chunk_number)
+        except Exception as e:
+            logger.warning(f"Error loading canonical chunk {canonical.pointer}: {e}")
+            stored = None
+        source = (stored.title, stored.summary, stored.embedding) if stored and stored.embedding else None
+    # The canonical failed or no longer exists; process this chunk on its own
+    if source is None:
+        return False
+
+    job.chunk.title, job.chunk.summary, job.chunk.embedding = source
+    job.chunk.metadata["duplicate_of"] = canonical.pointer
+    job.reused = True
+    dedup_index.reused += 1
+    return True
+
+
+def publish_canonical(job: ChunkJob, failed: bool = False):
+    """Hand this chunk's enrichment to duplicates waiting on it (None if it failed)."""
+    if job.canonical is None or job.canonical.future.done():
+        return
+    if failed:
+        job.canonical.future.set_result(None)
+    else:
+        job.canonical.future.set_result((job.chunk.title, job.chunk.summary, job.chunk.embedding))
 
 
-async def crawl_parallel(urls: List[str], max_concurrent: int = 5, site: str = Sites.PYDANTIC.value):
-    """Crawl multiple URLs in parallel with a concurrency limit."""
+async def enrich_chunk(job: ChunkJob, emit: Emit):
+    """Add the LLM title and summary to a changed chunk."""
+    try:
+        if job.duplicate_of is not None:
+            await reuse_canonical(job)
+        if not job.reused:
+            extracted = await get_title_and_summary(job.chunk.content, job.chunk.url)
+            job.chunk.title = extracted["title"]
+            job.chunk.summary = extracted["summary"]
+        await emit(job)
+    except BaseException:
+        # Errors and cancellation alike must release duplicates waiting on this chunk
+        publish_canonical(job, failed=True)
+        raise
+
+
+async def embed_chunk(job: ChunkJob, emit: Emit):
+    """Embed a changed chunk; concurrent calls share batched requests."""
+    try:
+        if not job.reused:
+            job.chunk.embedding = await get_embedding(job.chunk.content)
+            publish_canonical(job)
+        ingest_journal.set_chunk_state(job.chunk.url, job.chunk.chunk_number, EMBEDDED)
+        await emit(job)
+    except BaseException:
+        # No-op once published; otherwise duplicates waiting on this chunk go on alone
+        publish_canonical(job, failed=True)
+        raise
+
+
+async def store_chunk(job: ChunkJob, emit: Emit):
+    """Hand a finished chunk to the bulk writer and finish its page after the last one."""
+    await insert_chunk(job.chunk)
+    job.page.pending_chunks -= 1
+    if job.page.pending_chunks == 0:
+        await finish_page(job.page)
+
+
+def ingest_stages() -> List[Stage]:
+    """The chunk -> enrich -> embed -> store stages shared by every ingestion path."""
+    return [
+        Stage("chunk", chunk_page, STAGE_CONCURRENCY["chunk"], queue_size=STAGE_CONCURRENCY["crawl"] * 2),
+        Stage("enrich", enrich_chunk, STAGE_CONCURRENCY["enrich"], queue_size=256),
+        Stage("embed", embed_chunk, STAGE_CONCURRENCY["embed"], queue_size=256),
+        Stage("store", store_chunk, STAGE_CONCURRENCY["store"], queue_size=256),
+    ]
+
+
+async def process_and_store_documents(
+    documents: Union[Iterable[Tuple[str, str]], AsyncIterable[Tuple[str, str]]],
+    site: str = Sites.PYDANTIC.value,
+) -> List[str]:
+    """
+    Process (url, markdown) documents through one shared ingest pipeline and
+    return the URLs stored, skipping work for unchanged content. `documents`
+    may be an async iterable, so a caller producing pages over time still
+    feeds a single pipeline for the whole run.
+    """
+    pages: List[PageJob] = []
+
+    async def page_jobs():
+        if hasattr(documents, "__aiter__"):
+            async for url, markdown in documents:
+                pages.append(PageJob(url=url, site=site, markdown=markdown))
+                yield pages[-1]
+        else:
+            for url, markdown in documents:
+                pages.append(PageJob(url=url, site=site, markdown=markdown))
+                yield pages[-1]
+
+    async with site_pages_writer:
+        await Pipeline(ingest_stages(), metrics=metrics).run(page_jobs())
+    return [page.url for page in pages if page.stored]
+
+
+async def crawl_parallel(
+    urls: List[str],
+    max_concurrent: int = STAGE_CONCURRENCY["crawl"],
+    site: str = Sites.PYDANTIC.value,
+    from_cache: bool = False,
+) -> List[str]:
+    """
+    Crawl and ingest URLs as a staged pipeline, returning the URLs stored.
+
+    With `from_cache`, pages come from the local page cache only and nothing is
+    fetched, which makes re-chunking experiments cheap.
+    """
     browser_config = BrowserConfig(
         headless=True,
         verbose=False,
         extra_args=["--disable-gpu", "--disable-dev-shm-usage", "--no-sandbox"],
     )
+    # Pages are cached and revalidated by our own page cache, not crawl4ai's
     crawl_config = CrawlerRunConfig(cache_mode=CacheMode.BYPASS)
 
-    # Create the crawler instance
-    crawler = AsyncWebCrawler(config=browser_config)
-    await crawler.start()
-
-    try:
-        # Create a semaphore to limit concurrency
-        semaphore = asyncio.Semaphore(max_concurrent)
-
-        async def process_url(url: str):
-            async with semaphore:
+    # The browser is only started once a page actually needs it
+    crawler: Optional[AsyncWebCrawler] = None
+    sessions: Optional[SessionPool] = None
+    browser_lock = asyncio.Lock()
+    static_fetcher = None
+    if STATIC_FETCH_ENABLED and not from_cache:
+        static_fetcher = StaticFetcher(browser_hosts=BROWSER_ONLY_HOSTS, page_cache=page_cache)
+
+    async def start_browser():
+        nonlocal crawler, sessions
+        async with browser_lock:
+            if crawler is None:
+                crawler = AsyncWebCrawler(config=browser_config)
+                await crawler.start()
+                # One browser page per crawl slot so they really load in parallel
+                sessions = SessionPool(crawler, size=max_concurrent)
+
+    pages: List[PageJob] = []
+    metrics.set("pages_total", len(urls))
+
+    # Chunks stored by earlier runs count as canonicals for near-duplicate detection
+    if site:
+        dedup_index.preload(await fetch_site_fingerprints(supabase, site))
+
+    async def crawl_page(url: str, emit: Emit):
+        # Pages fetched before an interruption are replayed from the journal
+        markdown = ingest_journal.crawled_markdown(url)
+        if markdown is not None:
+            metrics.inc("pages_fetched", mode="journal")
+        if markdown is None and from_cache:
+            markdown = page_cache.markdown(url)
+            if markdown is None:
+                logger.warning(f"Not in page cache: {url}")
+                metrics.inc("pages_done")
+                metrics.inc("pages_failed", reason="not cached")
+                return
+            metrics.inc("pages_fetched", mode="cache")
+        if markdown is None and static_fetcher is not None:
+            async with metrics.track("fetch", mode="static"):
+                markdown = await static_fetcher.fetch(url, site)
+            if markdown is not None:
+                logger.debug(f"Fetched without browser: {url}")
+                metrics.inc("pages_fetched", mode="static")
+                ingest_journal.set_url_state(url, CRAWLED, markdown=markdown)
+        if markdown is None:
+            await start_browser()
+            # The browser page is released as soon as the page is handed downstream
+            async with metrics.track("fetch", mode="browser"), sessions.session() as session_id:
                 result = await crawler.arun(
-                    url=url, config=crawl_config, session_id="session1"
+                    url=url, config=crawl_config, session_id=session_id
                 )
-                if result.success:
-                    print(f"Successfully crawled: {url}")
-                    await process_and_store_document(
-                        url, result.markdown, site
-                    )
-                else:
-                    print(f"Failed: {url} - Error: {result.error_message}")
-
-        # Process all URLs in parallel with limited concurrency
-        await asyncio.gather(*[process_url(url) for url in urls])
-        # await process_url(urls[0])
+                if not result.success:
+                    sessions.discard(session_id)
+            if not result.success:
+                logger.warning(f"Failed: {url} - Error: {result.error_message}")
+                metrics.inc("pages_done")
+                metrics.inc("pages_failed", reason="browser")
+                ingest_journal.set_url_error(url, str(result.error_message))
+                return
+            metrics.inc("pages_fetched", mode="browser")
+            logger.debug(f"Successfully crawled: {url}")
+            markdown = result.markdown
+            ingest_journal.set_url_state(url, CRAWLED, markdown=markdown)
+            page_cache.set(
+                url, site, result.html, markdown,
+                getattr(result, "response_headers", None), source="browser",
+            )
+        page = PageJob(url=url, site=site, markdown=markdown)
+        pages.append(page)
+        await emit(page)
+
+    # Static fetches are cheap, so run more of them; the session pool still caps browser pages
+    crawl_workers = max_concurrent * 4 if static_fetcher is not None or from_cache else max_concurrent
+
+    try:
+        pipeline = Pipeline(
+            [Stage("crawl", crawl_page, crawl_workers, queue_size=crawl_workers * 2)]
+            + ingest_stages(),
+            metrics=metrics,
+        )
+        await pipeline.run(urls)
+        return [page.url for page in pages if page.stored]
     finally:
-        await crawler.close()
+        if static_fetcher is not None:
+            logger.info(f"Fetch modes: {dict(static_fetcher.stats)}")
+            await static_fetcher.close()
+        if crawler is not None:
+            logger.info(f"Browser sessions: {sessions.stats()}")
+            await sessions.close()
+            await crawler.close()
 
 
-def get_urls(site: str = Sites.PYDANTIC.value) -> List[str]:
-    """Get URLs from documentation sitemap."""
+async def get_urls(site: str = Sites.PYDANTIC.value) -> List[SitemapEntry]:
+    """Get (url, lastmod) entries from the documentation sitemap and any nested sitemaps."""
     try:
         sitemap_url = SITEMAP_URLS[site]
-        response = requests.get(sitemap_url)
-        response.raise_for_status()
-
-        # Parse the XML
-        root = ElementTree.fromstring(response.content)
-
-        # Extract all URLs from the sitemap
-        namespace = {"ns": "http://www.sitemaps.org/schemas/sitemap/0.9"}
-        urls = [loc.text for loc in root.findall(".//ns:loc", namespace)]
-        print(f"Found {len(urls)} URLs in {site} sitemap")
-
-        return urls
-    except Exception as e:
-        print(f"Error fetching sitemap: {e}")
+    except KeyError:
+        logger.error(f"No sitemap configured for {site}")
         return []
 
+    entries = [entry async for entry in iter_sitemap(sitemap_url)]
+    logger.info(f"Found {len(entries)} URLs in {site} sitemap")
+    return entries
+
 
 def get_urls_from_dict() -> List[str]:
     """Get URLs from SITEMAP dictionary."""
@@ -277,26 +572,282 @@ def get_urls_from_dict() -> List[str]:
     return urls
 
 
-async def main(site: str = Sites.PYDANTIC.value):
-    # Get URLs from Pydantic AI docs
-    if site:
-        urls = get_urls(site)
+def log_run_summary(site: str = ""):
+    writes = site_pages_writer.stats
+    logger.info(
+        f"Upserted {writes.rows} chunks in {writes.batches} batches "
+        f"(mean {writes.mean_latency() * 1000:.0f} ms/batch, {writes.failed_rows} rows failed)"
+    )
+
+    stats = embedding_batcher.stats
+    logger.info(
+        f"Embedded {stats.inputs} chunks in {stats.requests} requests "
+        f"({stats.inputs_per_second():.1f} chunks/sec, {stats.failed_requests} failed)"
+    )
+
+    cache_stats = embedding_cache.stats()
+    logger.info(
+        f"Embedding cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+        f"({cache_stats['hit_rate']:.0%} hit rate, {cache_stats['entries']} entries)"
+    )
+
+    page_stats = page_cache.stats()
+    logger.info(
+        f"Page cache: {page_stats['stored']} stored, {page_stats['revalidated']} not modified, "
+        f"{page_stats['hits']} reprocessed from cache ({page_stats['entries']} entries)"
+    )
+
+    dedup_stats = dedup_index.stats()
+    logger.info(
+        f"Near-duplicates: {dedup_stats['duplicates']} found, {dedup_stats['reused']} reused "
+        f"their canonical's enrichment ({dedup_stats['indexed']} chunks indexed)"
+    )
+
+    enrichment_stats = enrichment_cache.stats()
+    logger.info(
+        f"Enrichment: {enrichment_stats['heuristic']} from headings, "
+        f"{enrichment_stats['hits']} cached, {enrichment_stats['misses']} LLM calls"
+    )
+
+    for limiter in (chat_limiter, embedding_limiter):
+        limiter_stats = limiter.stats()
+        logger.info(
+            f"{limiter.name} limiter: {limiter_stats['throttled']} throttled, "
+            f"{limiter_stats['retries']} retries, final concurrency {limiter_stats['concurrency']}"
+        )
+
+    for entry in metrics.snapshot()["histograms"]:
+        labels = ", ".join(f"{key}={value}" for key, value in entry["labels"].items())
+        logger.info(
+            f"Latency {labels}: {entry['count']} calls, "
+            f"p50 {entry['p50'] * 1000:.0f} ms, p95 {entry['p95'] * 1000:.0f} ms"
+        )
+
+    logger.info(f"Journal run {ingest_journal.run_id}: {ingest_journal.counts()}")
+    write_metrics(site)
+
+
+def write_metrics(site: str, shards: Optional[List[ShardResult]] = None):
+    """Save the run's metrics (or every shard's) next to the journal for later comparison."""
+    os.makedirs(STATE_DIR, exist_ok=True)
+    path = os.path.join(STATE_DIR, f"metrics_{site or 'all'}.json")
+    if shards is None:
+        metrics.write_snapshot(path)
     else:
-        urls = get_urls_from_dict()
+        with open(path, "w") as f:
+            json.dump({"shards": [result.metrics for result in shards]}, f, indent=2)
+    logger.info(f"Metrics written to {path}")
+
+
+def configure_logging(level: int = logging.INFO, worker: bool = False):
+    """Log setup for the main process and, as the pool initializer, every spawned shard worker."""
+    # Worker lines are interleaved on the same terminal, so they name their process
+    process = " %(processName)s" if worker else ""
+    # force: importing constants logs at module level, which installs a default WARNING handler
+    logging.basicConfig(
+        level=level, format=f"%(asctime)s{process} %(levelname)s %(name)s: %(message)s", force=True
+    )
+    logging.getLogger("httpx").setLevel(logging.WARNING)  # One line per Supabase/OpenAI request otherwise
+
+
+def init_clients(workers: int = 1):
+    """Create the module-level clients; every worker process builds its own."""
+    global openai_client, supabase, chat_limiter, embedding_limiter, embedding_batcher
+    global embedding_cache, enrichment_cache, ingest_journal, page_cache, site_pages_writer
+    global dedup_index, metrics
+
+    # Fail before crawling anything rather than hash chunks cut with approximate counts
+    get_encoding()
+
+    # Spans go to logfire only when a token is configured
+    logfire.configure(send_to_logfire="if-token-present", service_name="crawl_docs", console=False)
+    metrics = Metrics()
+
+    # Retries are handled by the rate limiters, which know about the shared budget
+    openai_client = AsyncOpenAI(api_key=OPEN_AI_API_KEY, max_retries=0)
+    supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+    # Refuse to write vectors the table and search functions were not sized for
+    check_embedding_dimensions(supabase)
+    # Workers split the account's budgets evenly instead of each assuming all of it
+    chat_limiter = OpenAIRateLimiter(
+        "chat", OPENAI_CHAT_RPM // workers, OPENAI_CHAT_TPM // workers
+    )
+    embedding_limiter = OpenAIRateLimiter(
+        "embedding", OPENAI_EMBEDDING_RPM // workers, OPENAI_EMBEDDING_TPM // workers
+    )
+    embedding_batcher = EmbeddingBatcher(
+        openai_client, model=EMBEDDING_MODEL, limiter=embedding_limiter, metrics=metrics
+    )
+    embedding_cache = get_embedding_cache()
+    enrichment_cache = EnrichmentCache()
+    ingest_journal = IngestJournal()
+    page_cache = PageCache()
+    dedup_index = NearDuplicateIndex()
+    site_pages_writer = SitePagesWriter(
+        supabase,
+        on_flushed=lambda rows: ingest_journal.mark_chunks_stored(
+            (row["url"], row["chunk_number"]) for row in rows
+        ),
+        metrics=metrics,
+    )
 
-    if not urls:
-        print("No URLs found to crawl")
+
+def crawl_shard(
+    site: str, run_id: int, shard: int, workers: int, from_cache: bool = False
+) -> ShardResult:
+    """Worker process entry point: crawl this shard's pending URLs with its own browser."""
+    started = time.perf_counter()
+    result = ShardResult(shard=shard)
+    try:
+        init_clients(workers)
+        ingest_journal.join_run(run_id)
+        urls = [
+            entry.url for entry in ingest_journal.pending_urls()
+            if shard_for(entry.url, workers) == shard
+        ]
+        result.urls = len(urls)
+        logger.info(f"[shard {shard}] {len(urls)} URLs")
+
+        async def run() -> List[str]:
+            async with site_pages_writer:
+                return await crawl_parallel(urls, site=site, from_cache=from_cache)
+
+        if urls:
+            result.stored_urls = asyncio.run(run())
+        result.rows = site_pages_writer.stats.rows
+        result.failed_rows = site_pages_writer.stats.failed_rows
+        result.embedded = embedding_batcher.stats.inputs
+        result.metrics = metrics.snapshot()
+    except Exception as e:
+        logger.exception(f"[shard {shard}] Error: {e}")
+        result.error = str(e)
+    finally:
+        result.seconds = time.perf_counter() - started
+    return result
+
+
+async def crawl_sharded(
+    site: str, workers: int, from_cache: bool = False, progress_interval: float = 10.0
+) -> List[ShardResult]:
+    """Fan the current run out to `workers` processes and report progress from the journal."""
+    loop = asyncio.get_running_loop()
+    # Spawn rather than fork: each worker needs a fresh event loop and Chromium.
+    # Spawned workers start without logging configured, so they set it up like this process
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=get_context("spawn"),
+        initializer=configure_logging, initargs=(logging.getLogger().getEffectiveLevel(), True),
+    ) as executor:
+        futures = [
+            loop.run_in_executor(
+                executor, crawl_shard, site, ingest_journal.run_id, shard, workers, from_cache
+            )
+            for shard in range(workers)
+        ]
+        pending = set(futures)
+        while pending:
+            _, pending = await asyncio.wait(pending, timeout=progress_interval)
+            logger.info(f"Progress ({workers - len(pending)}/{workers} workers done): {ingest_journal.counts()}")
+        return [future.result() for future in futures]
+
+
+async def main(
+    site: str = Sites.PYDANTIC.value,
+    only_changed: bool = True,
+    resume: bool = False,
+    workers: int = 1,
+    from_cache: bool = False,
+):
+    # A cache-only run reprocesses every cached page, whatever the sitemap says
+    lastmod_state = LastmodState(site) if site and only_changed and not from_cache else None
+
+    if ingest_journal.start_run(site or "all", resume=resume):
+        # Pick up the URLs the interrupted run had not stored yet
+        entries = ingest_journal.pending_urls()
+        logger.info(f"Resuming run {ingest_journal.run_id}: {len(entries)} URLs left")
+    else:
+        # Get URLs from the page cache or the site's sitemap
+        if from_cache:
+            entries = [SitemapEntry(url, None) for url in page_cache.urls(site or None)]
+            logger.info(f"Found {len(entries)} cached pages")
+        elif site:
+            entries = await get_urls(site)
+            if lastmod_state is not None:
+                entries = lastmod_state.filter_changed(entries)
+                logger.info(f"{len(entries)} URLs are new or updated since the last run")
+        else:
+            entries = [SitemapEntry(url, None) for url in get_urls_from_dict()]
+        ingest_journal.add_urls(entries)
+
+    if not entries:
+        logger.warning("No URLs found to crawl")
+        ingest_journal.finish_run()
         return
 
-    await crawl_parallel(urls, site=site)
+    if workers > 1:
+        results = await crawl_sharded(site, workers, from_cache=from_cache)
+        logger.info(f"Sharded crawl finished:\n{format_shard_results(results)}")
+        stored_urls = [url for result in results for url in result.stored_urls]
+        failed = any(result.error or result.failed_rows for result in results)
+    else:
+        async with site_pages_writer:
+            stored_urls = await crawl_parallel(
+                [entry.url for entry in entries], site=site, from_cache=from_cache
+            )
+        failed = site_pages_writer.stats.failed_rows > 0
+
+    # Only remember lastmods of pages that made it into the database
+    if lastmod_state is not None and not failed:
+        stored = set(stored_urls)
+        lastmod_state.mark_processed(entry for entry in entries if entry.url in stored)
+        lastmod_state.save()
+
+    if not ingest_journal.pending_urls():
+        ingest_journal.finish_run()
+
+    if workers > 1:
+        logger.info(f"Journal run {ingest_journal.run_id}: {ingest_journal.counts()}")
+        write_metrics(site, shards=results)
+    else:
+        log_run_summary(site)
 
 
 if __name__ == "__main__":
-    # Initialize OpenAI and Supabase clients
-    openai_client = AsyncOpenAI(api_key=OPEN_AI_API_KEY)
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+    configure_logging()
 
     # What do you want to crawl?
-    SITE = Sites.FILECOIN.value
+    parser = argparse.ArgumentParser(description="Crawl documentation into Supabase.")
+    parser.add_argument("--site", default=Sites.FILECOIN.value, choices=[s.value for s in Sites])
+    parser.add_argument("--resume", action="store_true", help="Continue the last unfinished run for the site")
+    parser.add_argument("--all-urls", action="store_true", help="Crawl every sitemap URL, not only new or updated ones")
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help=f"Worker processes, each with its own browser (this host has {os.cpu_count()} cores)",
+    )
+    parser.add_argument(
+        "--from-cache", action="store_true",
+        help="Reprocess pages from the local page cache without any network fetches",
+    )
+    parser.add_argument(
+        "--metrics-port", type=int, default=None,
+        help="Serve Prometheus metrics on this port (/metrics, /metrics.json) during a single-worker run",
+    )
+    args = parser.parse_args()
+    if args.metrics_port and args.workers > 1:
+        # Workers keep their own Metrics and only report them when they finish
+        parser.error("--metrics-port needs --workers 1; sharded runs write per-shard metrics when they finish")
+    SITE = args.site
 
-    asyncio.run(main(SITE))
+    # Initialize OpenAI and Supabase clients
+    init_clients()
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+
+    asyncio.run(
+        main(
+            SITE,
+            only_changed=not args.all_urls,
+            resume=args.resume,
+            workers=max(1, args.workers),
+            from_cache=args.from_cache,
+        )
+    )
@@ -1,9 +1,9 @@
 import asyncio
+import itertools
 import os
 import sys
 from xml.etree import ElementTree
 
-import psutil
 import requests
 
 __location__ = os.path.dirname(os.path.abspath(__file__))
@@ -17,22 +17,12 @@ from typing import List
 
 from crawl4ai import AsyncWebCrawler, BrowserConfig, CacheMode, CrawlerRunConfig
 
+from constants import CRAWL_MEMORY_LIMIT_MB
+from utils.memory_dispatcher import MemoryAdaptiveDispatcher
 
-async def crawl_parallel(urls: List[str], max_concurrent: int = 3):
-    print("\n=== Parallel Crawling with Browser Reuse + Memory Check ===")
 
-    # We'll keep track of peak memory usage across all tasks
-    peak_memory = 0
-    process = psutil.Process(os.getpid())
-
-    def log_memory(prefix: str = ""):
-        nonlocal peak_memory
-        current_mem = process.memory_info().rss  # in bytes
-        if current_mem > peak_memory:
-            peak_memory = current_mem
-        print(
-            f"{prefix} Current Memory: {current_mem // (1024 * 1024)} MB, Peak: {peak_memory // (1024 * 1024)} MB"
-        )
+async def crawl_parallel(urls: List[str], max_concurrent: int = 3, memory_limit_mb: int = CRAWL_MEMORY_LIMIT_MB):
+    print("\n=== Parallel Crawling with Browser Reuse + Memory-Adaptive Concurrency ===")
 
     # Minimal browser config
     browser_config = BrowserConfig(
@@ -46,49 +36,66 @@ async def crawl_parallel(urls: List[str], max_concurrent: int = 3):
     crawler = AsyncWebCrawler(config=browser_config)
     await crawler.start()
 
+    async def restart_browser():
+        # Chromium holds on to memory from heavy pages; a fresh browser gives it back
+        nonlocal crawler
+        await crawler.close()
+        crawler = AsyncWebCrawler(config=browser_config)
+        await crawler.start()
+
+    # Window grows from max_concurrent while memory is low and shrinks near the ceiling
+    dispatcher = MemoryAdaptiveDispatcher(
+        memory_limit_mb,
+        initial_concurrency=max_concurrent,
+        max_concurrency=max_concurrent * 4,
+        on_restart=restart_browser,
+    )
+    session_ids = itertools.count()
+
+    def log_memory(prefix: str = ""):
+        current_mem = dispatcher.sample()
+        print(
+            f"{prefix} Current Memory: {current_mem // (1024 * 1024)} MB, "
+            f"Peak: {dispatcher.peak_rss // (1024 * 1024)} MB, Window: {dispatcher.concurrency}"
+        )
+
+    async def crawl_url(url: str):
+        # Unique session_id per concurrent sub-task
+        index = next(session_ids)
+        result = await crawler.arun(
+            url=url, config=crawl_config, session_id=f"parallel_session_{index}"
+        )
+        if index % 10 == 0:
+            log_memory(prefix=f"After URL {index}: ")
+        return result
+
     try:
-        # We'll chunk the URLs in batches of 'max_concurrent'
+        log_memory(prefix="Start: ")
+        results = await dispatcher.run(urls, crawl_url)
+
+        # Evaluate results
         success_count = 0
         fail_count = 0
-        for i in range(0, len(urls), max_concurrent):
-            batch = urls[i : i + max_concurrent]
-            tasks = []
-
-            for j, url in enumerate(batch):
-                # Unique session_id per concurrent sub-task
-                session_id = f"parallel_session_{i + j}"
-                task = crawler.arun(url=url, config=crawl_config, session_id=session_id)
-                tasks.append(task)
-
-            # Check memory usage prior to launching tasks
-            log_memory(prefix=f"Before batch {i//max_concurrent + 1}: ")
-
-            # Gather results
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-
-            # Check memory usage after tasks complete
-            log_memory(prefix=f"After batch {i//max_concurrent + 1}: ")
-
-            # Evaluate results
-            for url, result in zip(batch, results):
-                if isinstance(result, Exception):
-                    print(f"Error crawling {url}: {result}")
-                    fail_count += 1
-                elif result.success:
-                    success_count += 1
-                else:
-                    fail_count += 1
+        for url, result in results:
+            if isinstance(result, BaseException):
+                print(f"Error crawling {url}: {result}")
+                fail_count += 1
+            elif result.success:
+                success_count += 1
+            else:
+                fail_count += 1
 
         print(f"\nSummary:")
         print(f"  - Successfully crawled: {success_count}")
         print(f"  - Failed: {fail_count}")
+        print(f"  - Dispatcher: {dispatcher.stats()}")
 
     finally:
         print("\nClosing crawler...")
         await crawler.close()
         # Final memory log
         log_memory(prefix="Final: ")
-        print(f"\nPeak memory usage (MB): {peak_memory // (1024 * 1024)}")
+        print(f"\nPeak memory usage (MB): {dispatcher.peak_rss // (1024 * 1024)}")
 
 
 def get_pydantic_ai_docs_urls():
@@ -1,5 +1,6 @@
 import asyncio
 import json
+import logging
 import os
 import sys
 from dataclasses import dataclass
@@ -19,6 +20,7 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 # print(sys.path)
 
 from constants import (
+    EMBEDDING_MODEL,
     LLM_MODEL,
     OPEN_AI_API_KEY,
     SITEMAP,
@@ -26,11 +28,17 @@ from constants import (
     SUPABASE_URL,
     SITEMAP_URLS,
 )
+from utils import EmbeddingBatcher, check_embedding_dimensions, count_tokens
+from utils.session_pool import SessionPool
+from utils.tokens import get_encoding
 
 
+logger = logging.getLogger(__name__)
+
 # Initialize OpenAI and Supabase clients
 openai_client = AsyncOpenAI(api_key=OPEN_AI_API_KEY)
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+embedding_batcher = EmbeddingBatcher(openai_client, model=EMBEDDING_MODEL)
 
 
 class Sites(Enum):
@@ -125,7 +133,7 @@ async def get_title_and_summary(chunk: str, url: str) -> Dict[str, str]:
         )
         return json.loads(response.choices[0].message.content)
     except Exception as e:
-        print(f"Error getting title and summary: {e}")
+        logger.warning(f"Error getting title and summary: {e}")
         return {
             "title": "Error processing title",
             "summary": "Error processing summary",
@@ -133,15 +141,8 @@ async def get_title_and_summary(chunk: str, url: str) -> Dict[str, str]:
 
 
 async def get_embedding(text: str) -> List[float]:
-    """Get embedding vector from OpenAI."""
-    try:
-        response = await openai_client.embeddings.create(
-            model="text-embedding-3-small", input=text
-        )
-        return response.data[0].embedding
-    except Exception as e:
-        print(f"Error getting embedding: {e}")
-        return [0] * 1536  # Return zero vector on error
+    """Get embedding vector from OpenAI, batched with other in-flight chunks."""
+    return await embedding_batcher.embed(text)
 
 
 async def process_chunk(chunk: str, chunk_number: int, url: str) -> ProcessedChunk:
@@ -183,13 +184,15 @@ async def insert_chunk(chunk: ProcessedChunk):
             "content": chunk.content,
             "metadata": chunk.metadata,
             "embedding": chunk.embedding,
+            "token_count": count_tokens(chunk.content),
+            "summary_token_count": count_tokens(chunk.summary),
         }
 
         result = supabase.table("site_pages").insert(data).execute()
-        print(f"Inserted chunk {chunk.chunk_number} for {chunk.url}")
+        logger.debug(f"Inserted chunk {chunk.chunk_number} for {chunk.url}")
         return result
     except Exception as e:
-        print(f"Error inserting chunk: {e}")
+        logger.error(f"Error inserting chunk: {e}")
         return None
 
 
@@ -220,26 +223,29 @@ async def crawl_parallel(urls: List[str], site: str, max_concurrent: int = 5):
     crawler = AsyncWebCrawler(config=browser_config)
     await crawler.start()
 
-    try:
-        # Create a semaphore to limit concurrency
-        semaphore = asyncio.Semaphore(max_concurrent)
+    # Each concurrent crawl gets its own browser page instead of sharing one session
+    sessions = SessionPool(crawler, size=max_concurrent)
 
+    try:
         async def process_url(url: str):
-            async with semaphore:
+            async with sessions.session() as session_id:
                 result = await crawler.arun(
-                    url=url, config=crawl_config, session_id="session1"
+                    url=url, config=crawl_config, session_id=session_id
                 )
-                if result.success:
-                    print(f"Successfully crawled: {url}")
-                    await process_and_store_document(
-                        url, result.markdown_v2.raw_markdown
-                    )
-                else:
-                    print(f"Failed: {url} - Error: {result.error_message}")
+                if not result.success:
+                    sessions.discard(session_id)
+            if result.success:
+                logger.info(f"Successfully crawled: {url}")
+                await process_and_store_document(
+                    url, result.markdown_v2.raw_markdown
+                )
+            else:
+                logger.warning(f"Failed: {url} - Error: {result.error_message}")
 
         # Process all URLs in parallel with limited concurrency
         await asyncio.gather(*[process_url(url) for url in urls])
     finally:
+        await sessions.close()
         await crawler.close()
 
 
@@ -259,7 +265,7 @@ def get_urls(site: str = Sites.PYDANTIC.value) -> List[str]:
 
         return urls
     except Exception as e:
-        print(f"Error fetching sitemap: {e}")
+        logger.error(f"Error fetching sitemap: {e}")
         return []
 
 
@@ -282,19 +288,24 @@ def get_urls_from_dict(site: str = "Etsy") -> List[str]:
 
 
 async def main():
+    # Stored token counts must be exact, so fail before crawling if tiktoken cannot load
+    get_encoding()
+    check_embedding_dimensions(supabase)
+
     # Get URLs from Pydantic AI docs
     # urls = get_urls_from_dict()
     urls = get_urls(SITE)
 
     if not urls:
-        print("No URLs found to crawl")
+        logger.warning("No URLs found to crawl")
         return
 
-    print(f"Found {len(urls)} URLs to crawl")
+    logger.info(f"Found {len(urls)} URLs to crawl")
     await crawl_parallel(urls)
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
     asyncio.run(main())
     # print(get_urls_from_dict(SITE))
     # print(get_urls(SITE))
\ No newline at end of file
@@ -0,0 +1,194 @@
+import hashlib
+import itertools
+import json
+import re
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .fake_server import FakeServer, FaultConfig, percentile
+
+# Full output sizes of the embedding models; `dimensions` in the request overrides them
+MODEL_DIMENSIONS = {"text-embedding-3-small": 1536, "text-embedding-3-large": 3072, "text-embedding-ada-002": 1536}
+_WORD = re.compile(r"\w+")
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def fake_embedding(text: str, dimensions: int) -> List[float]:
+    """Normalized hashed bag of words, so texts sharing words land close together."""
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for word in _WORD.findall(text.lower()):
+        digest = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "big")
+        vector[digest % dimensions] += 1.0 if digest >> 63 else -1.0
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector /= norm
+    return [round(float(value), 6) for value in vector]
+
+
+def _text(content: Any) -> str:
+    """Message content as text, whether a string or a list of content parts."""
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content or ""
+
+
+class FakeOpenAI(FakeServer):
+    """
+    OpenAI-compatible /v1/embeddings and /v1/chat/completions.
+
+    Embeddings are deterministic hashed bags of words. Chat requests asking for
+    a JSON object get a title and summary; requests offering tools get one tool
+    call (preferring `retrieve_relevant_documentation`) and then, once the tool
+    result comes back, a final answer. The time between handing out a tool call
+    and receiving its result is recorded as the client's tool latency, and
+    results that start with "Error" or "Connection error" count as tool errors.
+    `tool_arguments` are added to a tool call when the tool accepts them (e.g.
+    the site to search).
+    Successful responses carry x-ratelimit-* headers for the advertised limits.
+    """
+
+    name = "openai"
+
+    def __init__(
+        self,
+        faults: Optional[FaultConfig] = None,
+        requests_per_minute: int = 10_000,
+        tokens_per_minute: int = 10_000_000,
+        tool_arguments: Optional[Dict[str, Any]] = None,
+    ):
+        self.tool_arguments = tool_arguments or {}
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._window: deque = deque()  # (time, tokens) of the last minute's requests
+        self._call_ids = itertools.count(1)
+        super().__init__(faults)
+
+    def reset(self):
+        super().reset()
+        self.pending_tool_calls: Dict[str, float] = {}
+        self.tool_latencies: List[float] = []
+        self.tool_calls = 0
+        self.tool_errors = 0
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        with self.lock:
+            stats.update(
+                tool_calls=self.tool_calls,
+                tool_results=len(self.tool_latencies),
+                tool_errors=self.tool_errors,
+                tool_p50_ms=percentile(self.tool_latencies, 0.5) * 1000,
+                tool_p99_ms=percentile(self.tool_latencies, 0.99) * 1000,
+            )
+        return stats
+
+    def _rate_limit_headers(self, tokens: int) -> Dict[str, str]:
+        now = time.monotonic()
+        with self.lock:
+            self._window.append((now, tokens))
+            while self._window and self._window[0][0] < now - 60:
+                self._window.popleft()
+            used_requests = len(self._window)
+            used_tokens = sum(count for _, count in self._window)
+        return {
+            "x-ratelimit-limit-requests": str(self.requests_per_minute),
+            "x-ratelimit-remaining-requests": str(max(0, self.requests_per_minute - used_requests)),
+            "x-ratelimit-limit-tokens": str(self.tokens_per_minute),
+            "x-ratelimit-remaining-tokens": str(max(0, self.tokens_per_minute - used_tokens)),
+            "x-ratelimit-reset-requests": "60ms",
+            "x-ratelimit-reset-tokens": "60ms",
+        }
+
+    def route(self, method, path, query, body, headers) -> Tuple[int, Any, Dict[str, str]]:
+        if method != "POST" or not isinstance(body, dict):
+            return 404, {"error": {"message": f"Unknown route {method} {path}"}}, {}
+        if path.endswith("/embeddings"):
+            return self._embeddings(body)
+        if path.endswith("/chat/completions"):
+            return self._chat(body)
+        return 404, {"error": {"message": f"Unknown route {method} {path}"}}, {}
+
+    def _embeddings(self, body: Dict[str, Any]):
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        dimensions = body.get("dimensions") or MODEL_DIMENSIONS.get(body.get("model"), 1536)
+        tokens = sum(_tokens(text) for text in inputs)
+        return 200, {
+            "object": "list",
+            "model": body.get("model"),
+            "data": [
+                {"object": "embedding", "index": index, "embedding": fake_embedding(text, dimensions)}
+                for index, text in enumerate(inputs)
+            ],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }, self._rate_limit_headers(tokens)
+
+    def _chat(self, body: Dict[str, Any]):
+        messages = body.get("messages") or []
+        prompt = " ".join(_text(message.get("content")) for message in messages)
+        message: Dict[str, Any] = {"role": "assistant", "content": None}
+        finish_reason = "stop"
+
+        if (body.get("response_format") or {}).get("type") == "json_object":
+            content = _text(messages[-1].get("content")) if messages else ""
+            content = content.split("Content:", 1)[-1]
+            lines = [line.strip("# ").strip() for line in content.splitlines() if line.strip()]
+            message["content"] = json.dumps({
+                "title": (lines[0] if lines else "Untitled")[:80],
+                "summary": " ".join(lines[1:3])[:200] or "No summary.",
+            })
+        elif body.get("tools") and messages and messages[-1].get("role") != "tool":
+            message["tool_calls"] = [self._tool_call(body["tools"], messages)]
+            finish_reason = "tool_calls"
+        else:
+            now = time.monotonic()
+            with self.lock:
+                for previous in messages:
+                    started = self.pending_tool_calls.pop(previous.get("tool_call_id", ""), None)
+                    if started is not None:
+                        self.tool_latencies.append(now - started)
+                        if _text(previous.get("content")).lstrip('"').startswith(("Error", "Connection error")):
+                            self.tool_errors += 1
+            message["content"] = "Based on the documentation: " + prompt[-200:]
+
+        completion_tokens = _tokens(message["content"] or "") if message["content"] else 20
+        prompt_tokens = _tokens(prompt)
+        return 200, {
+            "id": f"chatcmpl-{next(self._call_ids)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }, self._rate_limit_headers(prompt_tokens + completion_tokens)
+
+    def _tool_call(self, tools: List[Dict[str, Any]], messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        functions = [tool["function"] for tool in tools if tool.get("type") == "function"]
+        function = next(
+            (f for f in functions if f["name"] == "retrieve_relevant_documentation"), functions[0]
+        )
+        question = next(
+            (_text(m.get("content")) for m in reversed(messages) if m.get("role") == "user"), ""
+        )
+        properties = (function.get("parameters") or {}).get("properties") or {}
+        arguments = {key: value for key, value in self.tool_arguments.items() if key in properties}
+        if "user_query" in properties:
+            arguments["user_query"] = question
+        call_id = f"call_{next(self._call_ids)}"
+        with self.lock:
+            self.tool_calls += 1
+            self.pending_tool_calls[call_id] = time.monotonic()
+        return {
+            "id": call_id,
+            "type": "function",
+            "function": {"name": function["name"], "arguments": json.dumps(arguments)},
+        }
@@ -0,0 +1,308 @@
+import csv
+import itertools
+import json
+import re
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .fake_server import FakeServer, FaultConfig
+
+_RESERVED_PARAMS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+# Columns pgvector returns as text, e.g. "[0.1,0.2]"
+_VECTOR_COLUMNS = {"embedding"}
+_WORD = re.compile(r"\w[\w.]*\w|\w")
+# Full-text weights of the A/B/C parts of the fts column
+_TEXT_WEIGHTS = {"title": 1.0, "summary": 0.4, "content": 0.1}
+_RESULT_COLUMNS = (
+    "id", "site", "url", "chunk_number", "title", "summary", "content", "metadata",
+    "token_count", "summary_token_count",
+)
+
+
+def _column(row: Dict[str, Any], path: str) -> Any:
+    """Resolve `metadata->>model` style JSON paths against a row."""
+    parts = path.replace("->>", "->").split("->")
+    value = row.get(parts[0].strip())
+    for part in parts[1:]:
+        value = value.get(part.strip()) if isinstance(value, dict) else None
+    return value
+
+
+def _text(value: Any) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return str(value)
+
+
+def _compare(value: Any, operand: str) -> Optional[float]:
+    """Numeric comparison when both sides are numbers, text comparison otherwise."""
+    try:
+        left, right = float(value), float(operand)
+    except (TypeError, ValueError):
+        left, right = _text(value), operand
+    return (left > right) - (left < right)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _in_values(operand: str) -> List[str]:
+    return next(csv.reader([operand.strip("()")], quotechar='"', skipinitialspace=True), [])
+
+
+def _matches(value: Any, expression: str) -> bool:
+    negate = expression.startswith("not.")
+    if negate:
+        expression = expression[4:]
+    operator, _, operand = expression.partition(".")
+    if operator == "eq":
+        result = _text(value) == operand
+    elif operator == "neq":
+        result = _text(value) != operand
+    elif operator in ("gt", "gte", "lt", "lte"):
+        if value is None:
+            result = False
+        else:
+            order = _compare(value, operand)
+            result = {"gt": order > 0, "gte": order >= 0, "lt": order < 0, "lte": order <= 0}[operator]
+    elif operator == "in":
+        result = _text(value) in _in_values(operand)
+    elif operator == "is":
+        result = _text(value) == operand
+    elif operator == "like":
+        result = operand.replace("*", "") in _text(value)
+    else:
+        raise ValueError(f"Unsupported filter operator: {operator}")
+    return result != negate
+
+
+class FakePostgREST(FakeServer):
+    """
+    In-memory PostgREST stand-in for the tables and RPCs the crawler and agents use.
+
+    Supports select with column lists and `select=count`, eq/neq/gt/gte/lt/lte/
+    in/is/like filters (with `not.`), JSON `->>` paths, order, limit/offset and
+    Range pagination, exact counts, insert, upsert on a conflict key, update and
+    delete. Writes stamp `created_at`/`updated_at` and deleted `site_pages` ids
+    go to `site_pages_deleted`, like the triggers in utils/site_pages.sql.
+
+    `match_site_pages` ranks rows by cosine similarity, like pgvector's `<=>`,
+    over the site's rows whose metadata contains the filter.
+    `hybrid_match_site_pages` fuses that ranking with a weighted term-match
+    ranking by reciprocal rank fusion.
+    """
+
+    name = "postgrest"
+
+    def __init__(self, faults: Optional[FaultConfig] = None):
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+        self._ids = itertools.count(1)
+        self._vectors: Dict[str, Tuple[int, np.ndarray, List[Dict[str, Any]]]] = {}
+        self._version = 0
+        self.rpcs: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+            "match_site_pages": self._match_site_pages,
+            "hybrid_match_site_pages": self._hybrid_match_site_pages,
+        }
+        super().__init__(faults)
+
+    def route(self, method, path, query, body, headers) -> Tuple[int, Any, Dict[str, str]]:
+        parts = [part for part in path.split("/") if part]
+        if parts[:2] != ["rest", "v1"] or len(parts) < 3:
+            return 404, {"message": f"Unknown route {path}"}, {}
+        if parts[2] == "rpc":
+            rpc = self.rpcs.get(parts[3] if len(parts) > 3 else "")
+            if rpc is None:
+                return 404, {"message": f"Could not find the function {parts[-1]}"}, {}
+            with self.lock:
+                return 200, rpc(body or {}), {}
+
+        table = parts[2]
+        params = dict(query)
+        filters = [(key, value) for key, value in query if key not in _RESERVED_PARAMS]
+        prefer = headers.get("prefer", "")
+        with self.lock:
+            rows = self.tables.setdefault(table, [])
+            if method in ("GET", "HEAD"):
+                return self._select(rows, params, filters, prefer, headers.get("range"))
+            if method == "POST":
+                return 201, self._insert(rows, body, params, prefer), {}
+            if method == "PATCH":
+                matched = [row for row in rows if self._filtered(row, filters)]
+                for row in matched:
+                    row.update(body or {}, updated_at=_now())
+                self._version += 1
+                return 200, [self._render(row) for row in matched], {}
+            if method == "DELETE":
+                removed = [row for row in rows if self._filtered(row, filters)]
+                rows[:] = [row for row in rows if not self._filtered(row, filters)]
+                if table == "site_pages":
+                    deleted_at = _now()
+                    self.tables.setdefault("site_pages_deleted", []).extend(
+                        {"id": row["id"], "deleted_at": deleted_at} for row in removed
+                    )
+                self._version += 1
+                return 200, [self._render(row) for row in removed], {}
+        return 405, {"message": f"Unsupported method {method}"}, {}
+
+    @staticmethod
+    def _filtered(row: Dict[str, Any], filters: List[Tuple[str, str]]) -> bool:
+        return all(_matches(_column(row, key), expression) for key, expression in filters)
+
+    @staticmethod
+    def _render(row: Dict[str, Any], columns: Optional[List[str]] = None) -> Dict[str, Any]:
+        selected = {column: _column(row, column) for column in columns} if columns else dict(row)
+        for column in _VECTOR_COLUMNS & selected.keys():
+            if isinstance(selected[column], list):
+                selected[column] = "[" + ",".join(str(value) for value in selected[column]) + "]"
+        return selected
+
+    def _select(self, rows, params, filters, prefer: str, range_header: Optional[str]):
+        matched = [row for row in rows if self._filtered(row, filters)]
+        for term in reversed([term for term in params.get("order", "").split(",") if term]):
+            column, _, direction = term.partition(".")
+            matched.sort(
+                key=lambda row: (_column(row, column) is None, _column(row, column) or 0),
+                reverse=direction.startswith("desc"),
+            )
+
+        total = len(matched)
+        offset = int(params.get("offset", 0))
+        limit = int(params["limit"]) if "limit" in params else None
+        if range_header and "-" in range_header:
+            start, _, end = range_header.partition("-")
+            offset, limit = int(start), int(end) - int(start) + 1
+        matched = matched[offset: offset + limit if limit is not None else None]
+
+        select = [column.strip() for column in params.get("select", "*").split(",")]
+        if select == ["count"]:
+            payload = [{"count": total}]
+        else:
+            columns = None if select == ["*"] else select
+            payload = [self._render(row, columns) for row in matched]
+        headers = {}
+        if "count=" in prefer:
+            headers["Content-Range"] = f"{offset}-{offset + len(matched) - 1}/{total}" if matched else f"*/{total}"
+        return 200, payload, headers
+
+    def _insert(self, rows, body, params, prefer: str) -> List[Dict[str, Any]]:
+        new_rows = body if isinstance(body, list) else [body]
+        conflict = [column for column in params.get("on_conflict", "id").split(",") if column]
+        upsert = "resolution=merge-duplicates" in prefer
+        index = {tuple(row.get(column) for column in conflict): row for row in rows} if upsert else {}
+        written = []
+        now = _now()  # One timestamp per statement, like now() in a transaction
+        for new_row in new_rows:
+            existing = index.get(tuple(new_row.get(column) for column in conflict))
+            if existing is not None:
+                existing.update(new_row, updated_at=now)
+                written.append(existing)
+                continue
+            row = {"id": next(self._ids), "created_at": now, "updated_at": now, **new_row}
+            rows.append(row)
+            index[tuple(row.get(column) for column in conflict)] = row
+            written.append(row)
+        self._version += 1
+        return [self._render(row) for row in written]
+
+    def _result_columns(self, row: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
+        """The columns the search RPCs return; embeddings only when asked for, as pgvector text."""
+        result = {column: row.get(column) for column in _RESULT_COLUMNS}
+        result["embedding"] = None
+        if params.get("include_embeddings"):
+            result["embedding"] = self._render(row, ["embedding"])["embedding"]
+        return result
+
+    def _site_vectors(self, site: Optional[str]) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+        """Normalized embedding matrix of a site's rows, rebuilt only after writes."""
+        key = site or ""
+        cached = self._vectors.get(key)
+        if cached is not None and cached[0] == self._version:
+            return cached[1], cached[2]
+        rows = [
+            row for row in self.tables.get("site_pages", [])
+            if row.get("embedding") and (site is None or row.get("site") == site)
+        ]
+        matrix = np.array([row["embedding"] for row in rows], dtype=np.float32) if rows else np.zeros((0, 1))
+        if rows:
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix /= np.where(norms == 0, 1, norms)
+        self._vectors[key] = (self._version, matrix, rows)
+        return matrix, rows
+
+    def _match_site_pages(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        matrix, rows = self._site_vectors(params.get("site_filter"))
+        if not rows:
+            return []
+        query = np.asarray(params["query_embedding"], dtype=np.float32)
+        if query.shape[0] != matrix.shape[1]:
+            raise ValueError(f"different vector dimensions {matrix.shape[1]} and {query.shape[0]}")
+        norm = np.linalg.norm(query)
+        similarities = matrix @ (query / norm if norm else query)
+
+        wanted = params.get("filter") or {}
+        results = []
+        for position in np.argsort(-similarities):
+            row = rows[position]
+            metadata = row.get("metadata") or {}
+            if any(metadata.get(key) != value for key, value in wanted.items()):
+                continue
+            results.append({
+                **self._result_columns(row, params),
+                "similarity": float(similarities[position]),
+            })
+            if len(results) >= params.get("match_count", 10):
+                break
+        return results
+
+    @staticmethod
+    def _terms(text: Any) -> set:
+        return {word for word in _WORD.findall(str(text or "").lower()) if len(word) > 2}
+
+    def _hybrid_match_site_pages(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        match_count = params.get("match_count", 10)
+        rrf_k = params.get("rrf_k", 50)
+        candidates = match_count * 2
+        semantic = self._match_site_pages({**params, "match_count": candidates})
+
+        terms = self._terms(params.get("query_text"))
+        wanted = params.get("filter") or {}
+        site = params.get("site_filter")
+        scored = []
+        for row in self.tables.get("site_pages", []):
+            if site is not None and row.get("site") != site:
+                continue
+            metadata = row.get("metadata") or {}
+            if any(metadata.get(key) != value for key, value in wanted.items()):
+                continue
+            score = sum(
+                weight * len(terms & self._terms(row.get(column))) for column, weight in _TEXT_WEIGHTS.items()
+            )
+            if score:
+                scored.append((score, row))
+        scored.sort(key=lambda item: -item[0])
+        full_text = [row for _, row in scored[:candidates]]
+
+        scores: Dict[int, float] = {}
+        for ranking, weight in ((full_text, params.get("full_text_weight", 1)), (semantic, params.get("semantic_weight", 1))):
+            for rank, row in enumerate(ranking, start=1):
+                scores[row["id"]] = scores.get(row["id"], 0.0) + weight / (rrf_k + rank)
+
+        rows = {row["id"]: row for row in self.tables.get("site_pages", []) if row["id"] in scores}
+        query = np.asarray(params["query_embedding"], dtype=np.float32)
+        query /= np.linalg.norm(query) or 1
+        results = []
+        for row_id in sorted(scores, key=lambda row_id: -scores[row_id])[:match_count]:
+            vector = np.asarray(rows[row_id].get("embedding") or np.zeros_like(query), dtype=np.float32)
+            results.append({
+                **self._result_columns(rows[row_id], params),
+                "similarity": float(vector @ query / (np.linalg.norm(vector) or 1)),
+                "rank_score": scores[row_id],
+            })
+        return results
@@ -0,0 +1,193 @@
+import json
+import random
+import socket
+import threading
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import get_context
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlparse
+
+
+@dataclass
+class FaultConfig:
+    """Latency and failures injected into every request a fake server handles."""
+    latency: float = 0.0  # Seconds added to each response
+    jitter: float = 0.0  # Extra exponentially distributed delay with this mean
+    error_rate: float = 0.0  # Fraction of requests answered with a 500
+    rate_limit_rate: float = 0.0  # Fraction of requests answered with a 429
+    retry_after: float = 0.5  # Seconds advertised in the 429's retry-after header
+    seed: Optional[int] = None
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class FakeServer:
+    """
+    Threaded HTTP server with fault injection and request accounting.
+
+    Subclasses implement `route(method, path, query, body, headers)` and return
+    (status, payload, extra headers); a dict or list payload is sent as JSON.
+    Every server also answers GET /_stats and POST /_reset so the load test can
+    read and clear its counters between phases.
+    """
+
+    name = "fake"
+
+    def __init__(self, faults: Optional[FaultConfig] = None):
+        self.faults = faults or FaultConfig()
+        self.random = random.Random(self.faults.seed)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.responses = Counter()  # "route status" -> count
+            self.injected = Counter()  # "429" / "500" -> count
+            self.latencies: List[float] = []
+
+    def route(
+        self, method: str, path: str, query: List[Tuple[str, str]], body: Any, headers: Dict[str, str]
+    ) -> Tuple[int, Any, Dict[str, str]]:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            total = sum(self.responses.values())
+            injected = sum(self.injected.values())
+            return {
+                "server": self.name,
+                "requests": total,
+                "injected": dict(self.injected),
+                "responses": dict(self.responses),
+                # Attempts per request that eventually got through
+                "amplification": total / (total - injected) if total > injected else 0.0,
+                "p50_ms": percentile(self.latencies, 0.5) * 1000,
+                "p99_ms": percentile(self.latencies, 0.99) * 1000,
+                "faults": asdict(self.faults),
+            }
+
+    def _inject(self) -> Optional[Tuple[int, Any, Dict[str, str]]]:
+        faults = self.faults
+        delay = faults.latency + (self.random.expovariate(1 / faults.jitter) if faults.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+        roll = self.random.random()
+        if roll < faults.rate_limit_rate:
+            return 429, {"error": {"message": "Rate limit reached (injected)", "code": "rate_limit_exceeded"}}, {
+                "retry-after": str(faults.retry_after),
+            }
+        if roll < faults.rate_limit_rate + faults.error_rate:
+            return 500, {"error": {"message": "Internal error (injected)", "code": "server_error"}}, {}
+        return None
+
+    def handle(self, method: str, raw_path: str, body: bytes, headers: Dict[str, str]):
+        parsed = urlparse(raw_path)
+        query = parse_qsl(parsed.query, keep_blank_values=True)
+        if parsed.path == "/_stats":
+            return 200, self.stats(), {}
+        if parsed.path == "/_reset":
+            self.reset()
+            return 200, {"reset": True}, {}
+
+        started = time.perf_counter()
+        injected = self._inject()
+        if injected is not None:
+            status, payload, extra = injected
+            with self.lock:
+                self.injected[str(status)] += 1
+        else:
+            try:
+                payload_in = json.loads(body) if body else None
+            except ValueError:
+                payload_in = None
+            try:
+                status, payload, extra = self.route(method, parsed.path, query, payload_in, headers)
+            except Exception as e:
+                status, payload, extra = 500, {"message": f"{type(e).__name__}: {e}"}, {}
+        with self.lock:
+            self.responses[f"{method} {parsed.path.split('?')[0]} {status}"] += 1
+            self.latencies.append(time.perf_counter() - started)
+        return status, payload, extra
+
+    def serve(self, port: int, host: str = "127.0.0.1"):
+        """Serve until the process is stopped."""
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive, like the real APIs
+
+            def _dispatch(self, method: str):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                headers = {key.lower(): value for key, value in self.headers.items()}
+                status, payload, extra = server.handle(method, self.path, body, headers)
+                if isinstance(payload, (dict, list)):
+                    data, content_type = json.dumps(payload).encode("utf-8"), "application/json"
+                else:
+                    data, content_type = (payload or "").encode("utf-8"), extra.pop("content-type", "text/html")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in extra.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                if method != "HEAD":
+                    self.wfile.write(data)
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_HEAD(self):
+                self._dispatch("HEAD")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def do_PATCH(self):
+                self._dispatch("PATCH")
+
+            def do_DELETE(self):
+                self._dispatch("DELETE")
+
+            def log_message(self, *args):
+                pass  # Thousands of requests per second would drown the report
+
+        httpd = ThreadingHTTPServer((host, port), Handler)
+        httpd.daemon_threads = True
+        httpd.serve_forever()
+
+
+def _serve(factory, port: int, kwargs: Dict[str, Any]):
+    factory(**kwargs).serve(port)
+
+
+def start_in_subprocess(factory, port: int, **kwargs):
+    """
+    Run a fake server in its own process so it does not compete with the code
+    under test for the GIL; returns the started process.
+    """
+    process = get_context("spawn").Process(target=_serve, args=(factory, port, kwargs), daemon=True)
+    process.start()
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return process
+        except OSError:
+            time.sleep(0.05)
+    process.terminate()
+    raise RuntimeError(f"{factory.__name__} did not start on port {port}")
@@ -0,0 +1,270 @@
+"""
+Offline end-to-end load test of the crawler and the agent against local fakes.
+
+Starts a generated static documentation site, an OpenAI-compatible server and
+an in-memory PostgREST stand-in, each in its own process with configurable
+latency, errors and 429s. `crawl_docs.main` then ingests the site and the
+`ai_expert` agent answers a batch of questions concurrently. The report shows
+pages/sec, p50/p99 latencies, tool latency and error amplification (upstream
+attempts per successful request). No real API key or database is touched: the
+run happens in a scratch directory, so no .env file is loaded and caches and
+the ingest journal start empty.
+
+Run from the crawl4AI-agent directory:
+
+    python loadtest/run_loadtest.py
+    python loadtest/run_loadtest.py --pages 500 --questions 100 --concurrency 20
+    python loadtest/run_loadtest.py --openai-latency 0.3 --rate-limit-rate 0.05 --error-rate 0.01
+    python loadtest/run_loadtest.py --local-index
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import httpx
+
+# Add the project root directory to Python path
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, PROJECT_ROOT)
+
+from loadtest.fake_openai import FakeOpenAI
+from loadtest.fake_postgrest import FakePostgREST
+from loadtest.fake_server import FaultConfig, free_port, percentile, start_in_subprocess
+from loadtest.static_site import StaticDocsSite
+
+LOADTEST_SITE = "loadtest"
+# supabase-py only accepts JWT-shaped keys
+FAKE_SUPABASE_KEY = "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoic2VydmljZV9yb2xlIn0.loadtest"
+FAKE_OPENAI_KEY = "sk-loadtest"
+
+QUESTION_TEMPLATES = [
+    "How do I configure the {} for a {}?",
+    "What happens to my {} when the {} times out?",
+    "Which {} parameters affect the {}?",
+    "How can I check the {} of a {}?",
+]
+QUESTION_WORDS = ["storage deal", "wallet", "sector", "retrieval", "contract", "node", "gas fee", "collateral"]
+
+
+def server_stats(base_url: str) -> Dict[str, Any]:
+    return httpx.get(f"{base_url}/_stats").json()
+
+
+def reset_stats(*base_urls: str):
+    for base_url in base_urls:
+        httpx.post(f"{base_url}/_reset")
+
+
+def configure_environment(
+    openai_url: str, postgrest_url: str, local_index: bool = False, search_mode: str = "vector"
+):
+    """Point every client at the fakes; must run before the project modules are imported."""
+    os.environ.update({
+        "LOCAL_VECTOR_INDEX": "true" if local_index else "false",
+        "SEARCH_MODE": search_mode,
+        "OPENAI_BASE_URL": f"{openai_url}/v1",
+        "OPENAI_API_KEY": FAKE_OPENAI_KEY,
+        "OPEN_AI_API_KEY": FAKE_OPENAI_KEY,
+        "SUPABASE_URL": postgrest_url,
+        "SUPABASE_SERVICE_KEY": FAKE_SUPABASE_KEY,
+        # Offline hosts may lack the tiktoken files; approximate chunking is fine for a scratch database
+        "ALLOW_APPROXIMATE_TOKENS": "true",
+        "LOGFIRE_IGNORE_NO_CONFIG": "1",
+        "LOGFIRE_CONSOLE": "false",
+    })
+    # Never ship load-test spans to the real project
+    os.environ.pop("LOGFIRE_TOKEN", None)
+
+
+def run_crawl(site_url: str) -> Dict[str, Any]:
+    import crawl_docs
+
+    crawl_docs.SITEMAP_URLS[LOADTEST_SITE] = f"{site_url}/sitemap.xml"
+    crawl_docs.SITE = LOADTEST_SITE
+    crawl_docs.init_clients()
+
+    started = time.perf_counter()
+    asyncio.run(crawl_docs.main(LOADTEST_SITE, only_changed=False))
+    seconds = time.perf_counter() - started
+
+    metrics = crawl_docs.metrics
+    pages = metrics.counter("pages_done")
+    return {
+        "seconds": seconds,
+        "pages": pages,
+        "pages_total": metrics.gauge("pages_total"),
+        "pages_per_second": pages / seconds if seconds else 0.0,
+        "rows_written": metrics.counter("rows_written", table="site_pages"),
+        "latency": [
+            {"labels": entry["labels"], "count": entry["count"], "p50_ms": entry["p50"] * 1000, "p99_ms": entry["p99"] * 1000}
+            for entry in metrics.snapshot()["histograms"]
+        ],
+        "errors": [entry for entry in metrics.snapshot()["counters"] if entry["name"] == "errors_total"],
+    }
+
+
+async def run_agent(questions: List[str], concurrency: int, postgrest_url: str) -> Dict[str, Any]:
+    from openai import AsyncOpenAI
+    from supabase import create_client
+
+    import ai_expert
+
+    deps = ai_expert.AIDeps(
+        openai_client=AsyncOpenAI(),
+        supabase=create_client(postgrest_url, FAKE_SUPABASE_KEY),
+    )
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    failures: List[str] = []
+
+    async def ask(question: str):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await ai_expert.ai_expert.run(question, deps=deps)
+                latencies.append(time.perf_counter() - started)
+            except Exception as e:
+                failures.append(f"{type(e).__name__}: {e}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(ask(question) for question in questions))
+    seconds = time.perf_counter() - started
+    await deps.http_client.aclose()
+    return {
+        "seconds": seconds,
+        "runs": len(questions),
+        "succeeded": len(latencies),
+        "failed": len(failures),
+        "failures": sorted(set(failures))[:10],
+        "runs_per_second": len(latencies) / seconds if seconds else 0.0,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def print_servers(servers: Dict[str, Dict[str, Any]]):
+    for name, stats in servers.items():
+        print(
+            f"  {name:<10} {stats['requests']:>6} requests, injected {stats['injected'] or 'none'}, "
+            f"p50 {stats['p50_ms']:.0f} ms, p99 {stats['p99_ms']:.0f} ms, "
+            f"amplification {stats['amplification']:.2f}x"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=100, help="Pages on the generated site")
+    parser.add_argument("--questions", type=int, default=20, help="Agent runs after the crawl")
+    parser.add_argument("--concurrency", type=int, default=5, help="Concurrent agent runs")
+    parser.add_argument("--skip-crawl", action="store_true")
+    parser.add_argument("--skip-agent", action="store_true")
+    parser.add_argument("--local-index", action="store_true", help="Answer from the local vector index, not the RPC")
+    parser.add_argument("--search-mode", choices=["vector", "hybrid"], default="vector", help="Agent retrieval mode")
+    parser.add_argument("--openai-latency", type=float, default=0.05, help="Seconds per OpenAI response")
+    parser.add_argument("--openai-jitter", type=float, default=0.02, help="Mean extra exponential delay")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of OpenAI requests failing with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of OpenAI requests failing with 429")
+    parser.add_argument("--openai-rpm", type=int, default=10_000, help="Limit advertised in x-ratelimit headers")
+    parser.add_argument("--db-latency", type=float, default=0.005, help="Seconds per PostgREST response")
+    parser.add_argument("--db-error-rate", type=float, default=0.0, help="Fraction of PostgREST requests failing with 500")
+    parser.add_argument("--site-latency", type=float, default=0.02, help="Seconds per static page")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--report", default="loadtest_report.json", help="Where to write the JSON report")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    logging.getLogger("httpx").setLevel(logging.WARNING)  # One line per Supabase/OpenAI request otherwise
+
+    report_path = os.path.abspath(args.report)
+    ports = {name: free_port() for name in ("site", "openai", "postgrest")}
+    urls = {name: f"http://127.0.0.1:{port}" for name, port in ports.items()}
+    processes = [
+        start_in_subprocess(
+            StaticDocsSite, ports["site"], pages=args.pages, seed=args.seed,
+            faults=FaultConfig(latency=args.site_latency, seed=args.seed),
+        ),
+        start_in_subprocess(
+            FakeOpenAI, ports["openai"], requests_per_minute=args.openai_rpm,
+            tool_arguments={"site": LOADTEST_SITE},
+            faults=FaultConfig(
+                latency=args.openai_latency, jitter=args.openai_jitter, error_rate=args.error_rate,
+                rate_limit_rate=args.rate_limit_rate, seed=args.seed,
+            ),
+        ),
+        start_in_subprocess(
+            FakePostgREST, ports["postgrest"],
+            faults=FaultConfig(latency=args.db_latency, error_rate=args.db_error_rate, seed=args.seed),
+        ),
+    ]
+    print(f"Fakes: site {urls['site']}, OpenAI {urls['openai']}, PostgREST {urls['postgrest']}")
+
+    configure_environment(urls["openai"], urls["postgrest"], args.local_index, args.search_mode)
+    # Caches, the ingest journal and lastmod state all live under the working directory
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    os.chdir(workdir)
+    print(f"Working directory: {workdir}")
+
+    report: Dict[str, Any] = {"args": vars(args)}
+    try:
+        if not args.skip_crawl:
+            print(f"\n=== Crawl: {args.pages} pages ===")
+            report["crawl"] = run_crawl(urls["site"])
+            report["crawl"]["servers"] = {name: server_stats(url) for name, url in urls.items()}
+
+        if not args.skip_agent:
+            rng = random.Random(args.seed)
+            questions = [
+                rng.choice(QUESTION_TEMPLATES).format(rng.choice(QUESTION_WORDS), rng.choice(QUESTION_WORDS))
+                for _ in range(args.questions)
+            ]
+            reset_stats(urls["openai"], urls["postgrest"])
+            print(f"\n=== Agent: {args.questions} questions, {args.concurrency} at a time ===")
+            report["agent"] = asyncio.run(run_agent(questions, args.concurrency, urls["postgrest"]))
+            report["agent"]["servers"] = {name: server_stats(urls[name]) for name in ("openai", "postgrest")}
+    finally:
+        for process in processes:
+            process.terminate()
+
+    print("\n=== Load test report ===")
+    crawl = report.get("crawl")
+    if crawl:
+        print(
+            f"Crawl: {crawl['pages']:.0f}/{crawl['pages_total']:.0f} pages in {crawl['seconds']:.1f}s "
+            f"({crawl['pages_per_second']:.2f} pages/sec), {crawl['rows_written']:.0f} rows written"
+        )
+        for entry in crawl["latency"]:
+            labels = ", ".join(f"{key}={value}" for key, value in entry["labels"].items())
+            print(f"  {labels:<45} {entry['count']:>6} calls, p50 {entry['p50_ms']:.0f} ms, p99 {entry['p99_ms']:.0f} ms")
+        for error in crawl["errors"]:
+            labels = ", ".join(f"{key}={value}" for key, value in error["labels"].items())
+            print(f"  errors {labels}: {error['value']:.0f}")
+        print_servers(crawl["servers"])
+    agent = report.get("agent")
+    if agent:
+        openai_stats = agent["servers"]["openai"]
+        print(
+            f"Agent: {agent['succeeded']}/{agent['runs']} runs succeeded ({agent['runs_per_second']:.2f} runs/sec), "
+            f"run p50 {agent['p50_ms']:.0f} ms, p99 {agent['p99_ms']:.0f} ms"
+        )
+        print(
+            f"  tools: {openai_stats['tool_results']}/{openai_stats['tool_calls']} calls returned, "
+            f"{openai_stats['tool_errors']} errors, p50 {openai_stats['tool_p50_ms']:.0f} ms, "
+            f"p99 {openai_stats['tool_p99_ms']:.0f} ms"
+        )
+        for failure in agent["failures"]:
+            print(f"  failed: {failure}")
+        print_servers(agent["servers"])
+
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"\nReport written to {report_path}")
+
+
+if __name__ == "__main__":
+    main()
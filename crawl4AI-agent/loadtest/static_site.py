@@ -0,0 +1,91 @@
+import hashlib
+import html
+import random
+from typing import Any, Dict, Optional, Tuple
+
+from .fake_server import FakeServer, FaultConfig
+
+_WORDS = (
+    "storage deal miner sector proof client retrieval network wallet token actor message block "
+    "tipset consensus gas contract deploy address balance epoch collateral replica index query "
+    "request response config node sync chain method parameter return value error timeout cache "
+    "upload download bucket file payload signature key account transaction fee reward penalty"
+).split()
+
+# Sections repeated on every page, like the install notes and banners real docs repeat
+_SHARED_SECTIONS = [
+    (
+        "Before you begin",
+        "Make sure you have installed the latest release and configured your wallet before "
+        "following this guide. Commands in this guide assume a Unix-like shell and a synced node.",
+    ),
+    (
+        "Getting help",
+        "If something in this guide does not work as described, search the forum or open an "
+        "issue with the exact command you ran, the full output and the version you are running.",
+    ),
+]
+
+
+class StaticDocsSite(FakeServer):
+    """
+    Generated documentation site with a sitemap, served as plain HTML.
+
+    Every page has a heading, prose sections, a code block and the same shared
+    sections, so both the static fast path and near-duplicate detection are
+    exercised. Responses carry an ETag and answer If-None-Match with a 304.
+    """
+
+    name = "static_site"
+
+    def __init__(self, faults: Optional[FaultConfig] = None, pages: int = 100, sections: int = 6, seed: int = 0):
+        self.pages = pages
+        self.sections = sections
+        self.seed = seed
+        super().__init__(faults)
+
+    def _sentence(self, rng: random.Random) -> str:
+        words = [rng.choice(_WORDS) for _ in range(rng.randint(8, 18))]
+        return " ".join(words).capitalize() + "."
+
+    def render_page(self, number: int) -> str:
+        rng = random.Random(self.seed * 1_000_003 + number)
+        body = [f"<h1>Guide {number}: {rng.choice(_WORDS).title()} {rng.choice(_WORDS)}</h1>"]
+        for section in range(self.sections):
+            body.append(f"<h2>{rng.choice(_WORDS).title()} {section + 1}</h2>")
+            for _ in range(rng.randint(2, 4)):
+                body.append(f"<p>{' '.join(self._sentence(rng) for _ in range(rng.randint(3, 6)))}</p>")
+            if section == 1:
+                code = "\n".join(f"client.{rng.choice(_WORDS)}({rng.randint(0, 99)})" for _ in range(6))
+                body.append(f'<pre><code class="language-python">{html.escape(code)}</code></pre>')
+        for title, text in _SHARED_SECTIONS:
+            body.append(f"<h2>{title}</h2><p>{text}</p>")
+        return (
+            f"<html><head><title>Guide {number}</title></head><body>"
+            f"<nav><a href='/'>Home</a></nav><main>{''.join(body)}</main>"
+            f"<footer>Copyright</footer></body></html>"
+        )
+
+    def sitemap(self, base_url: str) -> str:
+        urls = "".join(
+            f"<url><loc>{base_url}/docs/page-{number}</loc><lastmod>2025-01-01</lastmod></url>"
+            for number in range(self.pages)
+        )
+        return f'<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls}</urlset>'
+
+    def route(self, method, path, query, body, headers) -> Tuple[int, Any, Dict[str, str]]:
+        if path == "/sitemap.xml":
+            base_url = f"http://{headers.get('host', '127.0.0.1')}"
+            return 200, self.sitemap(base_url), {"content-type": "application/xml"}
+        if path.startswith("/docs/page-"):
+            try:
+                number = int(path.rsplit("-", 1)[1])
+            except ValueError:
+                number = -1
+            if 0 <= number < self.pages:
+                page = self.render_page(number)
+                etag = '"' + hashlib.sha256(page.encode("utf-8")).hexdigest()[:16] + '"'
+                if headers.get("if-none-match") == etag:
+                    return 304, "", {"ETag": etag}
+                return 200, page, {"content-type": "text/html; charset=utf-8", "ETag": etag}
+        return 404, "<html><body>Not found</body></html>", {"content-type": "text/html"}
@@ -33,16 +33,23 @@ from supabase import Client
 from ai_expert import AIDeps, ai_expert, SUPABASE_SERVICE_KEY, SUPABASE_URL, OPENAI_API_KEY, LLM_MODEL
 # from constants import OPEN_AI_API_KEY, SUPABASE_SERVICE_KEY, SUPABASE_URL
 from crawl_docs import Sites
+from utils import check_embedding_dimensions, get_local_vector_index
+from utils.vector_index import LOCAL_VECTOR_INDEX
 
 # Initialize clients
 @st.cache_resource(ttl=3600)  # Cache for 1 hour
 def init_clients():
     supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+    # Query vectors must have the width of the stored ones
+    check_embedding_dimensions(supabase)
     openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY)
     http_client = httpx.AsyncClient(
         timeout=httpx.Timeout(30.0),
         limits=httpx.Limits(max_keepalive_connections=5, max_connections=10)
     )
+    if LOCAL_VECTOR_INDEX:
+        # Start mapping or building the shared snapshot now rather than on the first question
+        get_local_vector_index(supabase)
     
     # Register cleanup callback
     def cleanup():
@@ -1,10 +1,16 @@
 from dotenv import load_dotenv
+import argparse
 import os
+import sys
 import asyncio
 import logging
 from supabase import create_client
-from ai_expert import get_embedding, Sites, LLM_MODEL
+from ai_expert import get_embedding, match_documents, Sites, LLM_MODEL, SEARCH_MODE
 from openai import AsyncOpenAI
+from utils import LocalVectorIndex, check_embedding_dimensions, get_local_vector_index, get_query_embedding_cache, get_supabase_health, pack_context
+from utils.context_packer import DEFAULT_CANDIDATES
+from utils.vector_index import LOCAL_VECTOR_INDEX
+from utils.health import CLOSED
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -19,12 +25,19 @@ openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 site = Sites.FILECOIN.value
 
 async def test_supabase_connection():
-    """Test the Supabase connection"""
-    try:
-        result = supabase.table("site_pages").select("count", count="exact").execute()
-        logger.info(f"Successfully connected to Supabase. Count: {result.count}")
-    except Exception as e:
-        raise ConnectionError(f"Unable to connect to Supabase: {e}")
+    """Probe Supabase once through the agents' circuit breaker and report its state"""
+    health = get_supabase_health(supabase, start=False)
+    await asyncio.to_thread(health.probe)
+    status = health.status()
+    if status["state"] != CLOSED:
+        raise ConnectionError(
+            f"Unable to connect to Supabase: {status['last_error']} "
+            f"(circuit {status['state']}, {status['failures']} failures)"
+        )
+    logger.info(f"Successfully connected to Supabase in {status['last_latency_ms']:.0f} ms")
+    dimensions = await asyncio.to_thread(check_embedding_dimensions, supabase)
+    if dimensions:
+        logger.info(f"Stored embeddings have {dimensions} dimensions")
 
 async def query_documentation(user_query: str):
     """Query the documentation using embeddings"""
@@ -32,27 +45,29 @@ async def query_documentation(user_query: str):
         # Get the embedding for the query
         query_embedding = await get_embedding(user_query, openai_client)
 
-        # Query Supabase
-        result = supabase.rpc(
-            "match_site_pages",
-            {
-                "query_embedding": query_embedding,
-                "match_count": 5,
-                "filter": {"model": f"{LLM_MODEL}"},
-                "site_filter": site
-            },
-        ).execute()
+        # None until the snapshot is mapped or built in the background
+        index = get_local_vector_index(supabase, False) if LOCAL_VECTOR_INDEX and SEARCH_MODE == "vector" else None
+        if index is not None:
+            docs = index.search(
+                query_embedding, DEFAULT_CANDIDATES, filter={"model": f"{LLM_MODEL}"},
+                site_filter=site, include_embeddings=True,
+            )
+        else:
+            # Query Supabase
+            docs = match_documents(
+                supabase, user_query, query_embedding, DEFAULT_CANDIDATES, site=site, include_embeddings=True
+            )
 
-        if not result.data:
+        if not docs:
             return "No relevant documentation found."
 
-        # Format results
-        formatted_chunks = [
-            f"# {doc['title']}\n\n{doc['content']}"
-            for doc in result.data
-        ]
-
-        return "\n\n---\n\n".join(formatted_chunks)
+        # Diversify the candidates and pack them into the context budget
+        packed = pack_context(docs, query_embedding)
+        logger.info(
+            f"Packed {packed.full} full and {packed.summarized} summarized chunks "
+            f"({packed.tokens} tokens) from {packed.candidates} candidates"
+        )
+        return packed.text
 
     except Exception as e:
         logger.error(f"Error querying documentation: {e}")
@@ -69,6 +84,7 @@ async def main():
         result = await query_documentation(user_query)
         print("\nQuery Results:")
         print(result)
+        logger.info(f"Query embedding cache: {get_query_embedding_cache().stats()}")
 
     except Exception as e:
         logger.error(f"Error in main: {e}")
@@ -77,5 +93,26 @@ async def main():
         await openai_client.close()
 
 if __name__ == "__main__":
-    # Run the async main function
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Query the documentation in Supabase.")
+    parser.add_argument("--health", action="store_true", help="Only check the Supabase connection")
+    parser.add_argument("--build-index", action="store_true", help="Write a fresh local vector index snapshot")
+    parser.add_argument("--sync-index", action="store_true", help="Fold changed rows into a new local index snapshot")
+    args = parser.parse_args()
+
+    if args.build_index or args.sync_index:
+        index = LocalVectorIndex(supabase)
+        if args.build_index or not index.load():
+            index.build()
+        else:
+            logger.info(f"Synced {index.sync()} changed rows")
+            index.save()
+        logger.info(f"Local vector index: {index.status()}")
+    elif args.health:
+        try:
+            asyncio.run(test_supabase_connection())
+        except ConnectionError as e:
+            logger.error(e)
+            sys.exit(1)
+    else:
+        # Run the async main function
+        asyncio.run(main())
\ No newline at end of file
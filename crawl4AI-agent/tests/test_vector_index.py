@@ -0,0 +1,250 @@
+import json
+import os
+import sys
+import time
+from datetime import timedelta
+
+import numpy as np
+import pytest
+from supabase import create_client
+
+# Add the project root directory to Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from loadtest.fake_postgrest import FakePostgREST
+from loadtest.fake_server import free_port, start_in_subprocess
+from utils import vector_index
+from utils.vector_index import MANIFEST_FILE, LocalVectorIndex, get_local_vector_index
+
+FAKE_SUPABASE_KEY = "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoic2VydmljZV9yb2xlIn0.test"
+DIMENSIONS = 8
+QUERIES = np.random.default_rng(1).normal(size=(5, DIMENSIONS)).tolist()
+
+
+@pytest.fixture(scope="module")
+def postgrest_url():
+    port = free_port()
+    process = start_in_subprocess(FakePostgREST, port)
+    yield f"http://127.0.0.1:{port}"
+    process.terminate()
+
+
+@pytest.fixture
+def supabase(postgrest_url):
+    client = create_client(postgrest_url, FAKE_SUPABASE_KEY)
+    yield client
+    client.table("site_pages").delete().gt("id", 0).execute()
+    client.table("site_pages_deleted").delete().gt("id", 0).execute()
+
+
+def make_rows(count: int, seed: int = 0, start: int = 0):
+    rng = np.random.default_rng(seed)
+    return [
+        {
+            "site": ("docs", "blog")[number % 2],
+            "url": f"https://example.com/page-{number}",
+            "chunk_number": 0,
+            "title": f"Page {number}",
+            "summary": f"Summary {number}",
+            "content": f"Content {number}",
+            "metadata": {
+                "model": ("gpt-4o-mini", "gpt-4o")[number % 3 == 0],
+                "source": "example_docs",
+                "kind": ("guide", "reference")[number % 5 == 0],
+            },
+            "embedding": rng.normal(size=DIMENSIONS).tolist(),
+            "token_count": 3,
+            "summary_token_count": 2,
+        }
+        for number in range(start, start + count)
+    ]
+
+
+def insert(supabase, rows):
+    return supabase.table("site_pages").upsert(rows, on_conflict="site,url,chunk_number").execute().data
+
+
+def rpc_matches(supabase, query, match_count=10, filter=None, site_filter=None):
+    return supabase.rpc(
+        "match_site_pages",
+        {"query_embedding": query, "match_count": match_count, "filter": filter or {}, "site_filter": site_filter},
+    ).execute().data
+
+
+def assert_same_results(local, remote):
+    assert [row["id"] for row in local] == [row["id"] for row in remote]
+    for local_row, remote_row in zip(local, remote):
+        assert local_row["similarity"] == pytest.approx(remote_row["similarity"], abs=1e-5)
+        for column in ("site", "url", "title", "content", "metadata", "token_count"):
+            assert local_row[column] == remote_row[column]
+
+
+def test_build_then_load_round_trip(supabase, tmp_path):
+    insert(supabase, make_rows(40))
+    built = LocalVectorIndex(supabase, directory=str(tmp_path))
+    built.build()
+
+    loaded = LocalVectorIndex(supabase, directory=str(tmp_path))
+    assert loaded.load()
+    assert loaded.size == built.size == 40
+    assert loaded.cursor == built.cursor
+    for query in QUERIES:
+        assert loaded.search(query, 5) == built.search(query, 5)
+
+
+def test_load_without_snapshot(supabase, tmp_path):
+    index = LocalVectorIndex(supabase, directory=str(tmp_path))
+    assert not index.load()
+    assert index.search(QUERIES[0]) == []
+
+
+def test_sync_applies_inserts_updates_and_deletes(supabase, tmp_path, monkeypatch):
+    # Without the overlap, a sync re-reads nothing but the changes themselves
+    monkeypatch.setattr(vector_index, "SYNC_OVERLAP", timedelta(0))
+    rows = insert(supabase, make_rows(20))
+    index = LocalVectorIndex(supabase, directory=str(tmp_path))
+    index.build()
+    assert index.sync() == 0
+
+    time.sleep(0.01)  # Changes must get a later updated_at than the snapshot's cursor
+    added = insert(supabase, make_rows(1, seed=1, start=20))[0]
+    updated = insert(supabase, [{**make_rows(1, seed=2, start=3)[0], "content": "Rewritten"}])[0]
+    deleted = rows[7]
+    supabase.table("site_pages").delete().eq("id", deleted["id"]).execute()
+
+    assert index.sync() == 3
+    assert index.size == 20
+    # Each changed row is the best match for its own embedding
+    assert index.search(json.loads(added["embedding"]), 1)[0]["id"] == added["id"]
+    best = index.search(json.loads(updated["embedding"]), 1)[0]
+    assert (best["id"], best["content"]) == (updated["id"], "Rewritten")
+    assert deleted["id"] not in [row["id"] for row in index.search(QUERIES[0], 40)]
+    for query in QUERIES:
+        assert_same_results(index.search(query, 40), rpc_matches(supabase, query, 40))
+
+    # Saving folds the delta into a snapshot that a fresh process picks up as is
+    index.save()
+    reloaded = LocalVectorIndex(supabase, directory=str(tmp_path))
+    assert reloaded.load()
+    assert reloaded.size == 20
+    assert reloaded.sync() == 0
+    for query in QUERIES:
+        assert_same_results(reloaded.search(query, 40), rpc_matches(supabase, query, 40))
+
+
+@pytest.mark.parametrize(
+    "filter, site_filter",
+    [
+        ({}, None),
+        ({}, "docs"),
+        ({"model": "gpt-4o"}, None),
+        ({"model": "gpt-4o-mini"}, "blog"),
+        ({"model": "gpt-4o", "kind": "guide"}, "docs"),  # "kind" has no filter codes
+        ({"model": "o1"}, None),
+        ({}, "missing"),
+    ],
+)
+def test_search_matches_match_site_pages(supabase, tmp_path, filter, site_filter):
+    insert(supabase, make_rows(60))
+    index = LocalVectorIndex(supabase, directory=str(tmp_path))
+    index.build()
+    insert(supabase, make_rows(10, seed=3, start=60))  # Searched from the delta
+    index.sync()
+
+    for query in QUERIES:
+        local = index.search(query, 8, filter=filter, site_filter=site_filter)
+        assert_same_results(local, rpc_matches(supabase, query, 8, filter, site_filter))
+
+
+def test_exact_search_without_hnswlib(supabase, tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_index, "hnswlib", None)
+    monkeypatch.setattr(vector_index, "HNSW_MIN_ROWS", 1)
+    insert(supabase, make_rows(30))
+    index = LocalVectorIndex(supabase, directory=str(tmp_path))
+    index.build()
+
+    assert not index.status()["hnsw"]
+    for query in QUERIES:
+        assert_same_results(index.search(query, 5), rpc_matches(supabase, query, 5))
+
+
+def test_hnsw_snapshot_loads_without_hnswlib(supabase, tmp_path, monkeypatch):
+    pytest.importorskip("hnswlib")
+    monkeypatch.setattr(vector_index, "HNSW_MIN_ROWS", 1)
+    insert(supabase, make_rows(30))
+    LocalVectorIndex(supabase, directory=str(tmp_path)).build()
+
+    # A process without hnswlib maps the same snapshot and searches it exactly
+    monkeypatch.setattr(vector_index, "hnswlib", None)
+    index = LocalVectorIndex(supabase, directory=str(tmp_path))
+    assert index.load()
+    assert not index.status()["hnsw"]
+    for query in QUERIES:
+        assert_same_results(index.search(query, 5), rpc_matches(supabase, query, 5))
+
+
+def test_failed_build_leaves_no_snapshot_directory(supabase, tmp_path, monkeypatch):
+    insert(supabase, make_rows(10))
+
+    def fail(self, dimensions, cursor):
+        raise OSError("disk full")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(vector_index._SnapshotWriter, "finish", fail)
+        with pytest.raises(OSError):
+            LocalVectorIndex(supabase, directory=str(tmp_path)).build()
+    assert os.listdir(tmp_path) == []
+
+    # Directories of builds that died without cleaning up are removed once stale
+    abandoned = tmp_path / "20000101T000000-00000000.tmp"
+    abandoned.mkdir()
+    (abandoned / "rows.sqlite").write_bytes(b"")
+    stale = time.time() - vector_index.STALE_BUILD_SECONDS - 60
+    for path in (abandoned / "rows.sqlite", abandoned):
+        os.utime(path, (stale, stale))
+    LocalVectorIndex(supabase, directory=str(tmp_path)).build()
+    snapshots = [path for path in tmp_path.iterdir() if path.is_dir()]
+    assert len(snapshots) == 1 and (snapshots[0] / MANIFEST_FILE).is_file()
+
+
+def test_get_local_vector_index_builds_in_background(supabase, postgrest_url, tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_index, "_indexes", {})
+    insert(supabase, make_rows(10))
+
+    assert get_local_vector_index(supabase, start=False, directory=str(tmp_path)) is None
+    vector_index._indexes[str(tmp_path)]._preparing.join(30)
+    index = get_local_vector_index(supabase, start=False, directory=str(tmp_path))
+    assert index is not None and index.size == 10
+
+    # A recreated client shares the index instead of starting another one
+    client = create_client(postgrest_url, FAKE_SUPABASE_KEY)
+    assert get_local_vector_index(client, start=False, directory=str(tmp_path)) is index
+    assert index.supabase is client and len(vector_index._indexes) == 1
+
+
+def test_get_local_vector_index_backs_off_after_failure(supabase, tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_index, "_indexes", {})
+    build = LocalVectorIndex.build
+    builds = []
+
+    def fail(self):
+        builds.append(self)
+        raise ConnectionError("Supabase is down")
+
+    monkeypatch.setattr(LocalVectorIndex, "build", fail)
+    assert get_local_vector_index(supabase, start=False, directory=str(tmp_path)) is None
+    index = vector_index._indexes[str(tmp_path)]
+    index._preparing.join(30)
+    assert index.build_failures == 1 and "Supabase is down" in index.last_error
+
+    # Until the retry time passes, queries fall back without another scan
+    assert get_local_vector_index(supabase, start=False, directory=str(tmp_path)) is None
+    index._preparing.join(30)
+    assert len(builds) == 1
+
+    monkeypatch.setattr(LocalVectorIndex, "build", build)
+    index.retry_at = 0.0
+    get_local_vector_index(supabase, start=False, directory=str(tmp_path))
+    index._preparing.join(30)
+    assert index.build_failures == 0
+    assert get_local_vector_index(supabase, start=False, directory=str(tmp_path)) is index
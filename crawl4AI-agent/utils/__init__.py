@@ -0,0 +1,33 @@
+# utils/__init__.py
+from .context_packer import PackedContext, pack_context
+from .embedding_batcher import EmbeddingBatcher
+from .embedding_dimensions import EmbeddingDimensionMismatch, check_embedding_dimensions
+from .health import CircuitBreaker, get_supabase_health
+from .embedding_cache import EmbeddingCache, embedding_model_key, get_embedding_cache
+from .metrics import Metrics
+from .query_embedding_cache import QueryEmbeddingCache, get_query_embedding_cache
+from .rate_limiter import OpenAIRateLimiter
+from .site_pages_writer import SitePagesWriter
+from .tokens import count_tokens
+from .vector_index import LocalVectorIndex, get_local_vector_index
+
+__all__ = [
+    "CircuitBreaker",
+    "EmbeddingBatcher",
+    "EmbeddingCache",
+    "EmbeddingDimensionMismatch",
+    "check_embedding_dimensions",
+    "get_embedding_cache",
+    "embedding_model_key",
+    "get_local_vector_index",
+    "get_supabase_health",
+    "LocalVectorIndex",
+    "Metrics",
+    "OpenAIRateLimiter",
+    "PackedContext",
+    "pack_context",
+    "QueryEmbeddingCache",
+    "get_query_embedding_cache",
+    "SitePagesWriter",
+    "count_tokens",
+]
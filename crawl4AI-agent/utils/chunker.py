@@ -0,0 +1,224 @@
+import io
+import re
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Union
+
+from .tokens import count_tokens, split_by_tokens, tail_by_tokens
+
+DEFAULT_CHUNK_TOKENS = 1200  # Roughly the old 5000-character chunks
+DEFAULT_OVERLAP_TOKENS = 100
+
+_FENCE = re.compile(r"^\s{0,3}(```|~~~)")
+_HEADING = re.compile(r"^\s{0,3}#{1,6}\s")
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+")
+
+
+class Block(NamedTuple):
+    kind: str  # "heading", "text" or "code"
+    text: str
+
+
+class TokenChunk(NamedTuple):
+    text: str
+    tokens: int
+
+
+def chunk_text_by_chars(text: str, chunk_size: int = 5000) -> List[str]:
+    """Split text into chunks, respecting code blocks and paragraphs."""
+    chunks = []
+    start = 0
+    text_length = len(text)
+
+    while start < text_length:
+        # Calculate end position
+        end = start + chunk_size
+
+        # If we're at the end of the text, just take what's left
+        if end >= text_length:
+            chunks.append(text[start:].strip())
+            break
+
+        # Try to find a code block boundary first (```)
+        chunk = text[start:end]
+        code_block = chunk.rfind("```")
+        if code_block != -1 and code_block > chunk_size * 0.3:
+            end = start + code_block
+
+        # If no code block, try to break at a paragraph
+        elif "\n\n" in chunk:
+            # Find the last paragraph break
+            last_break = chunk.rfind("\n\n")
+            if (
+                last_break > chunk_size * 0.3
+            ):  # Only break if we're past 30% of chunk_size
+                end = start + last_break
+
+        # If no paragraph break, try to break at a sentence
+        elif ". " in chunk:
+            # Find the last sentence break
+            last_period = chunk.rfind(". ")
+            if (
+                last_period > chunk_size * 0.3
+            ):  # Only break if we're past 30% of chunk_size
+                end = start + last_period + 1
+
+        # Extract chunk and clean it up
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+
+        # Move start position for next chunk
+        start = max(start + 1, end)
+
+    return chunks
+
+
+def iter_blocks(lines: Iterable[str]) -> Iterator[Block]:
+    """Group markdown lines into headings, paragraphs and whole fenced code blocks."""
+    fence = None
+    buffer: List[str] = []
+
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if fence:
+            buffer.append(line)
+            if line.strip().startswith(fence):
+                yield Block("code", "\n".join(buffer))
+                buffer, fence = [], None
+            continue
+
+        match = _FENCE.match(line)
+        if match:
+            if buffer:
+                yield Block("text", "\n".join(buffer))
+            buffer, fence = [line], match.group(1)
+        elif _HEADING.match(line):
+            if buffer:
+                yield Block("text", "\n".join(buffer))
+                buffer = []
+            yield Block("heading", line.strip())
+        elif not line.strip():
+            if buffer:
+                yield Block("text", "\n".join(buffer))
+                buffer = []
+        else:
+            buffer.append(line)
+
+    if buffer:
+        yield Block("code" if fence else "text", "\n".join(buffer))
+
+
+def _pack(items: Iterable[str], max_tokens: int, join: Callable[[List[str]], str]) -> Iterator[TokenChunk]:
+    """Group items into the longest runs whose joined text, counted as a whole, fits the budget."""
+    piece: List[str] = []
+    piece_tokens = 0
+    for item in items:
+        tokens = count_tokens(join(piece + [item]))
+        if piece and tokens > max_tokens:
+            yield TokenChunk(join(piece), piece_tokens)
+            piece = []
+            tokens = count_tokens(join([item]))
+        piece.append(item)
+        piece_tokens = tokens
+    if piece:
+        yield TokenChunk(join(piece), piece_tokens)
+
+
+def _split_block(block: Block, max_tokens: int) -> Iterator[TokenChunk]:
+    """Break a block that alone exceeds the budget into pieces that fit."""
+    if block.kind == "code":
+        # Re-open and close the fence around every piece so each stays valid markdown
+        lines = block.text.split("\n")
+        opener = lines[0]
+        fence = _FENCE.match(opener).group(1)
+        body = lines[1:-1] if lines[-1].strip().startswith(fence) else lines[1:]
+        yield from _pack(body, max_tokens, lambda piece: "\n".join([opener, *piece, fence]))
+        return
+
+    sentences: List[str] = []
+    for sentence in _SENTENCE_BREAK.split(block.text.strip()):
+        if count_tokens(sentence) > max_tokens:
+            sentences.extend(split_by_tokens(sentence, max_tokens))
+        else:
+            sentences.append(sentence)
+    yield from _pack(sentences, max_tokens, " ".join)
+
+
+def _join(blocks: List[Block]) -> str:
+    return "\n\n".join(block.text for block in blocks)
+
+
+def iter_token_chunks(
+    source: Union[str, Iterable[str]],
+    max_tokens: int = DEFAULT_CHUNK_TOKENS,
+    overlap_tokens: int = DEFAULT_OVERLAP_TOKENS,
+    min_tokens: int = None,
+) -> Iterator[TokenChunk]:
+    """
+    Split markdown into chunks of at most `max_tokens` tokens.
+
+    `source` may be a string or any iterable of lines (such as an open file), so
+    very large inputs are processed as a stream. Fenced code blocks are never cut
+    unless they alone exceed the budget, a heading starts a new chunk once the
+    current one holds at least `min_tokens`, and consecutive chunks share up to
+    `overlap_tokens` of trailing prose. Budgets and the returned counts are those
+    of the joined chunk text, separators included.
+    """
+    if min_tokens is None:
+        min_tokens = max_tokens // 4
+    lines = io.StringIO(source) if isinstance(source, str) else source
+
+    parts: List[Block] = []
+    text = ""
+    total = 0
+    has_new_content = False
+
+    def reset(carry: List[Block]):
+        nonlocal parts, text, total, has_new_content
+        parts, has_new_content = list(carry), False
+        text = _join(parts)
+        total = count_tokens(text) if parts else 0
+
+    def overlap() -> List[Block]:
+        # Carry the tail of the last prose block; never partial code or a bare heading
+        last = parts[-1]
+        if overlap_tokens <= 0 or last.kind != "text":
+            return []
+        return [Block("text", tail_by_tokens(last.text, overlap_tokens))]
+
+    for block in iter_blocks(lines):
+        if block.kind == "heading" and has_new_content and total >= min_tokens:
+            yield TokenChunk(text, total)
+            reset([])
+
+        budget = max_tokens
+        if len(parts) == 1 and parts[0].kind == "heading":
+            # The heading leads the chunk this block starts, so leave room for it
+            budget -= count_tokens(f"{parts[0].text}\n\n")
+        if count_tokens(block.text) > budget:
+            pieces = [Block(block.kind, p.text) for p in _split_block(block, budget)]
+        else:
+            pieces = [block]
+
+        for piece in pieces:
+            candidate = f"{text}\n\n{piece.text}" if parts else piece.text
+            tokens = count_tokens(candidate)
+            if parts and tokens > max_tokens:
+                # Keep a trailing heading together with the content it introduces, when both fit
+                carry = []
+                if parts[-1].kind == "heading" and count_tokens(_join([parts[-1], piece])) <= max_tokens:
+                    carry = [parts.pop()]
+                tail: List[Block] = []
+                if parts and has_new_content:
+                    chunk_text = _join(parts)
+                    tail = overlap()
+                    yield TokenChunk(chunk_text, count_tokens(chunk_text) if carry else total)
+                keep = tail + carry
+                reset(keep if keep and count_tokens(_join(keep + [piece])) <= max_tokens else carry)
+                candidate = f"{text}\n\n{piece.text}" if parts else piece.text
+                tokens = count_tokens(candidate)
+            parts.append(piece)
+            text, total = candidate, tokens
+            has_new_content = True
+
+    if parts and has_new_content:
+        yield TokenChunk(text, total)
@@ -0,0 +1,152 @@
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .incremental import parse_embedding
+
+DEFAULT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKENS", "3000"))
+DEFAULT_CANDIDATES = int(os.getenv("RAG_CANDIDATES", "15"))  # Rows over-fetched for diversification
+DEFAULT_FULL_CONTENT_HITS = int(os.getenv("RAG_FULL_CONTENT_HITS", "2"))
+# 1.0 ranks by relevance only, 0.0 by novelty only
+DEFAULT_MMR_LAMBDA = float(os.getenv("RAG_MMR_LAMBDA", "0.5"))
+
+SEPARATOR = "\n\n---\n\n"
+
+
+def estimate_tokens(text: str) -> int:
+    """About 4 characters per token; only for headers and rows stored without counts."""
+    return (len(text) + 3) // 4
+
+
+def mmr_order(
+    query_embedding: Sequence[float],
+    embeddings: Sequence[Optional[Sequence[float]]],
+    relevance: Sequence[float],
+    lambda_mult: float = DEFAULT_MMR_LAMBDA,
+) -> List[int]:
+    """
+    Indices of the candidates in maximal marginal relevance order.
+
+    Each step picks the candidate maximizing
+    `lambda_mult * relevance - (1 - lambda_mult) * max cosine to those already picked`,
+    so a near-duplicate of a picked chunk drops behind a less relevant but new one.
+    Candidates without an embedding are never penalized.
+    """
+    count = len(relevance)
+    if count == 0:
+        return []
+    dimensions = len(query_embedding)
+    matrix = np.zeros((count, dimensions), dtype=np.float32)
+    has_vector = np.zeros(count, dtype=bool)
+    for i, embedding in enumerate(embeddings):
+        if embedding is not None and len(embedding) == dimensions:
+            matrix[i] = embedding
+            has_vector[i] = True
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix /= np.where(norms == 0, 1, norms)
+    similarity = matrix @ matrix.T
+
+    relevance = np.asarray(relevance, dtype=np.float32)
+    redundancy = np.zeros(count, dtype=np.float32)
+    remaining = np.ones(count, dtype=bool)
+    order: List[int] = []
+    for _ in range(count):
+        scores = np.where(remaining, lambda_mult * relevance - (1 - lambda_mult) * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        order.append(best)
+        remaining[best] = False
+        if has_vector[best]:
+            redundancy = np.maximum(redundancy, np.where(has_vector, similarity[best], 0.0))
+    return order
+
+
+@dataclass
+class PackedContext:
+    text: str
+    tokens: int
+    full: int  # Chunks included with their full content
+    summarized: int  # Chunks included as title, summary and URL
+    dropped: int  # Candidates left out by the budget
+    candidates: int
+
+
+def _relevance(docs: List[Dict[str, Any]], query: np.ndarray, embeddings: List[Optional[List[float]]]) -> List[float]:
+    """Hybrid rank scores scaled to 0..1, else cosine similarity to the query."""
+    if docs and all(doc.get("rank_score") is not None for doc in docs):
+        top = max(doc["rank_score"] for doc in docs) or 1.0
+        return [doc["rank_score"] / top for doc in docs]
+    relevance = []
+    norm = float(np.linalg.norm(query)) or 1.0
+    for doc, embedding in zip(docs, embeddings):
+        if doc.get("similarity") is not None:
+            relevance.append(float(doc["similarity"]))
+        elif embedding is not None:
+            vector = np.asarray(embedding, dtype=np.float32)
+            relevance.append(float(vector @ query) / (norm * (float(np.linalg.norm(vector)) or 1.0)))
+        else:
+            relevance.append(0.0)
+    return relevance
+
+
+def pack_context(
+    docs: List[Dict[str, Any]],
+    query_embedding: Sequence[float],
+    token_budget: int = DEFAULT_TOKEN_BUDGET,
+    full_content_hits: int = DEFAULT_FULL_CONTENT_HITS,
+    lambda_mult: float = DEFAULT_MMR_LAMBDA,
+) -> PackedContext:
+    """
+    Diversify retrieved rows with MMR and pack them into `token_budget` tokens.
+
+    The first `full_content_hits` chunks in MMR order get their full content
+    when it fits; the rest, and top hits too large for what is left, get their
+    title, summary and URL so the agent can fetch the page if it needs it.
+    Sizes come from the `token_count` and `summary_token_count` stored at
+    ingest, so nothing is tokenized here.
+    """
+    embeddings = [parse_embedding(doc.get("embedding")) or None for doc in docs]
+    query = np.asarray(query_embedding, dtype=np.float32)
+    order = mmr_order(query, embeddings, _relevance(docs, query, embeddings), lambda_mult)
+
+    parts: List[str] = []
+    used = 0
+    full = summarized = 0
+    separator_tokens = estimate_tokens(SEPARATOR)
+    for position, index in enumerate(order):
+        doc = docs[index]
+        title = doc.get("title") or doc.get("url") or "Untitled"
+        overhead = separator_tokens if parts else 0
+        remaining = token_budget - used - overhead
+
+        if position < full_content_hits and doc.get("content"):
+            content_tokens = doc.get("token_count")
+            if content_tokens is None:
+                content_tokens = estimate_tokens(doc["content"])
+            tokens = content_tokens + estimate_tokens(f"# {title}\n\n")
+            if tokens <= remaining:
+                parts.append(f"# {title}\n\n{doc['content']}")
+                used += overhead + tokens
+                full += 1
+                continue
+
+        if doc.get("summary"):
+            summary_tokens = doc.get("summary_token_count")
+            if summary_tokens is None:
+                summary_tokens = estimate_tokens(doc["summary"])
+            header = f"# {title}\n\nFull page: {doc.get('url', '')}\n\n"
+            tokens = summary_tokens + estimate_tokens(header)
+            if tokens <= remaining:
+                parts.append(f"# {title}\n\n{doc['summary']}\n\nFull page: {doc.get('url', '')}")
+                used += overhead + tokens
+                summarized += 1
+
+    return PackedContext(
+        text=SEPARATOR.join(parts),
+        tokens=used,
+        full=full,
+        summarized=summarized,
+        dropped=len(docs) - full - summarized,
+        candidates=len(docs),
+    )
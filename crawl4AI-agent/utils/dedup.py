@@ -0,0 +1,121 @@
+import asyncio
+import hashlib
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+SIMHASH_BITS = 64
+# Near-duplicates differ in at most this many bits; with 4 bands of 16 bits,
+# any pair within 3 bits is guaranteed to share at least one band exactly
+DEFAULT_MAX_DISTANCE = 3
+_BANDS = 4
+_BAND_BITS = SIMHASH_BITS // _BANDS
+_BAND_MASK = (1 << _BAND_BITS) - 1
+
+_TOKEN = re.compile(r"\w+")
+_SHINGLE_SIZE = 3
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash over word 3-shingles; similar texts get close fingerprints."""
+    tokens = _TOKEN.findall(text.lower())
+    if len(tokens) < _SHINGLE_SIZE:
+        shingles = [" ".join(tokens)]
+    else:
+        shingles = [" ".join(tokens[i:i + _SHINGLE_SIZE]) for i in range(len(tokens) - _SHINGLE_SIZE + 1)]
+
+    # Count set bits per position across all shingle hashes in one vectorized pass
+    digests = b"".join(
+        hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest() for shingle in shingles
+    )
+    bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8)).reshape(-1, SIMHASH_BITS)
+    majority = bits.sum(axis=0) * 2 > len(shingles)
+    return int.from_bytes(np.packbits(majority).tobytes(), "big")
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def to_signed64(value: int) -> int:
+    """Postgres bigint is signed; store the unsigned fingerprint's bit pattern."""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def from_signed64(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+@dataclass
+class Canonical:
+    """
+    The first chunk seen with a given fingerprint.
+
+    In-run canonicals carry a future resolved with (title, summary, embedding)
+    once the chunk has been embedded, or with None if it failed. Canonicals
+    loaded from the database have no future; their enrichment is fetched on demand.
+    """
+    url: str
+    chunk_number: int
+    fingerprint: int
+    future: Optional[asyncio.Future] = None
+
+    @property
+    def pointer(self) -> str:
+        return f"{self.url}#{self.chunk_number}"
+
+
+class NearDuplicateIndex:
+    """SimHash index of chunks seen in this run and already stored, banded for fast lookups."""
+
+    def __init__(self, max_distance: int = DEFAULT_MAX_DISTANCE):
+        self.max_distance = max_distance
+        self._bands: List[Dict[int, List[Canonical]]] = [{} for _ in range(_BANDS)]
+        self.duplicates = 0
+        self.reused = 0
+
+    @staticmethod
+    def _band_keys(fingerprint: int) -> Iterable[Tuple[int, int]]:
+        for band in range(_BANDS):
+            yield band, fingerprint >> (band * _BAND_BITS) & _BAND_MASK
+
+    def find(self, fingerprint: int, url: Optional[str] = None) -> Optional[Canonical]:
+        """
+        Closest known chunk within `max_distance` bits, if any. Stored chunks of
+        `url` are skipped: they are the previous version of the page being replaced.
+        """
+        best, best_distance = None, self.max_distance + 1
+        for band, key in self._band_keys(fingerprint):
+            for candidate in self._bands[band].get(key, ()):
+                if candidate.future is None and candidate.url == url:
+                    continue
+                distance = hamming_distance(fingerprint, candidate.fingerprint)
+                if distance < best_distance:
+                    best, best_distance = candidate, distance
+        return best
+
+    def add(self, canonical: Canonical):
+        for band, key in self._band_keys(canonical.fingerprint):
+            self._bands[band].setdefault(key, []).append(canonical)
+
+    def add_pending(self, url: str, chunk_number: int, fingerprint: int) -> Canonical:
+        """Register an in-run chunk whose enrichment duplicates will wait for."""
+        canonical = Canonical(
+            url, chunk_number, fingerprint, asyncio.get_running_loop().create_future()
+        )
+        self.add(canonical)
+        return canonical
+
+    def preload(self, rows: Iterable[Tuple[str, int, int]]):
+        """Load (url, chunk_number, signed simhash) rows of already stored chunks."""
+        for url, chunk_number, fingerprint in rows:
+            self.add(Canonical(url, chunk_number, from_signed64(fingerprint)))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "indexed": sum(len(bucket) for bucket in self._bands[0].values()),
+            "duplicates": self.duplicates,
+            "reused": self.reused,
+        }
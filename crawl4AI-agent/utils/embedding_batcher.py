@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from openai import AsyncOpenAI
+
+from constants import EMBEDDING_DIMENSIONS, EMBEDDING_MODEL
+
+from .metrics import Metrics
+from .rate_limiter import OpenAIRateLimiter
+from .tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Hard limits of the embeddings endpoint
+MAX_INPUTS_PER_REQUEST = 2048
+MAX_TOKENS_PER_INPUT = 8191
+
+
+@dataclass
+class _PendingEmbedding:
+    text: str
+    tokens: int
+    future: asyncio.Future
+
+
+@dataclass
+class BatcherStats:
+    requests: int = 0
+    inputs: int = 0
+    tokens: int = 0
+    failed_requests: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+
+    def inputs_per_second(self) -> float:
+        elapsed = time.perf_counter() - self.started_at
+        return self.inputs / elapsed if elapsed > 0 else 0.0
+
+
+class EmbeddingBatcher:
+    """
+    Collects single-text embedding requests from many callers and sends them to
+    OpenAI as batched `embeddings.create` calls packed up to a token budget.
+
+    Callers simply `await batcher.embed(text)`; each returned vector is routed back
+    to the caller that asked for it using the `index` of the response items.
+    With a `limiter`, batches are sent under its RPM/TPM budgets and retried on
+    throttling; a batch that still fails raises in every waiting caller.
+    `metrics` (if given) tracks request latency, tokens sent and errors.
+    """
+
+    def __init__(
+        self,
+        openai_client: AsyncOpenAI,
+        model: str = EMBEDDING_MODEL,
+        max_batch_tokens: int = 100_000,
+        max_batch_size: int = MAX_INPUTS_PER_REQUEST,
+        max_wait: float = 0.05,
+        max_concurrent_requests: int = 4,
+        dimensions: Optional[int] = EMBEDDING_DIMENSIONS,
+        limiter: Optional[OpenAIRateLimiter] = None,
+        metrics: Optional[Metrics] = None,
+    ):
+        self.openai_client = openai_client
+        self.model = model
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = min(max_batch_size, MAX_INPUTS_PER_REQUEST)
+        self.max_wait = max_wait
+        # Only text-embedding-3 models accept `dimensions`; None requests the full size
+        self.dimensions = dimensions
+        self.embedding_dim = dimensions or 1536
+        self.limiter = limiter
+        self.metrics = metrics
+        self.stats = BatcherStats()
+
+        self._pending: List[_PendingEmbedding] = []
+        self._pending_tokens = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._in_flight: set = set()
+        self._max_concurrent_requests = max_concurrent_requests
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def embed(self, text: str) -> List[float]:
+        """Queue a text for the next batch and wait for its embedding."""
+        loop = asyncio.get_running_loop()
+        tokens = min(count_tokens(text), MAX_TOKENS_PER_INPUT)
+
+        # Flush first if this text would overflow the current batch
+        if self._pending and (
+            self._pending_tokens + tokens > self.max_batch_tokens
+            or len(self._pending) >= self.max_batch_size
+        ):
+            self._dispatch()
+
+        pending = _PendingEmbedding(text=text, tokens=tokens, future=loop.create_future())
+        self._pending.append(pending)
+        self._pending_tokens += tokens
+
+        if (
+            self._pending_tokens >= self.max_batch_tokens
+            or len(self._pending) >= self.max_batch_size
+        ):
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._dispatch)
+
+        return await pending.future
+
+    async def embed_many(self, texts: List[str]) -> List[List[float]]:
+        """Embed several texts, sharing batches with any other concurrent callers."""
+        return list(await asyncio.gather(*(self.embed(text) for text in texts)))
+
+    async def flush(self):
+        """Send whatever is pending and wait for all in-flight requests to finish."""
+        self._dispatch()
+        while self._in_flight:
+            await asyncio.gather(*list(self._in_flight), return_exceptions=True)
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+
+        batch, self._pending, self._pending_tokens = self._pending, [], 0
+        task = asyncio.get_running_loop().create_task(self._send(batch))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    async def _send(self, batch: List[_PendingEmbedding]):
+        if self._semaphore is None:
+            # A limiter brings its own adaptive concurrency cap
+            self._semaphore = asyncio.Semaphore(
+                self.limiter.max_concurrency if self.limiter else self._max_concurrent_requests
+            )
+
+        async with self._semaphore:
+            try:
+                if self.metrics is None:
+                    response = await self._create(batch)
+                else:
+                    self.metrics.inc("openai_tokens_sent", sum(item.tokens for item in batch), api="embeddings")
+                    async with self.metrics.track("openai_request", api="embeddings"):
+                        response = await self._create(batch)
+            except Exception as e:
+                self.stats.failed_requests += 1
+                logger.warning(f"Error getting embeddings for batch of {len(batch)}: {e}")
+                for item in batch:
+                    if not item.future.done():
+                        if self.limiter is None:
+                            item.future.set_result([0] * self.embedding_dim)  # Zero vector on error
+                        else:
+                            item.future.set_exception(e)
+                return
+
+        self.stats.requests += 1
+        self.stats.inputs += len(batch)
+        self.stats.tokens += sum(item.tokens for item in batch)
+
+        for data in response.data:
+            future = batch[data.index].future
+            if not future.done():
+                future.set_result(data.embedding)
+
+    async def _create(self, batch: List[_PendingEmbedding]):
+        params = {"model": self.model, "input": [item.text for item in batch]}
+        if self.dimensions:
+            params["dimensions"] = self.dimensions
+        if self.limiter is None:
+            return await self.openai_client.embeddings.create(**params)
+        return await self.limiter.call(
+            lambda: self.openai_client.embeddings.with_raw_response.create(**params),
+            tokens=sum(item.tokens for item in batch),
+        )
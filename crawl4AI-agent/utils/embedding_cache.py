@@ -0,0 +1,93 @@
+import hashlib
+import os
+import re
+import unicodedata
+from array import array
+from functools import lru_cache
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import diskcache
+
+DEFAULT_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", ".cache/embeddings")
+DEFAULT_SIZE_LIMIT = int(os.getenv("EMBEDDING_CACHE_SIZE_LIMIT", str(2 * 1024**3)))  # 2 GB
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Normalize unicode and whitespace so trivially different texts share a key."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def embedding_model_key(model: str, dimensions: Optional[int] = None) -> str:
+    """Cache namespace for a model; shortened vectors must not mix with full-size ones."""
+    return f"{model}@{dimensions}" if dimensions else model
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache keyed by model and normalized text hash.
+
+    Vectors are stored as float32 blobs (~6 KB for 1536 dims). The cache is
+    bounded by `size_limit` bytes and evicts least-recently-used entries.
+    """
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, size_limit: int = DEFAULT_SIZE_LIMIT):
+        self.cache = diskcache.Cache(
+            directory,
+            size_limit=size_limit,
+            eviction_policy="least-recently-used",
+        )
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(text: str, model: str) -> str:
+        digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+        return f"{model}:{digest}"
+
+    def get(self, text: str, model: str) -> Optional[List[float]]:
+        blob = self.cache.get(self.key(text, model))
+        if blob is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return array("f", blob).tolist()
+
+    def set(self, text: str, model: str, embedding: List[float]):
+        # Zero vectors are error placeholders and must not be cached
+        if not any(embedding):
+            return
+        self.cache.set(self.key(text, model), array("f", embedding).tobytes())
+
+    async def get_or_embed(
+        self, text: str, model: str, embed: Callable[[str], Awaitable[List[float]]]
+    ) -> List[float]:
+        """Return the cached embedding, or compute it with `embed` and cache it."""
+        embedding = self.get(text, model)
+        if embedding is None:
+            embedding = await embed(text)
+            self.set(text, model, embedding)
+        return embedding
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate(),
+            "entries": len(self.cache),
+            "size_bytes": self.cache.volume(),
+        }
+
+    def close(self):
+        self.cache.close()
+
+
+@lru_cache(maxsize=None)
+def get_embedding_cache(directory: str = DEFAULT_CACHE_DIR) -> EmbeddingCache:
+    """Process-wide cache instance shared by the crawler and the agents."""
+    return EmbeddingCache(directory)
@@ -0,0 +1,51 @@
+from typing import Optional
+
+from supabase import Client
+
+from constants import EMBEDDING_DIMENSIONS, EMBEDDING_MODEL
+
+from .incremental import parse_embedding
+
+# Full output size of the OpenAI embedding models, used when EMBEDDING_DIMENSIONS is unset
+MODEL_DIMENSIONS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+}
+
+
+class EmbeddingDimensionMismatch(RuntimeError):
+    """EMBEDDING_DIMENSIONS disagrees with the vectors already stored in site_pages."""
+
+
+def expected_dimensions(
+    model: str = EMBEDDING_MODEL, dimensions: Optional[int] = EMBEDDING_DIMENSIONS
+) -> Optional[int]:
+    """Width of the vectors the configured model returns; None for unknown models."""
+    return dimensions or MODEL_DIMENSIONS.get(model)
+
+
+def check_embedding_dimensions(supabase: Client, table: str = "site_pages") -> Optional[int]:
+    """
+    Compare the configured embedding width with one stored vector.
+
+    The vector(N) columns and search functions in utils/site_pages.sql are sized
+    by hand, so a crawler or agent started with a different EMBEDDING_DIMENSIONS
+    would fail on every write or search. Returns the stored width (None for an
+    empty table) and raises `EmbeddingDimensionMismatch` when they differ.
+    """
+    rows = (
+        supabase.table(table).select("embedding").not_.is_("embedding", "null").limit(1).execute().data
+    )
+    if not rows:
+        return None
+    stored = len(parse_embedding(rows[0]["embedding"]))
+    expected = expected_dimensions()
+    if expected is not None and stored != expected:
+        raise EmbeddingDimensionMismatch(
+            f"{table}.embedding holds {stored}-dimensional vectors but {EMBEDDING_MODEL} is configured "
+            f"for {expected} (EMBEDDING_DIMENSIONS={EMBEDDING_DIMENSIONS or 'unset'}). Set "
+            f"EMBEDDING_DIMENSIONS={stored}, or convert the column and search functions as "
+            f"described in utils/site_pages.sql."
+        )
+    return stored
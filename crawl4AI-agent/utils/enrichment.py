@@ -0,0 +1,124 @@
+import os
+import re
+from typing import Dict, Optional
+
+import diskcache
+
+from .incremental import hash_text
+
+DEFAULT_CACHE_DIR = os.getenv("ENRICHMENT_CACHE_DIR", ".cache/enrichment")
+DEFAULT_SIZE_LIMIT = int(os.getenv("ENRICHMENT_CACHE_SIZE_LIMIT", str(512 * 1024**2)))  # 512 MB
+
+MIN_SUMMARY_CHARS = 60
+MAX_SUMMARY_CHARS = 300
+HEADING_SEARCH_LINES = 3
+
+_HEADING = re.compile(r"^\s{0,3}#{1,6}\s+(.+?)\s*#*\s*$")
+_LINK = re.compile(r"!?\[([^\]]*)\]\([^)]*\)")
+_INLINE_MARKUP = re.compile(r"[*_`]+")
+_ANCHOR = re.compile(r"\s*[¶#]\s*$")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def _strip_markdown(text: str) -> str:
+    text = _LINK.sub(r"\1", text)
+    text = _INLINE_MARKUP.sub("", text)
+    return " ".join(text.split())
+
+
+def _is_prose(paragraph: str) -> bool:
+    """Skip code, tables, lists, quotes and link-only blocks when picking a summary."""
+    first = paragraph.lstrip()
+    if first.startswith(("```", "~~~", "|", "<", ">", "- ", "* ", "+ ")) or _HEADING.match(first):
+        return False
+    if re.match(r"^\d+[.)]\s", first):
+        return False
+    return len(_strip_markdown(paragraph)) >= MIN_SUMMARY_CHARS
+
+
+def _truncate(text: str) -> str:
+    if len(text) <= MAX_SUMMARY_CHARS:
+        return text
+    # Cut at the last sentence end that fits, otherwise at a word boundary
+    cut = text[:MAX_SUMMARY_CHARS]
+    sentence_ends = [m.start() for m in _SENTENCE_END.finditer(cut + " ")]
+    if sentence_ends and sentence_ends[-1] >= MIN_SUMMARY_CHARS:
+        return cut[: sentence_ends[-1]]
+    return cut.rsplit(" ", 1)[0] + "..."
+
+
+def heuristic_title_and_summary(chunk: str) -> Optional[Dict[str, str]]:
+    """
+    Take the title from a leading markdown heading and the summary from the first
+    prose paragraph. Returns None when either is missing so the caller can fall
+    back to the LLM.
+    """
+    title = None
+    lines = [line for line in chunk.splitlines() if line.strip()]
+    for line in lines[:HEADING_SEARCH_LINES]:
+        match = _HEADING.match(line)
+        if match:
+            title = _ANCHOR.sub("", _strip_markdown(match.group(1)))
+            break
+    if not title:
+        return None
+
+    in_fence = False
+    paragraph = []
+    for line in chunk.splitlines() + [""]:
+        if line.lstrip().startswith(("```", "~~~")):
+            in_fence = not in_fence
+            paragraph = []
+            continue
+        if in_fence:
+            continue
+        if line.strip():
+            paragraph.append(line)
+            continue
+        if paragraph and _is_prose("\n".join(paragraph)):
+            return {"title": title, "summary": _truncate(_strip_markdown(" ".join(paragraph)))}
+        paragraph = []
+
+    return None
+
+
+class EnrichmentCache:
+    """Persistent title/summary cache keyed by model, prompt version and chunk hash."""
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, size_limit: int = DEFAULT_SIZE_LIMIT):
+        self.cache = diskcache.Cache(
+            directory,
+            size_limit=size_limit,
+            eviction_policy="least-recently-used",
+        )
+        self.heuristic = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(chunk: str, model: str, prompt_version: int) -> str:
+        return f"{model}:v{prompt_version}:{hash_text(chunk)}"
+
+    def get(self, chunk: str, model: str, prompt_version: int) -> Optional[Dict[str, str]]:
+        result = self.cache.get(self.key(chunk, model, prompt_version))
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+
+    def set(self, chunk: str, model: str, prompt_version: int, result: Dict[str, str]):
+        self.cache.set(self.key(chunk, model, prompt_version), result)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "heuristic": self.heuristic,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self.cache),
+        }
+
+    def close(self):
+        self.cache.close()
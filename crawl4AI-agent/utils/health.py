@@ -0,0 +1,153 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from supabase import Client
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+DEFAULT_PROBE_INTERVAL = float(os.getenv("SUPABASE_HEALTH_INTERVAL", "30"))  # Seconds
+DEFAULT_FAILURE_THRESHOLD = int(os.getenv("SUPABASE_BREAKER_THRESHOLD", "3"))
+DEFAULT_COOLDOWN = float(os.getenv("SUPABASE_BREAKER_COOLDOWN", "30"))  # Seconds
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open circuit breaker fed by a background prober.
+
+    `check` is a cheap synchronous call that raises when the dependency is down.
+    A daemon thread runs it every `interval` seconds, so the cached state is
+    never older than that and `allow()` is O(1) on the request path. Callers
+    can also report the outcome of real requests with `record_success` and
+    `record_failure`. After `failure_threshold` consecutive failures the circuit
+    opens and requests are refused; once `cooldown` has passed it goes half-open
+    and the next probe or request decides whether it closes or opens again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        check: Callable[[], Any],
+        interval: float = DEFAULT_PROBE_INTERVAL,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        cooldown: float = DEFAULT_COOLDOWN,
+    ):
+        self.name = name
+        self.check = check
+        self.interval = interval
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.last_checked: Optional[float] = None
+        self.last_latency: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def allow(self) -> bool:
+        """Whether a request may go through now."""
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+            with self._lock:
+                if self.state == OPEN:
+                    self.state = HALF_OPEN
+        return self.state != OPEN
+
+    def retry_in(self) -> float:
+        """Seconds until an open circuit lets a trial request through."""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+
+    def record_success(self, latency: Optional[float] = None):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self.last_error = None
+            if latency is not None:
+                self.last_latency = latency
+
+    def record_failure(self, error: BaseException):
+        with self._lock:
+            self.failures += 1
+            self.last_error = f"{type(error).__name__}: {error}"
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logger.warning(f"[{self.name}] circuit open after {self.failures} failures: {self.last_error}")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def probe(self) -> bool:
+        """Run the check once and update the state; returns whether it succeeded."""
+        started = time.perf_counter()
+        try:
+            self.check()
+        except Exception as e:
+            self.record_failure(e)
+            return False
+        finally:
+            self.last_checked = time.time()
+        self.record_success(time.perf_counter() - started)
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            # An open circuit is probed as soon as it may go half-open
+            if self.allow():
+                self.probe()
+            self._stop.wait(self.retry_in() or self.interval)
+
+    def start(self) -> "CircuitBreaker":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=f"{self.name}-health", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "state": self.state,
+            "failures": self.failures,
+            "last_checked": self.last_checked,
+            "last_latency_ms": self.last_latency * 1000 if self.last_latency is not None else None,
+            "last_error": self.last_error,
+            "retry_in": self.retry_in(),
+        }
+
+
+_supabase_breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+_supabase_clients: Dict[Tuple[str, str], Client] = {}
+_registry_lock = threading.Lock()
+
+
+def get_supabase_health(supabase: Client, table: str = "site_pages", start: bool = True) -> CircuitBreaker:
+    """
+    Shared breaker for a Supabase project and table, probed with a one-row
+    select on an indexed column instead of an exact COUNT(*) over the table.
+    Clients recreated for the same project (Streamlit does so every hour)
+    share one breaker and prober, which probes through the latest client.
+    """
+    key = (supabase.supabase_url, table)
+    with _registry_lock:
+        _supabase_clients[key] = supabase
+        breaker = _supabase_breakers.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                "supabase",
+                lambda: _supabase_clients[key].table(table).select("id").limit(1).execute(),
+            )
+            _supabase_breakers[key] = breaker
+    return breaker.start() if start else breaker
@@ -0,0 +1,147 @@
+import asyncio
+import hashlib
+import json
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from supabase import Client
+
+
+def hash_text(text: str) -> str:
+    """Stable content hash used to detect unchanged pages and chunks."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def parse_embedding(value) -> List[float]:
+    """PostgREST returns pgvector columns as '[0.1,0.2,...]' strings."""
+    if isinstance(value, str):
+        return json.loads(value)
+    return list(value or [])
+
+
+@dataclass
+class StoredChunk:
+    chunk_number: int
+    content_hash: Optional[str]
+    page_hash: Optional[str]
+    title: Optional[str] = None
+    summary: Optional[str] = None
+    embedding: Optional[List[float]] = None
+
+
+def _fetch_stored_hashes(supabase: Client, site: str, url: str) -> List[StoredChunk]:
+    result = (
+        supabase.table("site_pages")
+        .select("chunk_number, content_hash, page_hash")
+        .eq("site", site)
+        .eq("url", url)
+        .execute()
+    )
+    return [StoredChunk(**row) for row in result.data or []]
+
+
+def _fetch_enrichment(
+    supabase: Client, site: str, url: str, content_hashes: List[str]
+) -> Dict[str, StoredChunk]:
+    result = (
+        supabase.table("site_pages")
+        .select("chunk_number, content_hash, page_hash, title, summary, embedding")
+        .eq("site", site)
+        .eq("url", url)
+        .in_("content_hash", content_hashes)
+        .execute()
+    )
+    stored = {}
+    for row in result.data or []:
+        row["embedding"] = parse_embedding(row["embedding"])
+        stored[row["content_hash"]] = StoredChunk(**row)
+    return stored
+
+
+def _fetch_chunk(supabase: Client, site: str, url: str, chunk_number: int) -> Optional[StoredChunk]:
+    result = (
+        supabase.table("site_pages")
+        .select("chunk_number, content_hash, page_hash, title, summary, embedding")
+        .eq("site", site)
+        .eq("url", url)
+        .eq("chunk_number", chunk_number)
+        .execute()
+    )
+    if not result.data:
+        return None
+    row = result.data[0]
+    row["embedding"] = parse_embedding(row["embedding"])
+    return StoredChunk(**row)
+
+
+def _fetch_site_fingerprints(supabase: Client, site: str, page_size: int) -> List[Tuple[str, int, int]]:
+    rows = []
+    start = 0
+    while True:
+        result = (
+            supabase.table("site_pages")
+            .select("url, chunk_number, simhash")
+            .eq("site", site)
+            .not_.is_("simhash", "null")
+            .order("id")
+            .range(start, start + page_size - 1)
+            .execute()
+        )
+        page = result.data or []
+        rows.extend((row["url"], row["chunk_number"], row["simhash"]) for row in page)
+        if len(page) < page_size:
+            return rows
+        start += page_size
+
+
+def _delete_chunks_from(supabase: Client, site: str, url: str, first_chunk_number: int):
+    return (
+        supabase.table("site_pages")
+        .delete()
+        .eq("site", site)
+        .eq("url", url)
+        .gte("chunk_number", first_chunk_number)
+        .execute()
+    )
+
+
+async def fetch_stored_hashes(supabase: Client, site: str, url: str) -> List[StoredChunk]:
+    """Load the page and chunk hashes already stored for a URL."""
+    return await asyncio.to_thread(_fetch_stored_hashes, supabase, site, url)
+
+
+async def fetch_stored_enrichment(
+    supabase: Client, site: str, url: str, content_hashes: Iterable[str]
+) -> Dict[str, StoredChunk]:
+    """Load title, summary and embedding of stored chunks keyed by content hash."""
+    content_hashes = sorted(set(content_hashes))
+    if not content_hashes:
+        return {}
+    return await asyncio.to_thread(_fetch_enrichment, supabase, site, url, content_hashes)
+
+
+async def fetch_chunk(
+    supabase: Client, site: str, url: str, chunk_number: int
+) -> Optional[StoredChunk]:
+    """Load one stored chunk with its title, summary and embedding."""
+    return await asyncio.to_thread(_fetch_chunk, supabase, site, url, chunk_number)
+
+
+async def fetch_site_fingerprints(
+    supabase: Client, site: str, page_size: int = 1000
+) -> List[Tuple[str, int, int]]:
+    """Load (url, chunk_number, simhash) of every stored chunk of a site."""
+    return await asyncio.to_thread(_fetch_site_fingerprints, supabase, site, page_size)
+
+
+async def delete_chunks_from(supabase: Client, site: str, url: str, first_chunk_number: int):
+    """Delete leftover chunks of a page that now has fewer chunks than before."""
+    return await asyncio.to_thread(_delete_chunks_from, supabase, site, url, first_chunk_number)
+
+
+def page_unchanged(stored: List[StoredChunk], page_hash: str, chunk_count: int) -> bool:
+    """True when every stored chunk belongs to this exact page version."""
+    return (
+        len(stored) == chunk_count
+        and all(chunk.page_hash == page_hash for chunk in stored)
+    )
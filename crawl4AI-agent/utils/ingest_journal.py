@@ -0,0 +1,200 @@
+import os
+import sqlite3
+import zlib
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .sitemap import STATE_DIR, SitemapEntry, parse_lastmod
+
+DEFAULT_JOURNAL_PATH = os.path.join(STATE_DIR, "ingest_journal.sqlite")
+
+# Progress of a URL (and of each of its chunks) through an ingestion run
+DISCOVERED = "discovered"
+CRAWLED = "crawled"
+CHUNKED = "chunked"
+EMBEDDED = "embedded"
+STORED = "stored"
+
+_SCHEMA = """
+create table if not exists runs (
+    id integer primary key autoincrement,
+    site text not null,
+    started_at text not null,
+    finished_at text
+);
+create table if not exists urls (
+    run_id integer not null,
+    url text not null,
+    lastmod text,
+    state text not null,
+    markdown blob,
+    error text,
+    updated_at text not null,
+    primary key (run_id, url)
+);
+create table if not exists chunks (
+    run_id integer not null,
+    url text not null,
+    chunk_number integer not null,
+    content_hash text,
+    state text not null,
+    primary key (run_id, url, chunk_number)
+);
+"""
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class IngestJournal:
+    """
+    Crash-safe record of an ingestion run in a local SQLite file.
+
+    Every URL moves through discovered -> crawled -> chunked -> embedded -> stored,
+    and every chunk through chunked -> embedded -> stored. Crawled markdown is
+    kept (compressed) until the URL is stored, so a resumed run skips the
+    browser for pages it already fetched.
+    """
+
+    def __init__(self, path: str = DEFAULT_JOURNAL_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30.0)
+        self.conn.execute("pragma journal_mode=wal")
+        self.conn.execute("pragma synchronous=normal")
+        self.conn.executescript(_SCHEMA)
+        self.run_id: Optional[int] = None
+
+    def start_run(self, site: str, resume: bool = False) -> bool:
+        """Open a run for the site; returns True when an unfinished run was resumed."""
+        if resume:
+            row = self.conn.execute(
+                "select id from runs where site = ? and finished_at is null order by id desc limit 1",
+                (site,),
+            ).fetchone()
+            if row:
+                self.run_id = row[0]
+                return True
+
+        with self.conn:
+            cursor = self.conn.execute(
+                "insert into runs (site, started_at) values (?, ?)", (site, _now())
+            )
+        self.run_id = cursor.lastrowid
+        return False
+
+    def join_run(self, run_id: int):
+        """Attach to a run started elsewhere (e.g. by a coordinator process)."""
+        self.run_id = run_id
+
+    def finish_run(self):
+        with self.conn:
+            self.conn.execute("update runs set finished_at = ? where id = ?", (_now(), self.run_id))
+            # Markdown is only needed to resume; drop it once the run is complete
+            self.conn.execute("update urls set markdown = null where run_id = ?", (self.run_id,))
+
+    def add_urls(self, entries: Iterable[SitemapEntry]):
+        with self.conn:
+            self.conn.executemany(
+                "insert or ignore into urls (run_id, url, lastmod, state, updated_at) values (?, ?, ?, ?, ?)",
+                [
+                    (self.run_id, entry.url, entry.lastmod.isoformat() if entry.lastmod else None, DISCOVERED, _now())
+                    for entry in entries
+                ],
+            )
+
+    def pending_urls(self) -> List[SitemapEntry]:
+        """URLs of the current run that have not been stored yet."""
+        rows = self.conn.execute(
+            "select url, lastmod from urls where run_id = ? and state != ? order by url",
+            (self.run_id, STORED),
+        ).fetchall()
+        return [SitemapEntry(url, parse_lastmod(lastmod)) for url, lastmod in rows]
+
+    def set_url_state(self, url: str, state: str, markdown: Optional[str] = None):
+        with self.conn:
+            if markdown is not None:
+                self.conn.execute(
+                    "update urls set state = ?, markdown = ?, error = null, updated_at = ? where run_id = ? and url = ?",
+                    (state, zlib.compress(markdown.encode("utf-8")), _now(), self.run_id, url),
+                )
+            else:
+                self.conn.execute(
+                    "update urls set state = ?, error = null, updated_at = ? where run_id = ? and url = ?",
+                    (state, _now(), self.run_id, url),
+                )
+
+    def set_url_error(self, url: str, error: str):
+        with self.conn:
+            self.conn.execute(
+                "update urls set error = ?, updated_at = ? where run_id = ? and url = ?",
+                (error, _now(), self.run_id, url),
+            )
+
+    def crawled_markdown(self, url: str) -> Optional[str]:
+        row = self.conn.execute(
+            "select markdown from urls where run_id = ? and url = ?", (self.run_id, url)
+        ).fetchone()
+        if not row or row[0] is None:
+            return None
+        return zlib.decompress(row[0]).decode("utf-8")
+
+    def set_chunks(self, url: str, chunks: Iterable[Tuple[int, str]], state: str = CHUNKED):
+        """Replace the chunk list of a URL with (chunk_number, content_hash) pairs."""
+        with self.conn:
+            self.conn.execute(
+                "delete from chunks where run_id = ? and url = ?", (self.run_id, url)
+            )
+            self.conn.executemany(
+                "insert into chunks (run_id, url, chunk_number, content_hash, state) values (?, ?, ?, ?, ?)",
+                [(self.run_id, url, number, content_hash, state) for number, content_hash in chunks],
+            )
+
+    def set_chunk_state(self, url: str, chunk_number: int, state: str):
+        with self.conn:
+            self.conn.execute(
+                "update chunks set state = ? where run_id = ? and url = ? and chunk_number = ?",
+                (state, self.run_id, url, chunk_number),
+            )
+
+    def mark_chunks_stored(self, keys: Iterable[Tuple[str, int]]):
+        """Mark flushed (url, chunk_number) rows stored and complete any finished URLs."""
+        keys = list(keys)
+        with self.conn:
+            self.conn.executemany(
+                "update chunks set state = ? where run_id = ? and url = ? and chunk_number = ?",
+                [(STORED, self.run_id, url, number) for url, number in keys],
+            )
+        for url in {url for url, _ in keys}:
+            self.complete_url(url)
+
+    def complete_url(self, url: str):
+        """Mark a URL stored once all its chunks are embedded and every chunk is stored."""
+        with self.conn:
+            self.conn.execute(
+                """
+                update urls set state = ?, markdown = null, updated_at = ?
+                where run_id = ? and url = ? and state = ?
+                  and not exists (
+                    select 1 from chunks
+                    where chunks.run_id = urls.run_id and chunks.url = urls.url and chunks.state != ?
+                  )
+                """,
+                (STORED, _now(), self.run_id, url, EMBEDDED, STORED),
+            )
+
+    def is_stored(self, url: str) -> bool:
+        row = self.conn.execute(
+            "select state from urls where run_id = ? and url = ?", (self.run_id, url)
+        ).fetchone()
+        return bool(row) and row[0] == STORED
+
+    def counts(self) -> Dict[str, int]:
+        rows = self.conn.execute(
+            "select state, count(*) from urls where run_id = ? group by state", (self.run_id,)
+        ).fetchall()
+        return dict(rows)
+
+    def close(self):
+        self.conn.close()
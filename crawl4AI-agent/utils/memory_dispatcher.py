@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, Iterable, List, Optional, Tuple, TypeVar, Union
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def total_rss(process: psutil.Process) -> int:
+    """RSS of a process plus all its children (Chromium runs as child processes)."""
+    rss = process.memory_info().rss
+    for child in process.children(recursive=True):
+        try:
+            rss += child.memory_info().rss
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+    return rss
+
+
+class MemoryAdaptiveDispatcher:
+    """
+    Sliding-window dispatcher that keeps as many tasks in flight as memory allows.
+
+    A new task starts as soon as one finishes (no fixed batches), and the window
+    size follows the measured RSS: it grows by one while memory is below
+    `low_watermark` of the limit and shrinks by one above `high_watermark`.
+    Once RSS reaches the limit no new work is started; when the in-flight tasks
+    have drained, `on_restart` (e.g. a browser restart) is awaited to hand the
+    leaked memory back before dispatching continues.
+    """
+
+    def __init__(
+        self,
+        memory_limit_mb: int,
+        initial_concurrency: int = 3,
+        min_concurrency: int = 1,
+        max_concurrency: int = 20,
+        low_watermark: float = 0.6,
+        high_watermark: float = 0.85,
+        check_interval: float = 0.5,
+        on_restart: Optional[Callable[[], Awaitable[None]]] = None,
+    ):
+        self.memory_limit = memory_limit_mb * 1024 * 1024
+        self.concurrency = initial_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.low_watermark = low_watermark
+        self.high_watermark = high_watermark
+        self.check_interval = check_interval
+        self.on_restart = on_restart
+        self.process = psutil.Process(os.getpid())
+
+        self.peak_rss = 0
+        self.peak_concurrency = initial_concurrency
+        self.restarts = 0
+        self.completed = 0
+
+    def sample(self) -> int:
+        rss = total_rss(self.process)
+        self.peak_rss = max(self.peak_rss, rss)
+        return rss
+
+    def _adjust(self, rss: int, in_flight: int):
+        if rss > self.memory_limit * self.high_watermark:
+            self.concurrency = max(self.min_concurrency, self.concurrency - 1)
+        elif rss < self.memory_limit * self.low_watermark and in_flight >= self.concurrency:
+            # Only grow while the window is actually full
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+            self.peak_concurrency = max(self.peak_concurrency, self.concurrency)
+
+    async def run(
+        self, items: Iterable[T], worker: Callable[[T], Awaitable[R]]
+    ) -> List[Tuple[T, Union[R, BaseException]]]:
+        """Run `worker` over `items`; returns (item, result or exception) in completion order."""
+        pending_items = iter(items)
+        in_flight = {}
+        results: List[Tuple[T, Union[R, BaseException]]] = []
+        exhausted = False
+        draining = False
+        # After a restart at least one task must finish before the next one
+        handled_since_progress = False
+
+        while True:
+            rss = self.sample()
+            if rss >= self.memory_limit and not handled_since_progress:
+                draining = True
+            if draining and not in_flight:
+                if self.on_restart is not None:
+                    logger.warning(f"RSS {rss // 1024**2} MB reached the {self.memory_limit // 1024**2} MB limit, restarting")
+                    await self.on_restart()
+                    self.restarts += 1
+                self.concurrency = self.min_concurrency
+                draining = False
+                handled_since_progress = True
+            self._adjust(rss, len(in_flight))
+
+            while not exhausted and not draining and len(in_flight) < self.concurrency:
+                try:
+                    item = next(pending_items)
+                except StopIteration:
+                    exhausted = True
+                    break
+                in_flight[asyncio.ensure_future(worker(item))] = item
+
+            if not in_flight:
+                if exhausted:
+                    return results
+                continue
+
+            done, _ = await asyncio.wait(
+                in_flight, timeout=self.check_interval, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                item = in_flight.pop(task)
+                self.completed += 1
+                handled_since_progress = False
+                error = task.exception()
+                results.append((item, error if error is not None else task.result()))
+
+    def stats(self) -> dict:
+        return {
+            "completed": self.completed,
+            "concurrency": self.concurrency,
+            "peak_concurrency": self.peak_concurrency,
+            "peak_rss_mb": self.peak_rss // (1024 * 1024),
+            "restarts": self.restarts,
+        }
@@ -0,0 +1,227 @@
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import asynccontextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+import logfire
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from a fast cache hit up to a slow browser page
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+
+class Histogram:
+    """Fixed-bucket histogram, exported in the Prometheus cumulative format."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th observation."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+class Metrics:
+    """
+    In-process counters, gauges and latency histograms for an ingestion run.
+
+    `track` wraps an operation in a logfire span, an in-flight gauge, a latency
+    histogram and an error counter by exception type. The registry can be read
+    as a JSON snapshot or in the Prometheus text format, and `serve` exposes
+    both over HTTP while a run is in progress.
+    """
+
+    def __init__(self, namespace: str = "ingest"):
+        self.namespace = namespace
+        self.started_at = time.time()
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.gauges: Dict[Tuple[str, Labels], float] = {}
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, _labels(labels))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        self.gauges[(name, _labels(labels))] = value
+
+    def add(self, name: str, delta: float, **labels):
+        key = (name, _labels(labels))
+        self.gauges[key] = self.gauges.get(key, 0) + delta
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, _labels(labels))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(value)
+
+    def counter(self, name: str, **labels) -> float:
+        return self.counters.get((name, _labels(labels)), 0)
+
+    def gauge(self, name: str, **labels) -> float:
+        return self.gauges.get((name, _labels(labels)), 0)
+
+    @asynccontextmanager
+    async def track(self, operation: str, **labels) -> AsyncIterator[None]:
+        """Time an async operation: `async with metrics.track("embed", stage="embed"):`."""
+        self.add("in_flight", 1, operation=operation, **labels)
+        started = time.perf_counter()
+        with logfire.span(operation, **labels):
+            try:
+                yield
+            except Exception as e:
+                self.inc("errors_total", operation=operation, type=type(e).__name__, **labels)
+                raise
+            finally:
+                self.add("in_flight", -1, operation=operation, **labels)
+                self.observe("latency_seconds", time.perf_counter() - started, operation=operation, **labels)
+
+    def progress(self, done_counter: str = "pages_done", total_gauge: str = "pages_total") -> Dict[str, float]:
+        """Completion rate and ETA from a done counter and a total gauge."""
+        done = self.counter(done_counter)
+        total = self.gauge(total_gauge)
+        elapsed = time.time() - self.started_at
+        rate = done / elapsed if elapsed > 0 else 0.0
+        remaining = max(total - done, 0)
+        return {
+            "done": done,
+            "total": total,
+            "per_second": rate,
+            "eta_seconds": remaining / rate if rate > 0 else None,
+        }
+
+    def format_progress(self) -> str:
+        progress = self.progress()
+        eta = progress["eta_seconds"]
+        eta_text = f"{eta / 60:.1f} min" if eta is not None else "unknown"
+        return (
+            f"{progress['done']:.0f}/{progress['total']:.0f} pages, "
+            f"{progress['per_second']:.2f} pages/sec, ETA {eta_text}"
+        )
+
+    def snapshot(self) -> Dict[str, Any]:
+        def named(items):
+            return [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(items)
+            ]
+
+        return {
+            "namespace": self.namespace,
+            "uptime_seconds": time.time() - self.started_at,
+            "progress": self.progress(),
+            "counters": named(self.counters.items()),
+            "gauges": named(self.gauges.items()),
+            "histograms": [
+                {"name": name, "labels": dict(labels), **histogram.snapshot()}
+                for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0])
+            ],
+        }
+
+    def prometheus(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = []
+        for kind, items in (("counter", self.counters), ("gauge", self.gauges)):
+            typed = set()
+            for (name, labels), value in sorted(items.items()):
+                metric = f"{self.namespace}_{name}"
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} {kind}")
+                    typed.add(metric)
+                lines.append(f"{metric}{_format_labels(labels)} {value}")
+
+        typed = set()
+        for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+            metric = f"{self.namespace}_{name}"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} histogram")
+                typed.add(metric)
+            cumulative = 0
+            for bound, count in zip(list(histogram.buckets) + ["+Inf"], histogram.counts):
+                cumulative += count
+                lines.append(f"{metric}_bucket{_format_labels(labels, ('le', str(bound)))} {cumulative}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {histogram.sum}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_snapshot(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+    def serve(self, port: int, host: str = "127.0.0.1"):
+        """Expose /metrics (Prometheus text) and /metrics.json from a background thread."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, content_type = metrics.prometheus(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, content_type = json.dumps(metrics.snapshot()), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass  # Keep scrapes out of the crawl output
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server = None
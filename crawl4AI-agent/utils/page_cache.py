@@ -0,0 +1,132 @@
+import os
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Dict, Iterator, Mapping, Optional
+
+import diskcache
+
+DEFAULT_CACHE_DIR = os.getenv("PAGE_CACHE_DIR", ".cache/pages")
+DEFAULT_SIZE_LIMIT = int(os.getenv("PAGE_CACHE_SIZE_LIMIT", str(4 * 1024**3)))  # 4 GB
+
+
+@dataclass
+class CachedPage:
+    url: str
+    site: str
+    html: str
+    markdown: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    fetched_at: float = 0.0
+    source: str = "static"  # "static" or "browser"
+
+    def validators(self) -> Dict[str, str]:
+        """Conditional GET headers that let the server answer 304 Not Modified."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+def _header(headers: Optional[Mapping[str, str]], name: str) -> Optional[str]:
+    if not headers:
+        return None
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+class PageCache:
+    """
+    On-disk store of raw HTML and markdown per URL, compressed with zlib.
+
+    Entries keep the ETag and Last-Modified of the response they came from so a
+    later crawl can revalidate with a conditional GET, and `--from-cache` runs
+    can reprocess every stored page without touching the network.
+    """
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, size_limit: int = DEFAULT_SIZE_LIMIT):
+        self.cache = diskcache.Cache(
+            directory,
+            size_limit=size_limit,
+            eviction_policy="least-recently-stored",
+        )
+        self.hits = 0
+        self.revalidated = 0
+        self.stored = 0
+
+    def get(self, url: str) -> Optional[CachedPage]:
+        entry = self.cache.get(url)
+        if entry is None:
+            return None
+        return CachedPage(
+            url=url,
+            site=entry["site"],
+            html=zlib.decompress(entry["html"]).decode("utf-8"),
+            markdown=zlib.decompress(entry["markdown"]).decode("utf-8"),
+            etag=entry["etag"],
+            last_modified=entry["last_modified"],
+            fetched_at=entry["fetched_at"],
+            source=entry["source"],
+        )
+
+    def set(
+        self,
+        url: str,
+        site: str,
+        html: str,
+        markdown: str,
+        headers: Optional[Mapping[str, str]] = None,
+        source: str = "static",
+    ):
+        self.stored += 1
+        self.cache.set(
+            url,
+            {
+                "site": site,
+                "html": zlib.compress((html or "").encode("utf-8")),
+                "markdown": zlib.compress(markdown.encode("utf-8")),
+                "etag": _header(headers, "etag"),
+                "last_modified": _header(headers, "last-modified"),
+                "fetched_at": time.time(),
+                "source": source,
+            },
+        )
+
+    def mark_revalidated(self, url: str):
+        """Record a 304 for a cached page."""
+        self.revalidated += 1
+        entry = self.cache.get(url)
+        if entry is not None:
+            entry["fetched_at"] = time.time()
+            self.cache.set(url, entry)
+
+    def markdown(self, url: str) -> Optional[str]:
+        """Cached markdown for a URL, counted as a cache hit (used by --from-cache)."""
+        page = self.get(url)
+        if page is None:
+            return None
+        self.hits += 1
+        return page.markdown
+
+    def urls(self, site: Optional[str] = None) -> Iterator[str]:
+        """Every cached URL, optionally only those crawled for `site`."""
+        for url in self.cache.iterkeys():
+            if site is None or self.cache.get(url, {}).get("site") == site:
+                yield url
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "stored": self.stored,
+            "entries": len(self.cache),
+            "size_bytes": self.cache.volume(),
+        }
+
+    def close(self):
+        self.cache.close()
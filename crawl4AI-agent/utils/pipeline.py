@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterable, Awaitable, Callable, Dict, Iterable, List, Optional, Union
+
+from .metrics import Metrics
+
+# A stage handler receives one item and an `emit` coroutine that forwards any
+# number of results to the next stage.
+Emit = Callable[[Any], Awaitable[None]]
+Handler = Callable[[Any, Emit], Awaitable[None]]
+
+_DONE = object()
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class StageStats:
+    name: str
+    concurrency: int
+    processed: int = 0
+    failed: int = 0
+    emitted: int = 0
+    in_flight: int = 0
+    busy_seconds: float = 0.0
+    queue_depth: int = 0
+    queue_size: int = 0
+    errors: Dict[str, int] = field(default_factory=dict)
+
+    def utilization(self, elapsed: float) -> float:
+        """Fraction of the stage's worker time spent inside the handler."""
+        if elapsed <= 0:
+            return 0.0
+        return self.busy_seconds / (elapsed * self.concurrency)
+
+
+@dataclass
+class Stage:
+    name: str
+    handler: Handler
+    concurrency: int = 1
+    queue_size: int = 100
+
+
+class Pipeline:
+    """
+    Runs items through a chain of async stages connected by bounded queues.
+
+    Each stage has its own worker count, so a slow stage never holds resources
+    (browser pages, API slots) that belong to another one. Full queues make
+    upstream stages wait, which keeps memory bounded. With `metrics`, every
+    handler call is tracked per stage and the periodic report includes progress.
+    """
+
+    def __init__(
+        self,
+        stages: List[Stage],
+        report_interval: Optional[float] = 10.0,
+        metrics: Optional[Metrics] = None,
+    ):
+        self.stages = stages
+        self.report_interval = report_interval
+        self.metrics = metrics
+        self.stats = {stage.name: StageStats(stage.name, stage.concurrency) for stage in stages}
+        self._queues: List[asyncio.Queue] = []
+        self._started = 0.0
+
+    async def run(self, items: Union[Iterable[Any], AsyncIterable[Any]]) -> Dict[str, StageStats]:
+        self._started = time.perf_counter()
+        self._queues = [asyncio.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        for stage, queue in zip(self.stages, self._queues):
+            self.stats[stage.name].queue_size = queue.maxsize
+
+        workers = [
+            [asyncio.create_task(self._worker(i)) for _ in range(stage.concurrency)]
+            for i, stage in enumerate(self.stages)
+        ]
+        reporter = asyncio.create_task(self._report()) if self.report_interval else None
+
+        try:
+            await self._feed(items)
+            # Shut stages down in order so every item drains through the chain
+            for i, stage_workers in enumerate(workers):
+                for _ in stage_workers:
+                    await self._queues[i].put(_DONE)
+                await asyncio.gather(*stage_workers)
+        finally:
+            for task in (t for stage_workers in workers for t in stage_workers):
+                task.cancel()
+            if reporter:
+                reporter.cancel()
+
+        self.log_summary()
+        return self.stats
+
+    async def _feed(self, items):
+        first = self._queues[0]
+        if hasattr(items, "__aiter__"):
+            async for item in items:
+                await first.put(item)
+        else:
+            for item in items:
+                await first.put(item)
+
+    async def _worker(self, index: int):
+        stage = self.stages[index]
+        stats = self.stats[stage.name]
+        queue = self._queues[index]
+        next_queue = self._queues[index + 1] if index + 1 < len(self._queues) else None
+
+        async def emit(result: Any):
+            stats.emitted += 1
+            if next_queue is not None:
+                await next_queue.put(result)
+
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                return
+
+            stats.in_flight += 1
+            started = time.perf_counter()
+            try:
+                await self._call(stage, item, emit)
+                stats.processed += 1
+            except Exception as e:
+                stats.failed += 1
+                error_type = type(e).__name__
+                stats.errors[error_type] = stats.errors.get(error_type, 0) + 1
+                logger.warning(f"[{stage.name}] {type(e).__name__}: {e}")
+            finally:
+                stats.in_flight -= 1
+                stats.busy_seconds += time.perf_counter() - started
+
+    async def _call(self, stage: Stage, item: Any, emit: Emit):
+        if self.metrics is None:
+            await stage.handler(item, emit)
+            return
+        async with self.metrics.track("stage", stage=stage.name):
+            await stage.handler(item, emit)
+
+    def bottleneck(self) -> Optional[str]:
+        """The stage whose workers are busy the largest share of the time."""
+        elapsed = time.perf_counter() - self._started
+        if not self.stats:
+            return None
+        return max(self.stats.values(), key=lambda s: s.utilization(elapsed)).name
+
+    def format_stats(self) -> str:
+        elapsed = time.perf_counter() - self._started
+        parts = []
+        for stage, queue in zip(self.stages, self._queues):
+            stats = self.stats[stage.name]
+            stats.queue_depth = queue.qsize()
+            if self.metrics is not None:
+                self.metrics.set("queue_depth", stats.queue_depth, stage=stage.name)
+            parts.append(
+                f"{stage.name}: {stats.processed} done, {stats.failed} failed, "
+                f"{stats.in_flight}/{stats.concurrency} busy, "
+                f"queue {stats.queue_depth}/{stats.queue_size}, "
+                f"util {stats.utilization(elapsed):.0%}"
+            )
+        return " | ".join(parts)
+
+    def log_summary(self):
+        elapsed = time.perf_counter() - self._started
+        logger.info(f"Pipeline finished in {elapsed:.1f}s: {self.format_stats()}")
+        logger.info(f"Bottleneck stage: {self.bottleneck()}")
+
+    async def _report(self):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            logger.info(f"[pipeline] {self.format_stats()}")
+            if self.metrics is not None:
+                logger.info(f"[progress] {self.metrics.format_progress()}")
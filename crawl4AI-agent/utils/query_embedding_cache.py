@@ -0,0 +1,122 @@
+import asyncio
+import os
+import threading
+from functools import lru_cache
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from cachetools import TTLCache
+
+from .embedding_cache import EmbeddingCache, get_embedding_cache, normalize_text
+
+DEFAULT_MAXSIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "2048"))
+DEFAULT_TTL = float(os.getenv("QUERY_EMBEDDING_CACHE_TTL", "3600"))  # Seconds
+PERSIST_QUERY_EMBEDDINGS = os.getenv("QUERY_EMBEDDING_CACHE_PERSIST", "true").lower() == "true"
+
+
+def normalize_query(text: str) -> str:
+    """Case- and whitespace-insensitive form of a query, used as the cache key."""
+    return normalize_text(text).casefold()
+
+
+class QueryEmbeddingCache:
+    """
+    In-memory LRU cache of query embeddings with a time-to-live, in front of an
+    optional persistent `EmbeddingCache`.
+
+    Queries are keyed by model and normalized text, so an agent retrying with
+    the same question, or users asking the same FAQ, skip the embeddings call.
+    Concurrent lookups of the same uncached query share one request.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = DEFAULT_MAXSIZE,
+        ttl: float = DEFAULT_TTL,
+        persistent: Optional[EmbeddingCache] = None,
+    ):
+        self.memory: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.persistent = persistent
+        self._lock = threading.Lock()
+        self._in_flight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get(self, text: str, model: str) -> Optional[List[float]]:
+        key = (model, normalize_query(text))
+        with self._lock:
+            embedding = self.memory.get(key)
+        if embedding is not None:
+            self.hits += 1
+            return embedding
+
+        if self.persistent is not None:
+            embedding = self.persistent.get(key[1], model)
+            if embedding is not None:
+                self.persistent_hits += 1
+                with self._lock:
+                    self.memory[key] = embedding
+                return embedding
+
+        self.misses += 1
+        return None
+
+    def set(self, text: str, model: str, embedding: List[float]):
+        # Zero vectors are error placeholders and must not be cached
+        if not any(embedding):
+            return
+        key = (model, normalize_query(text))
+        with self._lock:
+            self.memory[key] = embedding
+        if self.persistent is not None:
+            self.persistent.set(key[1], model, embedding)
+
+    async def get_or_embed(
+        self, text: str, model: str, embed: Callable[[str], Awaitable[List[float]]]
+    ) -> List[float]:
+        """Return the cached embedding, or compute it once with `embed` and cache it."""
+        embedding = self.get(text, model)
+        if embedding is not None:
+            return embedding
+
+        key = (model, normalize_query(text))
+        pending = self._in_flight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            embedding = await embed(text)
+            self.set(text, model, embedding)
+            future.set_result(embedding)
+            return embedding
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved when nobody else was waiting
+            raise
+        finally:
+            del self._in_flight[key]
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.persistent_hits + self.misses
+        return {
+            "hits": self.hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": (self.hits + self.persistent_hits) / lookups if lookups else 0.0,
+            "entries": len(self.memory),
+        }
+
+
+@lru_cache(maxsize=None)
+def get_query_embedding_cache() -> QueryEmbeddingCache:
+    """Process-wide query cache shared by the agents and supabasev0."""
+    persistent = get_embedding_cache() if PERSIST_QUERY_EMBEDDINGS else None
+    return QueryEmbeddingCache(persistent=persistent)
@@ -0,0 +1,216 @@
+import asyncio
+import logging
+import random
+import re
+import time
+from typing import Any, Awaitable, Callable, Mapping, Optional
+
+import openai
+
+logger = logging.getLogger(__name__)
+
+# Errors worth retrying; anything else (bad request, auth, ...) fails immediately
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+)
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_reset_duration(value: Optional[str]) -> Optional[float]:
+    """Parse OpenAI reset headers such as '20ms', '1s' or '6m0s' into seconds."""
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+class TokenBucket:
+    """Continuously refilling budget of `capacity` units per minute."""
+
+    def __init__(self, capacity: float):
+        self.capacity = capacity
+        self.available = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(
+            self.capacity, self.available + (now - self._updated) * self.capacity / 60.0
+        )
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` units are available (0 if they are now)."""
+        self._refill()
+        # A single request larger than the whole budget only waits for a full bucket
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) * 60.0 / self.capacity
+
+    def consume(self, amount: float):
+        self._refill()
+        self.available -= amount
+
+    def sync(self, limit: Optional[float], remaining: Optional[float]):
+        """Align the local budget with what the server reports."""
+        self._refill()
+        if limit:
+            self.capacity = limit
+        if remaining is not None:
+            self.available = min(self.available, remaining)
+
+
+class OpenAIRateLimiter:
+    """
+    Shared limiter for one OpenAI model's RPM and TPM budgets.
+
+    Requests wait for both token buckets and for a concurrency slot. The
+    concurrency limit grows additively on success and halves on a 429 (AIMD),
+    and the buckets are re-synced from the x-ratelimit-* response headers.
+    Retryable failures are retried with exponential backoff and full jitter.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: int,
+        tokens_per_minute: int,
+        initial_concurrency: int = 8,
+        min_concurrency: int = 1,
+        max_concurrency: int = 64,
+        max_retries: int = 6,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+    ):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.concurrency = float(initial_concurrency)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self.in_flight = 0
+        self.throttled = 0
+        self.retries = 0
+        self._last_decrease = 0.0
+        self._condition: Optional[asyncio.Condition] = None
+        self._bucket_lock: Optional[asyncio.Lock] = None
+
+    async def call(self, request: Callable[[], Awaitable[Any]], tokens: int = 0) -> Any:
+        """
+        Run `request` (which must return a raw response, e.g. from
+        `client.embeddings.with_raw_response.create`) under the limiter and
+        return the parsed result.
+        """
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(tokens)
+            success = False
+            try:
+                raw = await request()
+                self._sync_headers(raw.headers)
+                success = True
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self._retry_delay(e, attempt)
+                self.retries += 1
+                logger.info(f"[{self.name}] {type(e).__name__}, retrying in {delay:.1f}s (attempt {attempt + 1})")
+            finally:
+                # Shielded so a cancelled call (e.g. on pipeline shutdown) still frees its slot
+                await asyncio.shield(self._release(success=success))
+
+            if success:
+                return raw.parse()
+            await asyncio.sleep(delay)
+
+    async def _acquire(self, tokens: int):
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+            self._bucket_lock = asyncio.Lock()
+
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.concurrency))
+            self.in_flight += 1
+
+        # One waiter at a time so large requests are not starved by small ones
+        try:
+            async with self._bucket_lock:
+                while True:
+                    wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+                    if wait <= 0:
+                        break
+                    await asyncio.sleep(wait)
+                self.requests.consume(1)
+                self.tokens.consume(tokens)
+        except BaseException:
+            # Cancelled while waiting for the bucket: give the slot back
+            await asyncio.shield(self._release())
+            raise
+
+    async def _release(self, success: bool = False):
+        async with self._condition:
+            self.in_flight -= 1
+            if success:
+                # Additive increase: about +1 slot per window of successful calls
+                self.concurrency = min(
+                    self.max_concurrency, self.concurrency + 1.0 / self.concurrency
+                )
+            self._condition.notify_all()
+
+    def _on_throttled(self):
+        self.throttled += 1
+        now = time.monotonic()
+        # A burst of 429s from the same window should only halve once
+        if now - self._last_decrease > 1.0:
+            self.concurrency = max(self.min_concurrency, self.concurrency / 2)
+            self._last_decrease = now
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+        if not isinstance(error, openai.RateLimitError):
+            return backoff
+
+        self._on_throttled()
+        headers = error.response.headers if error.response is not None else {}
+        self._sync_headers(headers)
+        retry_after = parse_reset_duration(headers.get("retry-after")) or max(
+            parse_reset_duration(headers.get("x-ratelimit-reset-requests")) or 0,
+            parse_reset_duration(headers.get("x-ratelimit-reset-tokens")) or 0,
+        )
+        return max(backoff, retry_after + random.uniform(0, self.base_delay))
+
+    def _sync_headers(self, headers: Mapping[str, str]):
+        def number(name: str) -> Optional[float]:
+            try:
+                return float(headers[name])
+            except (KeyError, TypeError, ValueError):
+                return None
+
+        self.requests.sync(
+            number("x-ratelimit-limit-requests"), number("x-ratelimit-remaining-requests")
+        )
+        self.tokens.sync(
+            number("x-ratelimit-limit-tokens"), number("x-ratelimit-remaining-tokens")
+        )
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": int(self.concurrency),
+            "in_flight": self.in_flight,
+            "throttled": self.throttled,
+            "retries": self.retries,
+        }
@@ -0,0 +1,102 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional
+
+from crawl4ai import AsyncWebCrawler
+
+logger = logging.getLogger(__name__)
+
+
+class SessionPool:
+    """
+    Pool of crawl4ai browser sessions (one page each) for concurrent `arun` calls.
+
+    Every concurrent crawl gets its own session, so `size` really is the number
+    of pages loading in parallel. A session is closed and replaced once it has
+    served `max_uses` crawls, or as soon as a crawl on it fails, so a page that
+    leaked memory or got stuck in a bad state is not handed out again.
+    """
+
+    def __init__(
+        self,
+        crawler: AsyncWebCrawler,
+        size: int,
+        max_uses: int = 50,
+        prefix: str = "session",
+    ):
+        self.crawler = crawler
+        self.size = size
+        self.max_uses = max_uses
+        self.prefix = prefix
+
+        self.recycled = 0
+        self._uses: Dict[str, int] = {}
+        self._broken: set = set()
+        self._created = 0
+        self._idle: Optional[asyncio.Queue] = None
+
+    def _new_session_id(self) -> str:
+        self._created += 1
+        session_id = f"{self.prefix}_{self._created}"
+        self._uses[session_id] = 0
+        return session_id
+
+    async def acquire(self) -> str:
+        """Wait for a free session and return its id."""
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            for _ in range(self.size):
+                self._idle.put_nowait(self._new_session_id())
+        session_id = await self._idle.get()
+        self._uses[session_id] += 1
+        return session_id
+
+    def discard(self, session_id: str):
+        """Recycle the session on release instead of reusing it (e.g. after a failed crawl)."""
+        self._broken.add(session_id)
+
+    async def release(self, session_id: str):
+        if session_id in self._broken or self._uses[session_id] >= self.max_uses:
+            await self._kill(session_id)
+            session_id = self._new_session_id()
+        self._idle.put_nowait(session_id)
+
+    @asynccontextmanager
+    async def session(self) -> AsyncIterator[str]:
+        """`async with pool.session() as session_id:`; exceptions recycle the session."""
+        session_id = await self.acquire()
+        try:
+            yield session_id
+        except BaseException:
+            self.discard(session_id)
+            raise
+        finally:
+            await self.release(session_id)
+
+    async def _kill(self, session_id: str):
+        self._broken.discard(session_id)
+        self._uses.pop(session_id, None)
+        self.recycled += 1
+        try:
+            await self.crawler.crawler_strategy.kill_session(session_id)
+        except Exception as e:
+            logger.warning(f"Error closing browser session {session_id}: {e}")
+
+    async def close(self):
+        """Close every session still open (the crawler itself is closed by the caller)."""
+        sessions: List[str] = list(self._uses)
+        for session_id in sessions:
+            try:
+                await self.crawler.crawler_strategy.kill_session(session_id)
+            except Exception as e:
+                logger.warning(f"Error closing browser session {session_id}: {e}")
+        self._uses.clear()
+        self._idle = None
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "sessions_created": self._created,
+            "recycled": self.recycled,
+        }
@@ -0,0 +1,43 @@
+import hashlib
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+
+
+def shard_for(url: str, shards: int) -> int:
+    """Stable shard index of a URL, identical across processes and runs."""
+    digest = hashlib.sha256(url.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % shards
+
+
+@dataclass
+class ShardResult:
+    """What a worker process reports back to the coordinator."""
+    shard: int
+    urls: int = 0
+    stored_urls: List[str] = field(default_factory=list)
+    rows: int = 0
+    failed_rows: int = 0
+    embedded: int = 0
+    seconds: float = 0.0
+    error: str = ""
+    metrics: Dict[str, Any] = field(default_factory=dict)
+
+
+def format_shard_results(results: List[ShardResult]) -> str:
+    lines = []
+    for result in sorted(results, key=lambda r: r.shard):
+        status = f"FAILED ({result.error})" if result.error else "ok"
+        lines.append(
+            f"  shard {result.shard}: {len(result.stored_urls)}/{result.urls} URLs stored, "
+            f"{result.rows} rows, {result.failed_rows} failed rows, "
+            f"{result.embedded} embedded in {result.seconds:.0f}s - {status}"
+        )
+    urls = sum(r.urls for r in results)
+    stored = sum(len(r.stored_urls) for r in results)
+    rows = sum(r.rows for r in results)
+    slowest = max((r.seconds for r in results), default=0.0)
+    lines.append(
+        f"  total: {stored}/{urls} URLs stored, {rows} rows "
+        f"({rows / slowest if slowest else 0:.1f} rows/sec across {len(results)} workers)"
+    )
+    return "\n".join(lines)
@@ -1,8 +1,11 @@
+-- Run this whole file on a new database, or again on an existing one to bring it up to
+-- date: every statement is a no-op when its object already exists.
+
 -- Enable the pgvector extension
 create extension if not exists vector;
 
 -- Create the documentation chunks table
-create table site_pages (
+create table if not exists site_pages (
     id bigserial primary key,
     site varchar not null,  -- Added site column
     url varchar not null,
@@ -12,27 +15,96 @@ create table site_pages (
     content text not null,  -- Added content column
     metadata jsonb not null default '{}'::jsonb,  -- Added metadata column
     embedding vector(1536),  -- OpenAI embeddings are 1536 dimensions
+    content_hash varchar,  -- sha256 of the chunk content, used to skip unchanged chunks
+    page_hash varchar,  -- sha256 of the page markdown, used to skip unchanged pages
+    simhash bigint,  -- 64-bit SimHash of the chunk, used to find near-duplicate chunks
+    token_count integer,  -- cl100k_base tokens in content, counted at ingest for context packing
+    summary_token_count integer,  -- cl100k_base tokens in summary
     created_at timestamp with time zone default timezone('utc'::text, now()) not null,
+    updated_at timestamp with time zone default timezone('utc'::text, now()) not null,  -- set by trigger, see below
+    -- Full-text document for hybrid search; titles outrank summaries, which outrank content
+    fts tsvector generated always as (
+      setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+      setweight(to_tsvector('english', coalesce(summary, '')), 'B') ||
+      setweight(to_tsvector('english', coalesce(content, '')), 'C')
+    ) stored,
     
     -- Add a unique constraint to prevent duplicate chunks for the same URL and site
     unique(site, url, chunk_number)
 );
 
+-- Migration for existing tables: columns added since the table was first created
+-- Content hashes for incremental re-ingestion
+alter table site_pages add column if not exists content_hash varchar;
+alter table site_pages add column if not exists page_hash varchar;
+-- SimHash fingerprints for near-duplicate detection
+alter table site_pages add column if not exists simhash bigint;
+-- Change tracking for the local vector index, see below
+alter table site_pages add column if not exists updated_at timestamp with time zone
+  default timezone('utc'::text, now()) not null;
+-- Hybrid full-text + vector search. Adding a stored generated column rewrites the table,
+-- so run it outside peak hours.
+alter table site_pages add column if not exists fts tsvector generated always as (
+  setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+  setweight(to_tsvector('english', coalesce(summary, '')), 'B') ||
+  setweight(to_tsvector('english', coalesce(content, '')), 'C')
+) stored;
+-- Token counts for context packing. Rows written before this get an estimate (about 4
+-- characters per token) until their page is re-ingested.
+alter table site_pages add column if not exists token_count integer;
+alter table site_pages add column if not exists summary_token_count integer;
+update site_pages set
+  token_count = coalesce(token_count, ceil(length(content) / 4.0)::integer),
+  summary_token_count = coalesce(summary_token_count, ceil(length(summary) / 4.0)::integer)
+where token_count is null or summary_token_count is null;
+
 -- Create an index for better vector similarity search performance
-create index on site_pages using ivfflat (embedding vector_cosine_ops);
+create index if not exists site_pages_embedding_idx on site_pages using ivfflat (embedding vector_cosine_ops);
 
 -- Create an index on metadata for faster filtering
-create index idx_site_pages_metadata on site_pages using gin (metadata);
+create index if not exists idx_site_pages_metadata on site_pages using gin (metadata);
 
 -- Create an index on site for faster filtering
-create index idx_site_pages_site on site_pages(site);
+create index if not exists idx_site_pages_site on site_pages(site);
+
+-- Create an index on the full-text document for hybrid search
+create index if not exists idx_site_pages_fts on site_pages using gin (fts);
+
+-- Compact vector indexes (pgvector >= 0.7). The full-precision embedding stays in the
+-- table for re-scoring; these expression indexes are what the compact searches scan.
+-- On a large existing table they block writes while they build; see "Concurrent index
+-- builds" at the end of this file to build them while ingestion keeps writing instead.
+-- halfvec: half the size of a float32 index with practically the same recall
+create index if not exists idx_site_pages_embedding_halfvec on site_pages
+  using hnsw ((embedding::halfvec(1536)) halfvec_cosine_ops);
+-- binary quantization: 1 bit per dimension (32x smaller), only usable with re-scoring
+create index if not exists idx_site_pages_embedding_binary on site_pages
+  using hnsw ((binary_quantize(embedding)::bit(1536)) bit_hamming_ops);
+-- Once the agents run with VECTOR_SEARCH_PRECISION=halfvec or binary, the float32
+-- ivfflat index is unused and can be dropped
+-- drop index if exists site_pages_embedding_idx;
+
+-- The search functions gained parameters and result columns over time. "create or replace"
+-- cannot change either, so every earlier signature (and the current one) is dropped first.
+drop function if exists match_site_pages(vector, int, jsonb, varchar);
+drop function if exists match_site_pages(vector, int, jsonb, varchar, varchar, int);
+drop function if exists match_site_pages(vector, int, jsonb, varchar, varchar, int, boolean);
+drop function if exists hybrid_match_site_pages(text, vector, int, jsonb, varchar, float, float, int);
+drop function if exists hybrid_match_site_pages(text, vector, int, jsonb, varchar, float, float, int, boolean);
 
 -- Create a function to search for documentation chunks
-create function match_site_pages (
+-- search_precision: 'full' searches the float32 vectors; 'halfvec' and 'binary' search
+-- the compact indexes below for match_count * rescore_factor candidates and re-score
+-- them against the full-precision embedding. include_embeddings also returns each row's
+-- embedding (otherwise null), for callers that diversify results client-side
+create or replace function match_site_pages (
   query_embedding vector(1536),
   match_count int default 10,
   filter jsonb DEFAULT '{}'::jsonb,
-  site_filter varchar DEFAULT NULL
+  site_filter varchar DEFAULT NULL,
+  search_precision varchar DEFAULT 'full',
+  rescore_factor int DEFAULT 4,
+  include_embeddings boolean DEFAULT false
 ) returns table (
   id bigint,
   site varchar,
@@ -42,37 +114,201 @@ create function match_site_pages (
   summary varchar,
   content text,
   metadata jsonb,
+  token_count integer,
+  summary_token_count integer,
+  embedding vector(1536),
   similarity float
 )
 language plpgsql
 as $$
 #variable_conflict use_column
 begin
-  return query
+  if search_precision = 'halfvec' then
+    return query
+    with candidates as (
+      select * from site_pages
+      where metadata @> filter
+        AND (site_filter IS NULL OR site = site_filter)
+      order by site_pages.embedding::halfvec(1536) <=> query_embedding::halfvec(1536)
+      limit match_count * rescore_factor
+    )
+    select
+      c.id, c.site, c.url, c.chunk_number, c.title, c.summary, c.content, c.metadata,
+      c.token_count, c.summary_token_count,
+      case when include_embeddings then c.embedding end,
+      1 - (c.embedding <=> query_embedding) as similarity
+    from candidates c
+    order by c.embedding <=> query_embedding
+    limit match_count;
+  elsif search_precision = 'binary' then
+    return query
+    with candidates as (
+      select * from site_pages
+      where metadata @> filter
+        AND (site_filter IS NULL OR site = site_filter)
+      order by binary_quantize(site_pages.embedding)::bit(1536) <~> binary_quantize(query_embedding)
+      limit match_count * rescore_factor
+    )
+    select
+      c.id, c.site, c.url, c.chunk_number, c.title, c.summary, c.content, c.metadata,
+      c.token_count, c.summary_token_count,
+      case when include_embeddings then c.embedding end,
+      1 - (c.embedding <=> query_embedding) as similarity
+    from candidates c
+    order by c.embedding <=> query_embedding
+    limit match_count;
+  else
+    return query
+    select
+      id,
+      site,
+      url,
+      chunk_number,
+      title,
+      summary,
+      content,
+      metadata,
+      token_count,
+      summary_token_count,
+      case when include_embeddings then site_pages.embedding end,
+      1 - (site_pages.embedding <=> query_embedding) as similarity
+    from site_pages
+    where metadata @> filter
+      AND (site_filter IS NULL OR site = site_filter)
+    order by site_pages.embedding <=> query_embedding
+    limit match_count;
+  end if;
+end;
+$$;
+
+-- Hybrid search: fuses a full-text ranking and a vector ranking with reciprocal rank
+-- fusion, so exact identifiers (Filecoin.ChainHead, RunContext) that embed poorly still
+-- surface. Each side contributes its top match_count * 2 rows; a row's rank_score is
+-- sum(weight / (rrf_k + rank)) over the rankings it appears in. Any query term may match;
+-- ts_rank_cd favours chunks that match more of them.
+create or replace function hybrid_match_site_pages (
+  query_text text,
+  query_embedding vector(1536),
+  match_count int default 10,
+  filter jsonb DEFAULT '{}'::jsonb,
+  site_filter varchar DEFAULT NULL,
+  full_text_weight float DEFAULT 1,
+  semantic_weight float DEFAULT 1,
+  rrf_k int DEFAULT 50,
+  include_embeddings boolean DEFAULT false
+) returns table (
+  id bigint,
+  site varchar,
+  url varchar,
+  chunk_number integer,
+  title varchar,
+  summary varchar,
+  content text,
+  metadata jsonb,
+  token_count integer,
+  summary_token_count integer,
+  embedding vector(1536),
+  similarity float,
+  rank_score float
+)
+language sql
+as $$
+with query as (
+  select nullif(replace(plainto_tsquery('english', query_text)::text, ' & ', ' | '), '')::tsquery as terms
+),
+full_text as (
+  select
+    site_pages.id,
+    row_number() over (order by ts_rank_cd(site_pages.fts, query.terms) desc) as rank_ix
+  from site_pages, query
+  where site_pages.fts @@ query.terms
+    AND site_pages.metadata @> filter
+    AND (site_filter IS NULL OR site_pages.site = site_filter)
+  order by rank_ix
+  limit match_count * 2
+),
+semantic as (
   select
-    id,
-    site,
-    url,
-    chunk_number,
-    title,
-    summary,
-    content,
-    metadata,
-    1 - (site_pages.embedding <=> query_embedding) as similarity
+    site_pages.id,
+    row_number() over (order by site_pages.embedding <=> query_embedding) as rank_ix
   from site_pages
-  where metadata @> filter
-    AND (site_filter IS NULL OR site = site_filter)
-  order by site_pages.embedding <=> query_embedding
-  limit match_count;
+  where site_pages.metadata @> filter
+    AND (site_filter IS NULL OR site_pages.site = site_filter)
+  order by rank_ix
+  limit match_count * 2
+)
+select
+  site_pages.id,
+  site_pages.site,
+  site_pages.url,
+  site_pages.chunk_number,
+  site_pages.title,
+  site_pages.summary,
+  site_pages.content,
+  site_pages.metadata,
+  site_pages.token_count,
+  site_pages.summary_token_count,
+  case when include_embeddings then site_pages.embedding end,
+  1 - (site_pages.embedding <=> query_embedding) as similarity,
+  coalesce(1.0 / (rrf_k + full_text.rank_ix), 0.0) * full_text_weight +
+    coalesce(1.0 / (rrf_k + semantic.rank_ix), 0.0) * semantic_weight as rank_score
+from full_text
+  full outer join semantic on full_text.id = semantic.id
+  join site_pages on coalesce(full_text.id, semantic.id) = site_pages.id
+order by rank_score desc
+limit match_count;
+$$;
+
+-- Change tracking for the local vector index (utils/vector_index.py). Upserts keep a row's
+-- id and created_at, so updates are tracked with updated_at; deleted ids are recorded in
+-- site_pages_deleted.
+create index if not exists idx_site_pages_updated_at on site_pages(updated_at, id);
+
+create or replace function site_pages_set_updated_at() returns trigger
+language plpgsql
+as $$
+begin
+  new.updated_at = timezone('utc'::text, now());
+  return new;
+end;
+$$;
+
+drop trigger if exists site_pages_updated_at on site_pages;
+create trigger site_pages_updated_at
+  before update on site_pages
+  for each row execute function site_pages_set_updated_at();
+
+create table if not exists site_pages_deleted (
+    id bigint not null,
+    deleted_at timestamp with time zone default timezone('utc'::text, now()) not null
+);
+create index if not exists idx_site_pages_deleted_at on site_pages_deleted(deleted_at, id);
+
+create or replace function site_pages_record_delete() returns trigger
+language plpgsql
+as $$
+begin
+  insert into site_pages_deleted (id) values (old.id);
+  return old;
 end;
 $$;
 
+drop trigger if exists site_pages_deleted on site_pages;
+create trigger site_pages_deleted
+  after delete on site_pages
+  for each row execute function site_pages_record_delete();
+
+-- Tombstones are only needed until every index has synced past them, e.g.
+-- delete from site_pages_deleted where deleted_at < now() - interval '7 days';
+
 -- Everything above will work for any PostgreSQL database. The below commands are for Supabase security
 
--- Enable RLS on the table
+-- Enable RLS on the tables
 alter table site_pages enable row level security;
+alter table site_pages_deleted enable row level security;
 
 -- Create a policy that allows anyone to read
+drop policy if exists "Allow public read access" on site_pages;
 create policy "Allow public read access"
   on site_pages
   for select
@@ -80,8 +316,55 @@ create policy "Allow public read access"
   using (true);
 
 -- Add this policy to allow service role to insert
+drop policy if exists "Allow service role to insert" on site_pages;
 create policy "Allow service role to insert"
   on site_pages
   for insert
   to service_role
   with check (true);
+
+-- Allow the service role to update rows so the ingestion writer can upsert
+drop policy if exists "Allow service role to update" on site_pages;
+create policy "Allow service role to update"
+  on site_pages
+  for update
+  to service_role
+  using (true)
+  with check (true);
+
+-- Allow the service role to delete chunks left over when a page shrinks
+drop policy if exists "Allow service role to delete" on site_pages;
+create policy "Allow service role to delete"
+  on site_pages
+  for delete
+  to service_role
+  using (true);
+
+drop policy if exists "Allow public read access" on site_pages_deleted;
+create policy "Allow public read access"
+  on site_pages_deleted
+  for select
+  to public
+  using (true);
+
+-- Optional: shorter text-embedding-3 vectors (EMBEDDING_DIMENSIONS=512 in the crawler and
+-- agents). text-embedding-3 vectors can be truncated, and cosine distance ignores the
+-- lost norm, so existing rows are converted in place instead of being re-embedded.
+-- Replace 1536 with 512 in match_site_pages, hybrid_match_site_pages and the index
+-- definitions as well. The crawlers and agents compare EMBEDDING_DIMENSIONS with the
+-- stored vectors at startup (utils/embedding_dimensions.py) and refuse to run when they differ.
+-- drop index if exists site_pages_embedding_idx;
+-- drop index if exists idx_site_pages_embedding_halfvec;
+-- drop index if exists idx_site_pages_embedding_binary;
+-- alter table site_pages
+--   alter column embedding type vector(512) using subvector(embedding, 1, 512)::vector(512);
+
+-- Concurrent index builds. "create index concurrently" does not block writes but cannot run
+-- inside a transaction block, and the Supabase SQL editor runs a script as one transaction.
+-- To add these indexes to a large existing table without pausing ingestion, run each of
+-- these on its own (e.g. with psql), outside any transaction, before running this file:
+-- create index concurrently if not exists idx_site_pages_embedding_halfvec on site_pages
+--   using hnsw ((embedding::halfvec(1536)) halfvec_cosine_ops);
+-- create index concurrently if not exists idx_site_pages_embedding_binary on site_pages
+--   using hnsw ((binary_quantize(embedding)::bit(1536)) bit_hamming_ops);
+-- create index concurrently if not exists idx_site_pages_fts on site_pages using gin (fts);
@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from supabase import Client
+
+from .metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+# Matches unique(site, url, chunk_number) in utils/site_pages.sql
+SITE_PAGES_CONFLICT_KEY = "site,url,chunk_number"
+
+
+@dataclass
+class WriterStats:
+    batches: int = 0
+    rows: int = 0
+    failed_batches: int = 0
+    failed_rows: int = 0
+    batch_latencies: List[float] = field(default_factory=list)
+
+    def mean_latency(self) -> float:
+        if not self.batch_latencies:
+            return 0.0
+        return sum(self.batch_latencies) / len(self.batch_latencies)
+
+
+class SitePagesWriter:
+    """
+    Buffers `site_pages` rows and writes them as multi-row upserts.
+
+    A flush happens when `batch_size` rows are buffered or `flush_interval` seconds
+    after the first buffered row, whichever comes first. The supabase client is
+    synchronous, so every write runs in a worker thread to keep the event loop free.
+    `on_flushed` is called with the rows of every batch that was written, and
+    `metrics` (if given) tracks upsert latency, rows written and errors.
+    """
+
+    def __init__(
+        self,
+        supabase: Client,
+        table: str = "site_pages",
+        batch_size: int = 500,
+        flush_interval: float = 2.0,
+        max_concurrent_writes: int = 2,
+        on_conflict: str = SITE_PAGES_CONFLICT_KEY,
+        on_flushed: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+        metrics: Optional[Metrics] = None,
+    ):
+        self.supabase = supabase
+        self.table = table
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_conflict = on_conflict
+        self.on_flushed = on_flushed
+        self.metrics = metrics
+        self.stats = WriterStats()
+
+        self._buffer: List[Dict[str, Any]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._in_flight: set = set()
+        self._max_concurrent_writes = max_concurrent_writes
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def add(self, row: Dict[str, Any]):
+        """Buffer a row, flushing in the background once a threshold is reached."""
+        self._buffer.append(row)
+        if len(self._buffer) >= self.batch_size:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(
+                self.flush_interval, self._dispatch
+            )
+
+    async def flush(self):
+        """Write everything buffered and wait for all in-flight batches."""
+        self._dispatch()
+        while self._in_flight:
+            await asyncio.gather(*list(self._in_flight), return_exceptions=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.flush()
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._buffer:
+            return
+
+        rows, self._buffer = self._dedupe(self._buffer), []
+        task = asyncio.get_running_loop().create_task(self._write(rows))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    async def _write(self, rows: List[Dict[str, Any]]):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrent_writes)
+
+        async with self._semaphore:
+            started = time.perf_counter()
+            try:
+                if self.metrics is None:
+                    await asyncio.to_thread(self._upsert, rows)
+                else:
+                    async with self.metrics.track("supabase_upsert", table=self.table):
+                        await asyncio.to_thread(self._upsert, rows)
+            except Exception as e:
+                self.stats.failed_batches += 1
+                self.stats.failed_rows += len(rows)
+                logger.error(f"Error upserting batch of {len(rows)} rows: {e}")
+                return
+            latency = time.perf_counter() - started
+
+        self.stats.batches += 1
+        self.stats.rows += len(rows)
+        self.stats.batch_latencies.append(latency)
+        if self.metrics is not None:
+            self.metrics.inc("rows_written", len(rows), table=self.table)
+        logger.debug(f"Upserted {len(rows)} rows into {self.table} in {latency * 1000:.0f} ms")
+        if self.on_flushed is not None:
+            self.on_flushed(rows)
+
+    def _dedupe(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Keep the last row per conflict key; Postgres rejects a batch that hits a key twice."""
+        key_columns = self.on_conflict.split(",")
+        unique_rows = {tuple(row.get(column) for column in key_columns): row for row in rows}
+        return list(unique_rows.values())
+
+    def _upsert(self, rows: List[Dict[str, Any]]):
+        return (
+            self.supabase.table(self.table)
+            .upsert(rows, on_conflict=self.on_conflict)
+            .execute()
+        )
@@ -0,0 +1,175 @@
+import asyncio
+import json
+import logging
+import os
+import zlib
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, Iterable, List, NamedTuple, Optional
+from xml.etree import ElementTree
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+SITEMAP_NS = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+GZIP_MAGIC = b"\x1f\x8b"
+STATE_DIR = ".crawl_state"
+
+
+class SitemapEntry(NamedTuple):
+    url: str
+    lastmod: Optional[datetime]
+
+
+def parse_lastmod(value: Optional[str]) -> Optional[datetime]:
+    """Parse a W3C datetime (`2024-05-01` or `2024-05-01T10:00:00+00:00`) as UTC."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.strip())
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def _local_name(tag: str) -> str:
+    # Extension tags such as <image:loc> keep their namespace and are ignored
+    return tag[len(SITEMAP_NS):] if tag.startswith(SITEMAP_NS) else tag
+
+
+async def _stream_sitemap(
+    client: httpx.AsyncClient, sitemap_url: str
+) -> AsyncIterator[tuple]:
+    """
+    Stream one sitemap and yield ("url" | "sitemap", loc, lastmod) as elements close.
+
+    The XML is fed to a pull parser chunk by chunk, and gzipped sitemaps are
+    inflated on the fly, so the full document is never held in memory.
+    """
+    parser = ElementTree.XMLPullParser(events=("start", "end"))
+    decompressor = None
+    root = None
+    loc = lastmod = None
+
+    async with client.stream("GET", sitemap_url) as response:
+        response.raise_for_status()
+        first_chunk = True
+        async for data in response.aiter_bytes():
+            if first_chunk:
+                first_chunk = False
+                if data.startswith(GZIP_MAGIC):
+                    decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+            parser.feed(decompressor.decompress(data) if decompressor else data)
+
+            for event, element in parser.read_events():
+                if event == "start":
+                    if root is None:
+                        root = element
+                    continue
+
+                name = _local_name(element.tag)
+                if name == "loc":
+                    loc = (element.text or "").strip()
+                elif name == "lastmod":
+                    lastmod = parse_lastmod(element.text)
+                elif name in ("url", "sitemap"):
+                    if loc:
+                        yield name, loc, lastmod
+                    loc = lastmod = None
+                    # Drop finished entries so memory stays flat on huge sitemaps
+                    root.clear()
+
+        if decompressor:
+            parser.feed(decompressor.flush())
+        parser.close()
+
+
+async def iter_sitemap(
+    sitemap_url: str,
+    client: Optional[httpx.AsyncClient] = None,
+    max_concurrent: int = 8,
+    queue_size: int = 1000,
+) -> AsyncIterator[SitemapEntry]:
+    """
+    Yield (url, lastmod) entries from a sitemap, following <sitemapindex> children
+    concurrently. A bounded queue applies backpressure to the readers.
+    """
+    own_client = client is None
+    if own_client:
+        client = httpx.AsyncClient(timeout=httpx.Timeout(30.0), follow_redirects=True)
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    semaphore = asyncio.Semaphore(max_concurrent)
+    done = object()
+    seen = set()
+    tasks = set()
+
+    async def read(url: str):
+        try:
+            async with semaphore:
+                async for kind, loc, lastmod in _stream_sitemap(client, url):
+                    if kind == "sitemap":
+                        schedule(loc)
+                    else:
+                        await queue.put(SitemapEntry(loc, lastmod))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Error reading sitemap {url}: {e}")
+        finally:
+            tasks.discard(asyncio.current_task())
+        if not tasks:
+            await queue.put(done)
+
+    def schedule(url: str):
+        if url in seen:
+            return
+        seen.add(url)
+        tasks.add(asyncio.create_task(read(url)))
+
+    try:
+        schedule(sitemap_url)
+        while True:
+            entry = await queue.get()
+            if entry is done:
+                break
+            yield entry
+    finally:
+        for task in list(tasks):
+            task.cancel()
+        if own_client:
+            await client.aclose()
+
+
+class LastmodState:
+    """Remembers the lastmod of every URL processed by a previous run of a site."""
+
+    def __init__(self, site: str, state_dir: str = STATE_DIR):
+        self.path = os.path.join(state_dir, f"sitemap_lastmod_{site}.json")
+        self._lastmods: Dict[str, Optional[str]] = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                self._lastmods = json.load(f)
+
+    def is_changed(self, entry: SitemapEntry) -> bool:
+        """New URLs, URLs without a lastmod and URLs with a newer lastmod are changed."""
+        if entry.url not in self._lastmods or entry.lastmod is None:
+            return True
+        previous = parse_lastmod(self._lastmods[entry.url])
+        return previous is None or entry.lastmod > previous
+
+    def filter_changed(self, entries: Iterable[SitemapEntry]) -> List[SitemapEntry]:
+        return [entry for entry in entries if self.is_changed(entry)]
+
+    def mark_processed(self, entries: Iterable[SitemapEntry]):
+        for entry in entries:
+            self._lastmods[entry.url] = entry.lastmod.isoformat() if entry.lastmod else None
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._lastmods, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import re
+from collections import Counter
+from typing import Iterable, Optional, Tuple
+from urllib.parse import urlparse
+
+import html2text
+import httpx
+from bs4 import BeautifulSoup
+
+from .page_cache import PageCache
+
+logger = logging.getLogger(__name__)
+
+# Markup left behind by client-side frameworks when the page is rendered in the browser
+SPA_MARKERS = (
+    re.compile(r'<div[^>]+id="(root|app|__next|__nuxt)"[^>]*>\s*</div>', re.I),
+    re.compile(r"window\.__(NUXT|INITIAL_STATE|APOLLO_STATE)__", re.I),
+    re.compile(r"<noscript>[^<]*(enable|requires?) javascript", re.I),
+    re.compile(r"\bng-app\b|\bng-version=", re.I),
+)
+# Visible text below this is treated as an empty shell waiting for JavaScript
+MIN_TEXT_CHARS = 200
+
+_BOILERPLATE_TAGS = ["script", "style", "noscript", "svg", "nav", "header", "footer", "aside", "form"]
+_CODE_PLACEHOLDER = "STATICFETCHCODEBLOCK{}X"
+_LANGUAGE_CLASS = re.compile(r"^(?:language|lang)-(\S+)$")
+
+
+def _code_language(pre) -> str:
+    for tag in [pre, pre.find("code")]:
+        for css_class in (tag.get("class") or []) if tag is not None else []:
+            match = _LANGUAGE_CLASS.match(css_class)
+            if match:
+                return match.group(1)
+    return ""
+
+
+def html_to_markdown(html: str, base_url: str = "") -> Tuple[str, int]:
+    """Convert the main content of an HTML page to markdown; returns (markdown, text length)."""
+    soup = BeautifulSoup(html, "html.parser")
+    for tag in soup(_BOILERPLATE_TAGS):
+        tag.decompose()
+    content = soup.find("main") or soup.find("article") or soup.find(attrs={"role": "main"}) or soup.body or soup
+
+    # html2text indents code; swap <pre> blocks for placeholders and emit fenced blocks instead
+    code_blocks = []
+    for pre in content.find_all("pre"):
+        code_blocks.append(f"```{_code_language(pre)}\n{pre.get_text().strip(chr(10))}\n```")
+        placeholder = soup.new_tag("p")
+        placeholder.string = _CODE_PLACEHOLDER.format(len(code_blocks) - 1)
+        pre.replace_with(placeholder)
+
+    converter = html2text.HTML2Text(baseurl=base_url)
+    converter.body_width = 0  # Do not hard-wrap lines; the chunker splits on blocks
+    converter.ignore_images = True
+    markdown = converter.handle(str(content)).strip()
+    for index, block in enumerate(code_blocks):
+        markdown = markdown.replace(_CODE_PLACEHOLDER.format(index), block, 1)
+    return markdown, len(content.get_text(strip=True))
+
+
+def looks_client_rendered(html: str, text_length: int) -> Optional[str]:
+    """Reason the page needs a browser to render, or None if the static HTML will do."""
+    if text_length < MIN_TEXT_CHARS:
+        return "empty body"
+    for marker in SPA_MARKERS:
+        if marker.search(html):
+            return "spa marker"
+    return None
+
+
+class StaticFetcher:
+    """
+    Fast path for documentation that needs no JavaScript: a pooled async GET plus
+    in-process HTML-to-markdown conversion.
+
+    `fetch` returns None whenever the browser should be used instead: hosts in
+    `browser_hosts`, non-HTML or failed responses, and pages that look
+    client-rendered. `stats` counts how each URL was handled. With a
+    `page_cache`, known pages are revalidated with a conditional GET and a 304
+    returns the cached markdown, even for pages first rendered in the browser.
+    """
+
+    def __init__(
+        self,
+        browser_hosts: Iterable[str] = (),
+        max_connections: int = 20,
+        timeout: float = 20.0,
+        client: Optional[httpx.AsyncClient] = None,
+        page_cache: Optional[PageCache] = None,
+    ):
+        self.page_cache = page_cache
+        self.browser_hosts = {host.lower() for host in browser_hosts}
+        self.client = client or httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            follow_redirects=True,
+            headers={"User-Agent": "Mozilla/5.0 (compatible; docs-crawler)"},
+        )
+        self.stats = Counter()
+
+    async def fetch(self, url: str, site: str = "") -> Optional[str]:
+        """Return the page as markdown, or None if it has to go through the browser."""
+        cached = self.page_cache.get(url) if self.page_cache is not None else None
+        validators = cached.validators() if cached is not None else {}
+        allowlisted = urlparse(url).hostname in self.browser_hosts
+        if allowlisted and not validators:
+            self.stats["browser: allowlisted"] += 1
+            return None
+
+        try:
+            response = await self.client.get(url, headers=validators)
+            if response.status_code == 304 and cached is not None:
+                self.page_cache.mark_revalidated(url)
+                self.stats["cache: not modified"] += 1
+                return cached.markdown
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            logger.info(f"Static fetch failed for {url}: {e}")
+            self.stats["browser: fetch error"] += 1
+            return None
+        if allowlisted:
+            self.stats["browser: allowlisted"] += 1
+            return None
+        if "html" not in response.headers.get("content-type", ""):
+            self.stats["browser: not html"] += 1
+            return None
+
+        html = response.text
+        # Parsing is CPU-bound; keep the event loop free for other fetches
+        markdown, text_length = await asyncio.to_thread(html_to_markdown, html, str(response.url))
+        reason = looks_client_rendered(html, text_length)
+        if reason is not None:
+            self.stats[f"browser: {reason}"] += 1
+            return None
+
+        self.stats["static"] += 1
+        if self.page_cache is not None:
+            self.page_cache.set(url, site, html, markdown, response.headers)
+        return markdown
+
+    async def close(self):
+        await self.client.aclose()
+
+    async def __aenter__(self) -> "StaticFetcher":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
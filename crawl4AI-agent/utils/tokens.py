@@ -0,0 +1,83 @@
+import logging
+import os
+from functools import lru_cache
+from typing import List, Optional
+
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+# text-embedding-3-* and gpt-4o-mini prompts are both close enough to cl100k_base
+# for budgeting purposes.
+DEFAULT_ENCODING = "cl100k_base"
+
+# Approximate counts change chunk boundaries and therefore every content hash,
+# so they are only allowed when asked for (e.g. offline load tests on scratch data)
+ALLOW_APPROXIMATE_TOKENS = os.getenv("ALLOW_APPROXIMATE_TOKENS", "false").lower() == "true"
+
+
+class TokenizerUnavailable(RuntimeError):
+    """The tiktoken encoding could not be loaded and approximate counts are not allowed."""
+
+
+@lru_cache(maxsize=None)
+def _load_encoding(encoding_name: str):
+    try:
+        return tiktoken.get_encoding(encoding_name), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+@lru_cache(maxsize=None)
+def _warn_approximate(encoding_name: str, error: str):
+    logger.warning(f"ALLOW_APPROXIMATE_TOKENS is set; approximating {encoding_name} token counts ({error})")
+
+
+def get_encoding(encoding_name: str = DEFAULT_ENCODING) -> Optional[tiktoken.Encoding]:
+    """
+    Load a tiktoken encoding once.
+
+    Raises `TokenizerUnavailable` when it cannot be loaded (e.g. offline without
+    TIKTOKEN_CACHE_DIR), unless ALLOW_APPROXIMATE_TOKENS is set, in which case
+    it returns None and callers estimate ~4 characters per token.
+    """
+    encoding, error = _load_encoding(encoding_name)
+    if encoding is not None:
+        return encoding
+    if not ALLOW_APPROXIMATE_TOKENS:
+        raise TokenizerUnavailable(
+            f"Cannot load the {encoding_name} tokenizer ({error}). Chunk boundaries and content "
+            f"hashes need exact token counts: go online once or point TIKTOKEN_CACHE_DIR at a "
+            f"directory holding the encoding."
+        )
+    _warn_approximate(encoding_name, error)
+    return None
+
+
+def count_tokens(text: str, encoding_name: str = DEFAULT_ENCODING) -> int:
+    """Count tokens in text; see `get_encoding` for when the count is approximate."""
+    encoding = get_encoding(encoding_name)
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def split_by_tokens(text: str, max_tokens: int, encoding_name: str = DEFAULT_ENCODING) -> List[str]:
+    """Hard-split text into pieces of at most max_tokens tokens."""
+    encoding = get_encoding(encoding_name)
+    if encoding is None:
+        step = max_tokens * 4
+        return [text[i : i + step] for i in range(0, len(text), step)]
+    tokens = encoding.encode(text, disallowed_special=())
+    return [encoding.decode(tokens[i : i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
+
+
+def tail_by_tokens(text: str, max_tokens: int, encoding_name: str = DEFAULT_ENCODING) -> str:
+    """The last max_tokens tokens of text."""
+    if max_tokens <= 0:
+        return ""
+    encoding = get_encoding(encoding_name)
+    if encoding is None:
+        return text[-max_tokens * 4 :]
+    tokens = encoding.encode(text, disallowed_special=())
+    return encoding.decode(tokens[-max_tokens:])
@@ -0,0 +1,772 @@
+"""
+In-process mirror of `site_pages` for retrieval without a database round trip.
+
+A snapshot is a directory of plain files that several processes (e.g. Streamlit
+workers) memory-map and share through the page cache:
+
+    vectors.npy     float32 (rows, dimensions), L2-normalized, sorted by (site, id)
+    ids.npy         int64 row ids in the same order
+    codes_<key>.npy int32 codes of the metadata values used as filters (-1 = missing)
+    rows.sqlite     id -> site, url, chunk_number, title, summary, content, metadata, token counts
+    hnsw.bin        optional hnswlib graph over the vectors
+    manifest.json   dimensions, per-site row ranges, filter vocabularies, sync cursor
+
+Snapshots are written into a `<name>.tmp` directory that is renamed once it is
+complete, and `CURRENT` in the index directory names the live snapshot and is
+replaced atomically, so readers never see a half-written one. Rows changed after the
+snapshot was written are pulled incrementally (by `updated_at`, or by `id` for
+tables without that column) into a small in-memory delta, and `save()` folds the
+delta into a new snapshot.
+
+Build or refresh a snapshot from the crawl4AI-agent directory:
+
+    python supabasev0.py --build-index
+    python supabasev0.py --sync-index
+"""
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from supabase import Client
+
+from .incremental import parse_embedding
+
+try:
+    import hnswlib
+except ImportError:  # Optional; exact search is used without it
+    hnswlib = None
+
+logger = logging.getLogger(__name__)
+
+LOCAL_VECTOR_INDEX = os.getenv("LOCAL_VECTOR_INDEX", "false").lower() == "true"
+DEFAULT_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", ".cache/vector_index")
+DEFAULT_SYNC_INTERVAL = float(os.getenv("VECTOR_INDEX_SYNC_INTERVAL", "60"))  # Seconds
+# "updated_at" needs the migration in utils/site_pages.sql; "id" only picks up new rows
+DEFAULT_SYNC_COLUMN = os.getenv("VECTOR_INDEX_SYNC_COLUMN", "updated_at")
+DEFAULT_FILTER_KEYS = tuple(
+    key.strip() for key in os.getenv("VECTOR_INDEX_FILTER_KEYS", "model,source").split(",") if key.strip()
+)
+USE_HNSW = os.getenv("VECTOR_INDEX_HNSW", "true").lower() == "true"
+HNSW_MIN_ROWS = int(os.getenv("VECTOR_INDEX_HNSW_MIN_ROWS", "20000"))  # Exact search is fast enough below this
+HNSW_EF = int(os.getenv("VECTOR_INDEX_HNSW_EF", "128"))
+# Re-read rows changed this long before the cursor, for transactions that commit late
+SYNC_OVERLAP = timedelta(seconds=float(os.getenv("VECTOR_INDEX_SYNC_OVERLAP", "10")))
+# After a failed build, wait this long before the next attempt, doubling up to the max
+BUILD_RETRY_INTERVAL = float(os.getenv("VECTOR_INDEX_BUILD_RETRY_INTERVAL", "60"))  # Seconds
+BUILD_RETRY_MAX = float(os.getenv("VECTOR_INDEX_BUILD_RETRY_MAX", "3600"))  # Seconds
+
+PAYLOAD_COLUMNS = (
+    "id", "site", "url", "chunk_number", "title", "summary", "content", "metadata",
+    "token_count", "summary_token_count",
+)
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+SNAPSHOTS_TO_KEEP = 2
+# Unpublished snapshot directories untouched this long belong to a build that died
+STALE_BUILD_SECONDS = 3600
+
+
+def jsonb_contains(document: Any, subset: Any) -> bool:
+    """Python version of Postgres' `document @> subset` for JSON values."""
+    if isinstance(subset, dict):
+        return isinstance(document, dict) and all(
+            key in document and jsonb_contains(document[key], value) for key, value in subset.items()
+        )
+    if isinstance(subset, list):
+        if not isinstance(document, list):
+            return False
+        return all(any(jsonb_contains(item, wanted) for item in document) for wanted in subset)
+    return document == subset
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def _parse_timestamp(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def _last_modified(directory: str) -> float:
+    """Newest modification time of a directory or any file in it."""
+    times = [os.path.getmtime(directory)]
+    for name in os.listdir(directory):
+        try:
+            times.append(os.path.getmtime(os.path.join(directory, name)))
+        except OSError:
+            pass
+    return max(times)
+
+
+class _SnapshotWriter:
+    """
+    Streams rows into a `<name>.tmp` directory; `finish()` sorts them, renames
+    the directory and publishes it, `abort()` removes it.
+    """
+
+    def __init__(self, root: str, filter_keys: Iterable[str], use_hnsw: bool = USE_HNSW):
+        self.root = root
+        self.filter_keys = tuple(filter_keys)
+        self.use_hnsw = use_hnsw
+        self.name = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.directory = os.path.join(root, self.name)
+        self.build_directory = f"{self.directory}.tmp"
+        os.makedirs(self.build_directory)
+        self.db = sqlite3.connect(os.path.join(self.build_directory, "rows.sqlite"))
+        self.db.execute(
+            "create table rows (id integer primary key, site text, url text, chunk_number integer, "
+            "title text, summary text, content text, metadata text, token_count integer, "
+            "summary_token_count integer)"
+        )
+        self.ids: List[int] = []
+        self.sites: List[str] = []
+        self.filter_values: Dict[str, List[Optional[str]]] = {key: [] for key in self.filter_keys}
+        self.vectors: List[np.ndarray] = []
+        self._pending: List[Tuple] = []
+
+    def add(self, row: Dict[str, Any], vector: np.ndarray):
+        metadata = row.get("metadata") or {}
+        self.ids.append(int(row["id"]))
+        self.sites.append(row.get("site") or "")
+        for key in self.filter_keys:
+            value = metadata.get(key)
+            self.filter_values[key].append(value if isinstance(value, str) else None)
+        self.vectors.append(vector)
+        self._pending.append((
+            int(row["id"]), row.get("site"), row.get("url"), row.get("chunk_number"),
+            row.get("title"), row.get("summary"), row.get("content"), json.dumps(metadata),
+            row.get("token_count"), row.get("summary_token_count"),
+        ))
+        if len(self._pending) >= 1000:
+            self._flush()
+
+    def _flush(self):
+        self.db.executemany("insert or replace into rows values (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", self._pending)
+        self._pending = []
+
+    def finish(self, dimensions: int, cursor: Dict[str, Any]) -> str:
+        self._flush()
+        self.db.commit()
+        self.db.close()
+
+        ids = np.asarray(self.ids, dtype=np.int64)
+        site_names = sorted(set(self.sites))
+        site_lookup = {site: code for code, site in enumerate(site_names)}
+        site_codes = np.asarray([site_lookup[site] for site in self.sites], dtype=np.int32)
+        order = np.lexsort((ids, site_codes))
+        vectors = np.vstack(self.vectors).astype(np.float32) if self.vectors else np.zeros((0, dimensions), np.float32)
+        vectors = np.ascontiguousarray(vectors[order])
+
+        np.save(os.path.join(self.build_directory, "vectors.npy"), vectors)
+        np.save(os.path.join(self.build_directory, "ids.npy"), ids[order])
+        vocabularies = {}
+        for key, values in self.filter_values.items():
+            vocabulary = sorted({value for value in values if value is not None})
+            lookup = {value: code for code, value in enumerate(vocabulary)}
+            codes = np.asarray([lookup.get(value, -1) for value in values], dtype=np.int32)
+            np.save(os.path.join(self.build_directory, f"codes_{key}.npy"), codes[order])
+            vocabularies[key] = vocabulary
+
+        sorted_codes = site_codes[order]
+        sites = {}
+        for code, site in enumerate(site_names):
+            start, end = np.searchsorted(sorted_codes, [code, code + 1])
+            sites[site] = [int(start), int(end)]
+
+        hnsw = False
+        if self.use_hnsw and hnswlib is not None and len(ids) >= HNSW_MIN_ROWS:
+            graph = hnswlib.Index(space="ip", dim=dimensions)
+            graph.init_index(max_elements=len(ids), ef_construction=200, M=16)
+            graph.add_items(vectors, np.arange(len(ids)))
+            graph.save_index(os.path.join(self.build_directory, "hnsw.bin"))
+            hnsw = True
+
+        manifest = {
+            "count": int(len(ids)),
+            "dimensions": int(dimensions),
+            "sites": sites,
+            "filters": vocabularies,
+            "hnsw": hnsw,
+            "cursor": cursor,
+            "created_at": time.time(),
+        }
+        with open(os.path.join(self.build_directory, MANIFEST_FILE), "w") as f:
+            json.dump(manifest, f)
+        os.rename(self.build_directory, self.directory)
+
+        current = os.path.join(self.root, CURRENT_FILE)
+        with open(f"{current}.{self.name}.tmp", "w") as f:
+            f.write(self.name)
+        os.replace(f"{current}.{self.name}.tmp", current)
+        self._remove_old_snapshots()
+        return self.directory
+
+    def abort(self):
+        """Drop the unfinished snapshot after a failed build."""
+        try:
+            self.db.close()
+        except sqlite3.Error:
+            pass
+        shutil.rmtree(self.build_directory, ignore_errors=True)
+
+    def _remove_old_snapshots(self):
+        # Readers of a removed snapshot keep their mappings; the files go away on close
+        snapshots = []
+        for name in sorted(os.listdir(self.root)):
+            path = os.path.join(self.root, name)
+            if name == self.name or not os.path.isdir(path):
+                continue
+            if os.path.isfile(os.path.join(path, MANIFEST_FILE)) and not name.endswith(".tmp"):
+                snapshots.append(name)
+            elif _last_modified(path) < time.time() - STALE_BUILD_SECONDS:
+                # Left behind by a build that crashed; one still running keeps touching its files
+                shutil.rmtree(path, ignore_errors=True)
+        keep = SNAPSHOTS_TO_KEEP - 1  # Besides the one just published
+        for name in snapshots[:max(len(snapshots) - keep, 0)]:
+            shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+
+class _Snapshot:
+    """A published snapshot, memory-mapped read-only."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.name = os.path.basename(directory)
+        with open(os.path.join(directory, MANIFEST_FILE)) as f:
+            self.manifest = json.load(f)
+        self.count = self.manifest["count"]
+        self.dimensions = self.manifest["dimensions"]
+        self.sites: Dict[str, List[int]] = self.manifest["sites"]
+        self.vocabularies: Dict[str, List[str]] = self.manifest["filters"]
+
+        # numpy cannot map a zero-length array
+        mmap_mode = "r" if self.count else None
+        self.vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode=mmap_mode)
+        self.ids = np.load(os.path.join(directory, "ids.npy"), mmap_mode=mmap_mode)
+        self.codes = {
+            key: np.load(os.path.join(directory, f"codes_{key}.npy"), mmap_mode=mmap_mode)
+            for key in self.vocabularies
+        }
+        self._id_order = np.argsort(self.ids)
+        self._sorted_ids = np.asarray(self.ids)[self._id_order]
+
+        self.hnsw = None
+        if self.manifest.get("hnsw") and hnswlib is not None:
+            self.hnsw = hnswlib.Index(space="ip", dim=self.dimensions)
+            self.hnsw.load_index(os.path.join(directory, "hnsw.bin"), max_elements=self.count)
+            self.hnsw.set_ef(HNSW_EF)
+        self._local = threading.local()
+
+    def positions(self, ids: Iterable[int]) -> np.ndarray:
+        """Positions of the given row ids that are in this snapshot."""
+        wanted = np.asarray(list(ids), dtype=np.int64)
+        if not self.count or not len(wanted):
+            return np.zeros(0, dtype=np.int64)
+        found = np.searchsorted(self._sorted_ids, wanted)
+        found = np.minimum(found, self.count - 1)
+        hits = self._sorted_ids[found] == wanted
+        return self._id_order[found[hits]]
+
+    def _db(self) -> sqlite3.Connection:
+        # The file never changes once published, so it is opened immutable: no locks
+        db = getattr(self._local, "db", None)
+        if db is None:
+            path = os.path.abspath(os.path.join(self.directory, "rows.sqlite"))
+            db = sqlite3.connect(f"file:{path}?mode=ro&immutable=1", uri=True)
+            self._local.db = db
+        return db
+
+    def rows(self, ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        if not ids:
+            return {}
+        placeholders = ",".join("?" * len(ids))
+        cursor = self._db().execute(f"select * from rows where id in ({placeholders})", ids)
+        rows = {}
+        for values in cursor.fetchall():
+            row = dict(zip(PAYLOAD_COLUMNS, values))
+            row["metadata"] = json.loads(row["metadata"] or "{}")
+            rows[row["id"]] = row
+        return rows
+
+
+@dataclass
+class _View:
+    """Everything a search reads, swapped as one object so searches never see a torn update."""
+
+    snapshot: Optional[_Snapshot] = None
+    dead: Optional[np.ndarray] = None  # Snapshot positions that were updated or deleted since
+    delta_rows: Dict[int, Dict[str, Any]] = field(default_factory=dict)
+    delta_ids: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    delta_vectors: Optional[np.ndarray] = None
+
+
+class LocalVectorIndex:
+    """
+    Exact (or, with hnswlib installed, HNSW) cosine search over a local copy of
+    `site_pages`, with the same site and metadata filters as `match_site_pages`.
+
+    Rows are read from a memory-mapped snapshot plus an in-memory delta of rows
+    changed since; `prepare()` loads or builds the snapshot in the background,
+    `sync()` pulls new changes and `start()` runs it in a daemon thread every
+    `sync_interval` seconds, also switching to newer snapshots published by
+    other processes.
+    """
+
+    def __init__(
+        self,
+        supabase: Client,
+        directory: str = DEFAULT_INDEX_DIR,
+        table: str = "site_pages",
+        sync_column: str = DEFAULT_SYNC_COLUMN,
+        sync_interval: float = DEFAULT_SYNC_INTERVAL,
+        filter_keys: Iterable[str] = DEFAULT_FILTER_KEYS,
+        page_size: int = 1000,
+    ):
+        if sync_column not in ("updated_at", "id"):
+            raise ValueError(f"sync_column must be 'updated_at' or 'id', not {sync_column!r}")
+        self.supabase = supabase
+        self.directory = directory
+        self.table = table
+        self.sync_column = sync_column
+        self.sync_interval = sync_interval
+        self.filter_keys = tuple(filter_keys)
+        self.page_size = page_size
+
+        self._view = _View()
+        self.cursor: Dict[str, Any] = {}
+        self.searches = 0
+        self.syncs = 0
+        self.rows_synced = 0
+        self.rows_deleted = 0
+        self.last_synced: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.ready = False
+        self.build_failures = 0
+        self.retry_at = 0.0  # time.monotonic() before which a failed build is not retried
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._preparing: Optional[threading.Thread] = None
+        self._prepare_lock = threading.Lock()  # Not _lock, which a running sync holds
+
+    @property
+    def size(self) -> int:
+        view = self._view
+        dead = int(view.dead.sum()) if view.dead is not None else 0
+        return (view.snapshot.count if view.snapshot else 0) - dead + len(view.delta_rows)
+
+    # Loading and syncing
+
+    def _current_name(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.directory, CURRENT_FILE)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def load(self) -> bool:
+        """Map the current snapshot, if there is one; returns whether it was found."""
+        name = self._current_name()
+        if name is None:
+            return False
+        snapshot = _Snapshot(os.path.join(self.directory, name))
+        with self._lock:
+            self._view = _View(snapshot=snapshot)
+            self.cursor = dict(snapshot.manifest["cursor"])
+        logger.info(f"Loaded vector index snapshot {name} ({snapshot.count} rows)")
+        return True
+
+    def _select(self, columns: str = "*"):
+        return self.supabase.table(self.table).select(columns)
+
+    def _latest_cursor(self) -> Dict[str, Any]:
+        """The sync position before a full scan, so rows changed during it are synced later."""
+        query = self._select(f"id, {self.sync_column}" if self.sync_column != "id" else "id")
+        result = query.order(self.sync_column, desc=True).order("id", desc=True).limit(1).execute()
+        latest = result.data[0] if result.data else {}
+        cursor = {"value": latest.get(self.sync_column), "id": latest.get("id", 0)}
+        if self.sync_column == "updated_at":
+            deleted = (
+                self.supabase.table(f"{self.table}_deleted")
+                .select("deleted_at").order("deleted_at", desc=True).limit(1).execute()
+            )
+            cursor["deleted_at"] = deleted.data[0]["deleted_at"] if deleted.data else None
+        return cursor
+
+    def build(self) -> str:
+        """Write a new snapshot of the whole table, paging through it by id."""
+        started = time.perf_counter()
+        cursor = self._latest_cursor()
+        writer = _SnapshotWriter(self.directory, self.filter_keys)
+        dimensions = None
+        last_id = 0
+        try:
+            while True:
+                result = (
+                    self._select(", ".join(PAYLOAD_COLUMNS) + ", embedding")
+                    .gt("id", last_id).order("id").limit(self.page_size).execute()
+                )
+                page = result.data or []
+                vectors = self._vectors(page)
+                for row, vector in zip(page, vectors):
+                    if vector is not None:
+                        writer.add(row, vector)
+                        dimensions = dimensions or len(vector)
+                if len(page) < self.page_size:
+                    break
+                last_id = page[-1]["id"]
+            directory = writer.finish(dimensions or 1536, cursor)
+        except BaseException:
+            writer.abort()
+            raise
+        self.load()
+        logger.info(f"Built vector index snapshot of {len(writer.ids)} rows in {time.perf_counter() - started:.1f}s")
+        return directory
+
+    @staticmethod
+    def _vectors(rows: List[Dict[str, Any]]) -> List[Optional[np.ndarray]]:
+        vectors = []
+        for row in rows:
+            embedding = parse_embedding(row.get("embedding"))
+            vectors.append(_normalize(np.asarray(embedding, dtype=np.float32)) if embedding else None)
+        return vectors
+
+    def _changed_rows(self) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """Rows changed since the cursor, paged by (sync column, id) without offsets."""
+        columns = ", ".join(PAYLOAD_COLUMNS) + ", embedding"
+        if self.sync_column != "id":
+            columns += f", {self.sync_column}"
+        cursor = dict(self.cursor)
+        value, last_id = cursor.get("value"), cursor.get("id", 0)
+        if self.sync_column == "updated_at" and value and SYNC_OVERLAP:
+            value, last_id = (_parse_timestamp(value) - SYNC_OVERLAP).isoformat(), 0
+
+        rows: List[Dict[str, Any]] = []
+        while True:
+            page: List[Dict[str, Any]] = []
+            if self.sync_column == "id":
+                page = self._select(columns).gt("id", value or 0).order("id").limit(self.page_size).execute().data or []
+            else:
+                if value is not None:
+                    # Rows sharing the cursor's timestamp (one upsert batch) are paged by id
+                    page = (
+                        self._select(columns).eq("updated_at", value).gt("id", last_id)
+                        .order("id").limit(self.page_size).execute().data or []
+                    )
+                if not page:
+                    query = self._select(columns)
+                    if value is not None:
+                        query = query.gt("updated_at", value)
+                    page = query.order("updated_at").order("id").limit(self.page_size).execute().data or []
+            if not page:
+                break
+            rows.extend(page)
+            value, last_id = page[-1][self.sync_column], page[-1]["id"]
+        if rows:
+            cursor.update(value=rows[-1][self.sync_column], id=rows[-1]["id"])
+        return rows, cursor
+
+    def _deleted_ids(self, cursor: Dict[str, Any]) -> List[int]:
+        if self.sync_column != "updated_at":
+            return []
+        since = cursor.get("deleted_at")
+        ids: List[int] = []
+        while True:
+            query = self.supabase.table(f"{self.table}_deleted").select("id, deleted_at")
+            if since and SYNC_OVERLAP:
+                query = query.gte("deleted_at", (_parse_timestamp(since) - SYNC_OVERLAP).isoformat())
+            elif since:
+                query = query.gt("deleted_at", since)
+            page = query.order("deleted_at").order("id").range(len(ids), len(ids) + self.page_size - 1).execute().data or []
+            ids.extend(row["id"] for row in page)
+            if page:
+                cursor["deleted_at"] = page[-1]["deleted_at"]
+            if len(page) < self.page_size:
+                return ids
+
+    def sync(self) -> int:
+        """Apply rows changed or deleted since the last sync; returns how many."""
+        with self._lock:
+            name = self._current_name()
+            if name is not None and (self._view.snapshot is None or self._view.snapshot.name != name):
+                # Another process published a newer snapshot: switch to it, then catch up
+                snapshot = _Snapshot(os.path.join(self.directory, name))
+                self._view = _View(snapshot=snapshot)
+                self.cursor = dict(snapshot.manifest["cursor"])
+                logger.info(f"Switched to vector index snapshot {name} ({snapshot.count} rows)")
+
+            rows, cursor = self._changed_rows()
+            deleted = self._deleted_ids(cursor)
+            view = self._view
+            delta_rows = dict(view.delta_rows)
+            delta_vectors = {
+                int(row_id): view.delta_vectors[position] for position, row_id in enumerate(view.delta_ids)
+            }
+            for row_id in deleted:
+                delta_rows.pop(row_id, None)
+                delta_vectors.pop(row_id, None)
+            for row, vector in zip(rows, self._vectors(rows)):
+                if vector is None:
+                    continue
+                row = {column: row.get(column) for column in PAYLOAD_COLUMNS}
+                row["metadata"] = row["metadata"] or {}
+                delta_rows[row["id"]] = row
+                delta_vectors[row["id"]] = vector
+
+            snapshot = view.snapshot
+            dead = view.dead
+            if snapshot is not None and (rows or deleted):
+                dead = np.zeros(snapshot.count, dtype=bool) if dead is None else dead.copy()
+                dead[snapshot.positions([row["id"] for row in rows] + deleted)] = True
+            delta_ids = np.fromiter(delta_vectors.keys(), dtype=np.int64, count=len(delta_vectors))
+            self._view = _View(
+                snapshot=snapshot,
+                dead=dead,
+                delta_rows=delta_rows,
+                delta_ids=delta_ids,
+                delta_vectors=np.vstack(list(delta_vectors.values())) if delta_vectors else None,
+            )
+            self.cursor = cursor
+            self.syncs += 1
+            self.rows_synced += len(rows)
+            self.rows_deleted += len(deleted)
+            self.last_synced = time.time()
+        return len(rows) + len(deleted)
+
+    def save(self) -> str:
+        """Fold the delta into a new snapshot and publish it."""
+        with self._lock:
+            view = self._view
+            snapshot = view.snapshot
+            dimensions = snapshot.dimensions if snapshot else (
+                view.delta_vectors.shape[1] if view.delta_vectors is not None else 1536
+            )
+            writer = _SnapshotWriter(self.directory, self.filter_keys)
+            try:
+                if snapshot is not None and snapshot.count:
+                    alive = np.flatnonzero(~view.dead) if view.dead is not None else np.arange(snapshot.count)
+                    for start in range(0, len(alive), self.page_size):
+                        positions = alive[start:start + self.page_size]
+                        rows = snapshot.rows([int(row_id) for row_id in snapshot.ids[positions]])
+                        for position in positions:
+                            writer.add(rows[int(snapshot.ids[position])], np.asarray(snapshot.vectors[position]))
+                for position, row_id in enumerate(view.delta_ids):
+                    writer.add(view.delta_rows[int(row_id)], view.delta_vectors[position])
+                directory = writer.finish(dimensions, self.cursor)
+            except BaseException:
+                writer.abort()
+                raise
+            self._view = _View(snapshot=_Snapshot(directory))
+        logger.info(f"Saved vector index snapshot {os.path.basename(directory)} ({len(writer.ids)} rows)")
+        return directory
+
+    def _prepare(self):
+        try:
+            if not self.load():
+                self.build()
+            self.sync()
+        except Exception as e:
+            self.build_failures += 1
+            delay = min(BUILD_RETRY_INTERVAL * 2 ** (self.build_failures - 1), BUILD_RETRY_MAX)
+            self.retry_at = time.monotonic() + delay
+            self.last_error = f"{type(e).__name__}: {e}"
+            logger.error(f"Vector index build failed, retrying in {delay:.0f}s: {self.last_error}")
+        else:
+            self.build_failures = 0
+            self.last_error = None
+            self.ready = True
+
+    def prepare(self) -> bool:
+        """
+        Map the current snapshot, or build one, and catch up in a background
+        thread; returns whether the index is ready to search. After a failure
+        the next attempt waits `BUILD_RETRY_INTERVAL` seconds, doubling each time.
+        """
+        if self.ready:
+            return True
+        with self._prepare_lock:
+            idle = self._preparing is None or not self._preparing.is_alive()
+            if idle and not self.ready and time.monotonic() >= self.retry_at:
+                self._preparing = threading.Thread(target=self._prepare, name="vector-index-build", daemon=True)
+                self._preparing.start()
+        return self.ready
+
+    def _run(self):
+        while not self._stop.wait(self.sync_interval):
+            try:
+                self.sync()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                logger.warning(f"Vector index sync failed: {self.last_error}")
+
+    def start(self) -> "LocalVectorIndex":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="vector-index-sync", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    # Search
+
+    def _base_matches(
+        self, view: _View, query: np.ndarray, wanted: int, filter: Dict[str, Any], site_filter: Optional[str]
+    ) -> List[Tuple[float, int]]:
+        snapshot = view.snapshot
+        if snapshot is None or not snapshot.count:
+            return []
+        if site_filter is None:
+            start, end = 0, snapshot.count
+        elif site_filter in snapshot.sites:
+            start, end = snapshot.sites[site_filter]
+        else:
+            return []
+
+        mask = ~view.dead[start:end] if view.dead is not None else np.ones(end - start, dtype=bool)
+        residual = {}
+        for key, value in filter.items():
+            if key in snapshot.codes and isinstance(value, str):
+                vocabulary = snapshot.vocabularies[key]
+                if value not in vocabulary:
+                    return []
+                mask &= snapshot.codes[key][start:end] == vocabulary.index(value)
+            else:
+                residual[key] = value
+        candidates = int(mask.sum())
+        if not candidates:
+            return []
+
+        if snapshot.hnsw is not None and not residual and end - start >= HNSW_MIN_ROWS:
+            # Over-fetch from the graph and drop rows outside the site, filter or delta.
+            # The graph search visits `ef` nodes whatever k is, so up to ef come back for free
+            k = min(snapshot.count, max(HNSW_EF, 2 * wanted * snapshot.count // candidates))
+            labels, distances = snapshot.hnsw.knn_query(query, k=k)
+            matches = [
+                (1.0 - float(distance), int(snapshot.ids[label]))
+                for label, distance in zip(labels[0], distances[0])
+                if start <= label < end and mask[label - start]
+            ]
+            if len(matches) >= wanted:
+                return matches[:wanted]
+
+        scores = np.asarray(snapshot.vectors[start:end] @ query)
+        positions = np.flatnonzero(mask)
+        scores = scores[positions]
+        if not residual:
+            if len(positions) > wanted:
+                top = np.argpartition(-scores, wanted - 1)[:wanted]
+                positions, scores = positions[top], scores[top]
+            return [(float(score), int(snapshot.ids[start + position])) for score, position in zip(scores, positions)]
+
+        # Filters on unindexed metadata keys are checked against the stored rows, best first
+        matches = []
+        ranked = np.argsort(-scores)
+        for batch_start in range(0, len(ranked), max(wanted * 4, 64)):
+            batch = ranked[batch_start:batch_start + max(wanted * 4, 64)]
+            ids = [int(snapshot.ids[start + positions[index]]) for index in batch]
+            rows = snapshot.rows(ids)
+            for index, row_id in zip(batch, ids):
+                if jsonb_contains(rows[row_id]["metadata"], residual):
+                    matches.append((float(scores[index]), row_id))
+            if len(matches) >= wanted:
+                break
+        return matches[:wanted]
+
+    def search(
+        self,
+        query_embedding: List[float],
+        match_count: int = 10,
+        filter: Optional[Dict[str, Any]] = None,
+        site_filter: Optional[str] = None,
+        include_embeddings: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """Same rows, order and columns as the `match_site_pages` RPC."""
+        view = self._view
+        filter = filter or {}
+        query = _normalize(np.asarray(query_embedding, dtype=np.float32))
+        matches = self._base_matches(view, query, match_count, filter, site_filter)
+
+        if view.delta_vectors is not None:
+            scores = view.delta_vectors @ query
+            for score, row_id in zip(scores, view.delta_ids):
+                row = view.delta_rows[int(row_id)]
+                if (site_filter is None or row["site"] == site_filter) and jsonb_contains(row["metadata"], filter):
+                    matches.append((float(score), int(row_id)))
+
+        matches.sort(key=lambda match: -match[0])
+        matches = matches[:match_count]
+        base_ids = [row_id for _, row_id in matches if row_id not in view.delta_rows]
+        rows = view.snapshot.rows(base_ids) if view.snapshot is not None else {}
+        rows.update({row_id: view.delta_rows[row_id] for _, row_id in matches if row_id in view.delta_rows})
+        self.searches += 1
+        results = [{**rows[row_id], "similarity": score} for score, row_id in matches]
+        if include_embeddings:
+            # Stored vectors are normalized, which is all cosine-based callers need
+            delta_positions = {int(row_id): position for position, row_id in enumerate(view.delta_ids)}
+            for result in results:
+                if result["id"] in delta_positions:
+                    vector = view.delta_vectors[delta_positions[result["id"]]]
+                else:
+                    vector = view.snapshot.vectors[view.snapshot.positions([result["id"]])[0]]
+                result["embedding"] = vector.tolist()
+        return results
+
+    def status(self) -> Dict[str, Any]:
+        view = self._view
+        return {
+            "ready": self.ready,
+            "snapshot": view.snapshot.name if view.snapshot else None,
+            "rows": self.size,
+            "delta_rows": len(view.delta_rows),
+            "hnsw": bool(view.snapshot is not None and view.snapshot.hnsw is not None),
+            "cursor": self.cursor,
+            "searches": self.searches,
+            "syncs": self.syncs,
+            "rows_synced": self.rows_synced,
+            "rows_deleted": self.rows_deleted,
+            "last_synced": self.last_synced,
+            "last_error": self.last_error,
+            "build_failures": self.build_failures,
+        }
+
+
+_indexes: Dict[str, LocalVectorIndex] = {}
+_registry_lock = threading.Lock()
+
+
+def get_local_vector_index(
+    supabase: Client, start: bool = True, directory: str = DEFAULT_INDEX_DIR
+) -> Optional[LocalVectorIndex]:
+    """
+    Shared index for an index directory, or None while it is not ready yet.
+
+    The first call starts mapping the current snapshot, or building one from
+    `site_pages`, in the background; callers search with `match_site_pages`
+    until it is ready, after which the index keeps syncing. Later calls with a
+    new client (Streamlit recreates its clients every hour) reuse the same
+    index, threads and mappings, and switch it to that client.
+    """
+    with _registry_lock:
+        key = os.path.abspath(directory)
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = LocalVectorIndex(supabase, directory)
+        else:
+            index.supabase = supabase
+    if not index.prepare():
+        return None
+    return index.start() if start else index
+